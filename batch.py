@@ -0,0 +1,257 @@
+"""Пакетный расчёт побед для списка героев (NumPy; без него - чистый Python)"""
+import csv
+import io
+import re
+from typing import Dict, List, Sequence
+
+# NumPy ставится из requirements.txt, но импортируется при первом расчёте (или заранее
+# через load_numpy), чтобы не замедлять запуск бота. Если его всё же нет (установка
+# без requirements.txt), расчёт идёт на чистом Python - медленнее, но с тем же результатом
+np = None
+_numpy_checked = False
+
+# Коды ошибок строк
+OK = 0
+ERR_PARSE = 1
+ERR_WR_RANGE = 2
+ERR_MATCHES = 3
+ERR_DESIRED_100 = 4
+ERR_NOT_HIGHER = 5
+
+ERROR_MESSAGES = {
+    ERR_PARSE: 'Неверный формат строки',
+    ERR_WR_RANGE: 'Винрейт должен быть от 0 до 100%',
+    ERR_MATCHES: 'Количество матчей должно быть больше 0',
+    ERR_DESIRED_100: 'Невозможно достичь 100% винрейта',
+    ERR_NOT_HIGHER: 'Желаемый винрейт должен быть выше текущего',
+}
+
+RESULT_COLUMNS = ('wins_needed', 'current_wins', 'new_total_matches', 'new_total_wins', 'actual_new_wr', 'error')
+
+_SPLIT_RE = re.compile(r'[;\t|]')
+# Запятая с пробелом рядом - разделитель полей, а не десятичная запятая ("Layla, 100, 55.5, 60")
+_COMMA_SPACE_RE = re.compile(r'\s*,\s+|\s+,\s*')
+
+# Предел числа матчей в строке: больше не бывает, а в int64 NumPy помещается с запасом
+MAX_MATCHES = 10 ** 9
+
+
+def load_numpy():
+    """Импорт NumPy (один раз); None, если он не установлен"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+        _numpy_checked = True
+    return np
+
+
+def _calculate_numpy(total_matches: Sequence, current_wr: Sequence, desired_wr: Sequence) -> Dict[str, list]:
+    matches = np.asarray(total_matches, dtype=np.int64)
+    current = np.asarray(current_wr, dtype=np.float64)
+    desired = np.asarray(desired_wr, dtype=np.float64)
+
+    # Порядок проверок такой же, как в calculate_wins_needed
+    error = np.select(
+        [
+            np.isnan(current) | np.isnan(desired),
+            (desired > 100) | (desired < 0) | (current > 100) | (current < 0),
+            matches <= 0,
+            desired >= 100,
+            desired <= current,
+        ],
+        [ERR_PARSE, ERR_WR_RANGE, ERR_MATCHES, ERR_DESIRED_100, ERR_NOT_HIGHER],
+        default=OK,
+    )
+    ok = error == OK
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wins_needed = np.where(ok, np.ceil(matches * (desired - current) / (100 - desired)), 0).astype(np.int64)
+        current_wins = np.where(ok, np.floor(matches * current / 100), 0).astype(np.int64)
+        new_total_matches = matches + wins_needed
+        new_total_wins = current_wins + wins_needed
+        actual_new_wr = np.where(ok, new_total_wins / np.where(ok, new_total_matches, 1) * 100, 0.0)
+
+    return {
+        'wins_needed': wins_needed.tolist(),
+        'current_wins': current_wins.tolist(),
+        'new_total_matches': np.where(ok, new_total_matches, 0).tolist(),
+        'new_total_wins': np.where(ok, new_total_wins, 0).tolist(),
+        'actual_new_wr': actual_new_wr.tolist(),
+        'error': error.tolist(),
+    }
+
+
+def _calculate_python(total_matches: Sequence, current_wr: Sequence, desired_wr: Sequence) -> Dict[str, list]:
+    columns = {name: [] for name in RESULT_COLUMNS}
+    for matches, current, desired in zip(total_matches, current_wr, desired_wr):
+        if current != current or desired != desired:  # NaN - строку не удалось разобрать
+            error = ERR_PARSE
+        elif desired > 100 or desired < 0 or current > 100 or current < 0:
+            error = ERR_WR_RANGE
+        elif matches <= 0:
+            error = ERR_MATCHES
+        elif desired >= 100:
+            error = ERR_DESIRED_100
+        elif desired <= current:
+            error = ERR_NOT_HIGHER
+        else:
+            error = OK
+
+        if error != OK:
+            wins_needed = current_wins = new_total_matches = new_total_wins = 0
+            actual_new_wr = 0.0
+        else:
+            wins_needed = (matches * (desired - current)) / (100 - desired)
+            wins_needed = int(wins_needed) + (1 if wins_needed % 1 > 0 else 0)
+            current_wins = int(matches * current / 100)
+            new_total_matches = matches + wins_needed
+            new_total_wins = current_wins + wins_needed
+            actual_new_wr = (new_total_wins / new_total_matches) * 100
+
+        columns['wins_needed'].append(wins_needed)
+        columns['current_wins'].append(current_wins)
+        columns['new_total_matches'].append(new_total_matches)
+        columns['new_total_wins'].append(new_total_wins)
+        columns['actual_new_wr'].append(actual_new_wr)
+        columns['error'].append(error)
+    return columns
+
+
+def calculate_batch(total_matches: Sequence, current_wr: Sequence, desired_wr: Sequence) -> Dict[str, list]:
+    """
+    Пакетная версия calculate_wins_needed.
+
+    Принимает массивы одинаковой длины и возвращает столбцы результата
+    (см. RESULT_COLUMNS); в столбце ``error`` - код ошибки строки (OK = 0).
+    Строки с NaN в винрейте помечаются как ERR_PARSE.
+    """
+    if load_numpy() is not None:
+        return _calculate_numpy(total_matches, current_wr, desired_wr)
+    return _calculate_python(total_matches, current_wr, desired_wr)
+
+
+def _parse_number(value: str) -> float:
+    return float(value.strip().replace(',', '.').rstrip('%'))
+
+
+def split_fields(line: str) -> List[str]:
+    """
+    Поля строки таблицы: разделители ``;``, табуляция или ``|``, иначе пробелы
+    (запятая рядом с пробелом - тоже разделитель, без пробела - десятичная),
+    а без пробелов - запятые в формате CSV.
+    """
+    if _SPLIT_RE.search(line):
+        fields = _SPLIT_RE.split(line)
+    else:
+        spaced = _COMMA_SPACE_RE.sub(' ', line)
+        if len(spaced.split()) >= 3:
+            fields = spaced.split()
+        else:
+            fields = next(csv.reader([line]))
+    return [field.strip() for field in fields if field.strip()]
+
+
+def _checked_matches(matches: float) -> int:
+    # NaN и бесконечность не проходят сравнение
+    if not abs(matches) <= MAX_MATCHES:
+        raise ValueError(f"Неверное число матчей: {matches}")
+    return int(matches)
+
+
+def parse_matches(value: str) -> int:
+    """Число матчей; ValueError, если это не конечное число или оно больше MAX_MATCHES"""
+    return _checked_matches(_parse_number(value))
+
+
+def parse_rows(text: str) -> Dict[str, list]:
+    """
+    Разбор строк вида ``[герой] матчи текущий_WR желаемый_WR``.
+
+    Поля разделяются пробелами, ``;``, табуляцией или ``|`` (десятичная
+    запятая допускается), а также запятыми в формате CSV. Строки, которые не
+    удалось разобрать (или с числом матчей не конечным либо больше
+    MAX_MATCHES), получают NaN и код ERR_PARSE; строка заголовка пропускается.
+    """
+    rows = {'name': [], 'total_matches': [], 'current_wr': [], 'desired_wr': []}
+    lines = [line for line in text.splitlines() if line.strip()]
+    for index, line in enumerate(lines):
+        fields = split_fields(line)
+
+        try:
+            if len(fields) < 3:
+                raise ValueError
+            matches = _parse_number(fields[-3])
+            current = _parse_number(fields[-2])
+            desired = _parse_number(fields[-1])
+            name = " ".join(fields[:-3]) or str(len(rows['name']) + 1)
+        except ValueError:
+            if index == 0:
+                continue  # заголовок таблицы
+            matches = None
+
+        if matches is not None:
+            try:
+                matches = _checked_matches(matches)
+            except ValueError:
+                matches = None
+        if matches is None:
+            matches, current, desired = 0, float('nan'), float('nan')
+            name = line.strip()
+
+        rows['name'].append(name)
+        rows['total_matches'].append(matches)
+        rows['current_wr'].append(current)
+        rows['desired_wr'].append(desired)
+    return rows
+
+
+def format_table(rows: Dict[str, list], results: Dict[str, list], limit: int = 40) -> str:
+    """Сводная таблица (HTML, моноширинный блок) и итог по всем строкам"""
+    errors = results['error']
+    ok_count = errors.count(OK)
+    total_wins = sum(results['wins_needed'])
+
+    lines = [f"{'Герой':<12} {'Матчи':>6} {'WR':>6} {'Цель':>6} {'Побед':>6}"]
+    for i in range(min(limit, len(errors))):
+        name = rows['name'][i][:12]
+        if errors[i] == OK:
+            lines.append(
+                f"{name:<12} {rows['total_matches'][i]:>6} {rows['current_wr'][i]:>6.1f} "
+                f"{rows['desired_wr'][i]:>6.1f} {results['wins_needed'][i]:>6}"
+            )
+        else:
+            lines.append(f"{name:<12} ❌ {ERROR_MESSAGES[errors[i]]}")
+    if len(errors) > limit:
+        lines.append(f"... и ещё {len(errors) - limit} строк (полная таблица в файле)")
+
+    table = "\n".join(lines).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return (
+        "📋 <b>ПАКЕТНЫЙ РАСЧЁТ</b>\n\n"
+        f"<pre>{table}</pre>\n\n"
+        f"✅ Рассчитано: <b>{ok_count}</b> из {len(errors)}\n"
+        f"🏆 Всего побед подряд: <b>{total_wins}</b>"
+    )
+
+
+def to_csv(rows: Dict[str, list], results: Dict[str, list]) -> bytes:
+    """Полная таблица результатов в CSV"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['hero', 'matches', 'current_wr', 'desired_wr', 'wins_needed',
+                     'new_total_matches', 'actual_new_wr', 'error'])
+    for i, error in enumerate(results['error']):
+        writer.writerow([
+            rows['name'][i],
+            rows['total_matches'][i],
+            rows['current_wr'][i],
+            rows['desired_wr'][i],
+            results['wins_needed'][i],
+            results['new_total_matches'][i],
+            f"{results['actual_new_wr'][i]:.2f}",
+            ERROR_MESSAGES.get(error, ''),
+        ])
+    return output.getvalue().encode('utf-8-sig')
@@ -0,0 +1,137 @@
+"""
+Нагрузочный тест рассылки на фальшивом Bot API: 100 тыс. получателей, задержка
+сети, заблокировавшие бота пользователи, ошибки 429 при превышении лимита и
+"перезапуск" посреди рассылки с продолжением с контрольной точки.
+
+    python benchmarks/bench_broadcast.py
+    python benchmarks/bench_broadcast.py --users 20000 --rate 2000 --restart-at 0.3
+    python benchmarks/bench_broadcast.py --users 10000 --rate 1000 --send-rate 2000   # планировщик выше лимита API
+"""
+import argparse
+import asyncio
+import collections
+import os
+import random
+import tempfile
+import time
+
+from mock_bot import MockSession, setup_env
+
+setup_env()
+
+from aiogram import Bot  # noqa: E402
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter  # noqa: E402
+
+from broadcast import BroadcastStore, Broadcaster  # noqa: E402
+from sender import SendScheduler, TokenBucket  # noqa: E402
+
+ADMIN_CHAT_ID = 1
+
+
+class FakeApi(MockSession):
+    """Bot API с задержкой, блокировками и собственным лимитом (отвечает 429 при превышении)"""
+
+    def __init__(self, rate: float, latency: float, blocked: set):
+        super().__init__(record=False)
+        self.limit = TokenBucket(rate, rate)
+        self.latency = latency
+        self.blocked = blocked
+        self.delivered = collections.Counter()
+        self.flood_errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+            chat_id = getattr(method, "chat_id", None)
+            if method.__api_method__ == "sendMessage" and chat_id != ADMIN_CHAT_ID:
+                now = time.monotonic()
+                if self.limit.delay(now) > 0:
+                    self.flood_errors += 1
+                    raise TelegramRetryAfter(method, "Too Many Requests: retry after 1", 1)
+                self.limit.take(now)
+                if chat_id in self.blocked:
+                    raise TelegramForbiddenError(method, "Forbidden: bot was blocked by the user")
+                self.delivered[chat_id] += 1
+            return await super().make_request(bot, method, timeout)
+        finally:
+            self.in_flight -= 1
+
+
+def make_bot(api: FakeApi, send_rate: float) -> Bot:
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=api)
+    bot.session.middleware(SendScheduler(global_rate=send_rate, chat_rate=1, chat_burst=3))
+    return bot
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = random.Random(1)
+    user_ids = rng.sample(range(10_000, 10_000_000), args.users)
+    blocked = set(rng.sample(user_ids, int(args.users * args.blocked)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = BroadcastStore(os.path.join(directory, "broadcast.sqlite3"))
+        started = time.perf_counter()
+        for user_id in user_ids:
+            store.touch(user_id)
+        await store.flush()
+        print(f"Реестр: {args.users} пользователей за {time.perf_counter() - started:.2f} с")
+
+        api = FakeApi(args.rate, args.latency, blocked)
+        # По умолчанию планировщик держит темп чуть ниже лимита API, как с настоящим
+        # Telegram; --send-rate выше лимита проверяет обработку ответов 429
+        bot = make_bot(api, args.send_rate or args.rate * 0.95)
+        broadcaster = Broadcaster(store, bot, concurrency=args.concurrency, chunk_size=args.chunk,
+                                  progress_interval=args.progress_interval)
+
+        started = time.perf_counter()
+        state = await broadcaster.start("📢 Тестовая рассылка", ADMIN_CHAT_ID)
+        restarted = False
+        while True:
+            await asyncio.sleep(0.1)
+            current = await store.get(state.id)
+            done = current.sent + current.blocked + current.failed
+            if not restarted and done >= args.users * args.restart_at:
+                # "Перезапуск": задачи рассылки отменяются посреди порции,
+                # новый процесс продолжает с последней контрольной точки
+                await broadcaster.close()
+                broadcaster = Broadcaster(store, bot, concurrency=args.concurrency, chunk_size=args.chunk,
+                                          progress_interval=args.progress_interval)
+                await broadcaster.resume()
+                restarted = True
+                print(f"Перезапуск после {done} получателей")
+            if current.status != "running":
+                break
+        elapsed = time.perf_counter() - started
+        await broadcaster.close()
+
+        final = await store.get(state.id)
+        duplicates = sum(count - 1 for count in api.delivered.values() if count > 1)
+        missing = sum(1 for user_id in user_ids if user_id not in blocked and user_id not in api.delivered)
+        print(f"Статус: {final.status}; доставлено {final.sent}, заблокировали {final.blocked}, "
+              f"ошибок {final.failed}")
+        print(f"Время: {elapsed:.1f} с, {args.users / elapsed:.0f} получателей/с "
+              f"(лимит API {args.rate:.0f}/с)")
+        print(f"Ответов 429: {api.flood_errors}, одновременных запросов: до {api.max_in_flight}")
+        print(f"Повторных доставок после перезапуска: {duplicates} (не больше порции {args.chunk}), "
+              f"не доставлено: {missing}")
+        print(f"Осталось в рассылке получателей: {await store.count_users()} "
+              f"(заблокировавшие исключены)")
+        await store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--rate", type=float, default=5000, help="лимит фальшивого API, сообщений/с")
+    parser.add_argument("--send-rate", type=float, default=0, help="лимит планировщика (по умолчанию 0.95 * rate)")
+    parser.add_argument("--latency", type=float, default=0.005, help="задержка ответа API (сек)")
+    parser.add_argument("--blocked", type=float, default=0.05, help="доля заблокировавших бота")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--chunk", type=int, default=200)
+    parser.add_argument("--restart-at", type=float, default=0.5, help="доля получателей до перезапуска")
+    parser.add_argument("--progress-interval", type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
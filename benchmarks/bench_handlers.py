@@ -0,0 +1,236 @@
+"""
+Бенчмарк задержки обработчиков: синтетические обновления проходят через
+dp.feed_update с фальшивой сессией Bot API (без сети). Middleware запросов
+(планировщик отправки, метрики) остаются на пути замера; лимиты планировщика
+подняты, чтобы замерялась его работа, а не ожидание токенов. Задержка
+INLINE_DEBOUNCE отключена: inline_calc_uncached замеряет сам расчёт без кэша.
+
+    python benchmarks/bench_handlers.py                   # прогон и сравнение с baseline.json
+    python benchmarks/bench_handlers.py --save-baseline   # сохранить результат как новый baseline
+    python benchmarks/bench_handlers.py -k inline         # только сценарии с "inline" в имени
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from mock_bot import (
+    ADMIN_ID,
+    MockSession,
+    callback_update,
+    chat_member_update,
+    inline_update,
+    install_session,
+    message_update,
+    setup_env,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+Builder = Callable[[int, int], object]
+
+
+def text(value: str) -> Builder:
+    return lambda user_id, update_id: message_update(value, user_id, update_id=update_id)
+
+
+def admin_text(value: str) -> Builder:
+    return lambda user_id, update_id: message_update(value, ADMIN_ID, update_id=update_id)
+
+
+def callback(data: str, from_admin: bool = False) -> Builder:
+    return lambda user_id, update_id: callback_update(data, ADMIN_ID if from_admin else user_id, update_id)
+
+
+# Долгие сценарии: число замеров ограничено, чтобы прогон не растягивался на минуты
+MAX_ITERATIONS = {"inline_calc_uncached": 100}
+
+_unique_queries = itertools.count()
+
+
+def unique_inline(user_id: int, update_id: int):
+    # Матчи 100-999 и текущий винрейт с шагом 0.1: ни один запрос не повторяется
+    n = next(_unique_queries)
+    return inline_update(f"{100 + n % 900} {40 + n // 900 * 0.1:.1f} 60", user_id, update_id)
+
+
+# Сценарий: (подготовительные обновления без замера, замеряемое обновление)
+SCENARIOS: Dict[str, Tuple[List[Builder], Builder]] = {
+    "bot_added_to_chat": ([], lambda user_id, update_id: chat_member_update(-user_id, update_id)),
+    "cmd_start": ([], text("/start")),
+    "cmd_help": ([], text("/help")),
+    "cmd_calc": ([], text("/calc")),
+    "process_matches": ([text("/calc")], text("100")),
+    "process_current_wr": ([text("/calc"), text("100")], text("55.5")),
+    "process_desired_wr": ([text("/calc"), text("100"), text("55.5")], text("60")),
+    "inline_calc": ([], lambda user_id, update_id: inline_update(f"{100 + user_id % 50} 55 60", user_id, update_id)),
+    # Каждый запрос новый: расчёт и реалистичный путь без кэша (задержка INLINE_DEBOUNCE отключена)
+    "inline_calc_uncached": ([], lambda user_id, update_id: unique_inline(user_id, update_id)),
+    "inline_calc_partial": ([], lambda user_id, update_id: inline_update("100 5", user_id, update_id)),
+    "inline_calc_empty": ([], lambda user_id, update_id: inline_update("", user_id, update_id)),
+    "cmd_admin": ([], text("/admin")),
+    "process_admin_message": ([text("/admin")], text("Привет, админ!")),
+    "callback_admin_confirm_yes": ([text("/admin"), text("Привет, админ!")], callback("admin_confirm_yes")),
+    "callback_reply_to_user": ([], callback("reply_to_42", from_admin=True)),
+    "process_admin_reply": ([callback("reply_to_42", from_admin=True)], admin_text("Ответ пользователю")),
+    "unknown_message": ([], text("абракадабра")),
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * q))
+    return sorted_values[index]
+
+
+async def run_scenario(calculator, name: str, iterations: int, warmup: int, user_base: int) -> dict:
+    from aiogram.methods import TelegramMethod
+
+    bot, dp = calculator.bot, calculator.dp
+    setup, measured = SCENARIOS[name]
+    timings = []
+    update_id = 0
+    for i in range(warmup + iterations):
+        user_id = user_base + i
+        for builder in setup:
+            update_id += 1
+            await dp.feed_update(bot, builder(user_id, update_id))
+
+        update_id += 1
+        update = measured(user_id, update_id)
+        started = time.perf_counter()
+        response = await dp.feed_update(bot, update)
+        # Как при polling: метод, возвращённый обработчиком, тоже отправляется
+        if isinstance(response, TelegramMethod):
+            await bot(response)
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            timings.append(elapsed)
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        "p50_us": percentile(timings, 0.50) * 1e6,
+        "p95_us": percentile(timings, 0.95) * 1e6,
+        "p99_us": percentile(timings, 0.99) * 1e6,
+        "updates_per_sec": len(timings) / total if total else 0.0,
+    }
+
+
+def calibrate() -> float:
+    """
+    Время (мкс) эталонной работы - разбор и сериализация обновлений pydantic,
+    как в aiogram. Замеряется перед каждым сценарием, и p50 сравнивается с
+    baseline с поправкой на скорость машины в этот момент: общий «шум»
+    (частота CPU, соседние процессы) замедляет и эталон, и обработчики.
+    """
+    timings = []
+    for _ in range(15):
+        started = time.perf_counter()
+        for i in range(20):
+            message_update("/start", i, update_id=i).model_dump_json()
+        timings.append(time.perf_counter() - started)
+    return percentile(sorted(timings), 0.5) * 1e6
+
+
+def print_report(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float,
+                 min_delta_us: float) -> List[str]:
+    regressions = []
+    header = f"{'обработчик':<28} {'p50, мкс':>10} {'p95, мкс':>10} {'p99, мкс':>10} {'обн/с':>10}"
+    if baseline:
+        header += f" {'Δp50':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in results.items():
+        line = (
+            f"{name:<28} {stats['p50_us']:>10.1f} {stats['p95_us']:>10.1f} "
+            f"{stats['p99_us']:>10.1f} {stats['updates_per_sec']:>10.0f}"
+        )
+        base = baseline.get(name)
+        if base:
+            expected = base["p50_us"]
+            if base.get("calibration_us"):
+                expected *= stats["calibration_us"] / base["calibration_us"]
+            delta = stats["p50_us"] / expected - 1
+            line += f" {delta:>+7.0%}"
+            if delta > threshold and stats["p50_us"] - expected > min_delta_us:
+                line += "  ⚠️ регрессия"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+async def main(args: argparse.Namespace) -> int:
+    setup_env(
+        FSM_STORAGE=args.storage,
+        SEND_GLOBAL_RATE="1000000",
+        SEND_CHAT_RATE="1000000",
+        SEND_CHAT_BURST="1000000",
+        SEND_GROUP_RATE_PER_MIN="1000000",
+        INLINE_DEBOUNCE="0",
+    )
+    logging.basicConfig(level=logging.WARNING)
+
+    import calculator
+
+    # Предупреждения обработчиков (например, о неполных inline-запросах) не нужны в отчёте
+    logging.disable(logging.WARNING)
+    session = install_session(calculator.bot, MockSession(record=False))
+    print("Middleware запросов: " + (", ".join(type(m).__name__ for m in session.middleware) or "нет") + "\n")
+
+    # Несколько проходов по всем сценариям: один замер на общей машине
+    # колеблется на десятки процентов
+    names = [name for name in SCENARIOS if not args.filter or args.filter in name]
+    rounds: Dict[str, List[dict]] = {name: [] for name in names}
+    for round_index in range(args.rounds):
+        for scenario_index, name in enumerate(names):
+            user_base = 10_000 + 100_000 * (round_index * len(names) + scenario_index)
+            iterations = min(args.iterations, MAX_ITERATIONS.get(name, args.iterations))
+            calibration = calibrate()
+            stats = await run_scenario(calculator, name, iterations, min(args.warmup, iterations), user_base)
+            stats["calibration_us"] = calibration
+            rounds[name].append(stats)
+    await calculator.dp.storage.close()
+    # Проход с медианным p50 относительно эталона: выбросы в обе стороны отбрасываются
+    results = {
+        name: sorted(runs, key=lambda stats: stats["p50_us"] / stats["calibration_us"])[len(runs) // 2]
+        for name, runs in rounds.items()
+    }
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH) and not args.save_baseline:
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    regressions = print_report(results, baseline, args.threshold, args.min_delta_us)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(
+                {"storage": args.storage, "iterations": args.iterations, "rounds": args.rounds,
+                 "results": results},
+                f, indent=2, ensure_ascii=False
+            )
+        print(f"\nBaseline сохранён: {BASELINE_PATH}")
+    elif regressions:
+        print(f"\nРегрессии (p50 хуже baseline более чем на {args.threshold:.0%} и {args.min_delta_us:g} мкс): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("-r", "--rounds", type=int, default=5, help="проходов по сценариям (берётся медианный)")
+    parser.add_argument("-k", "--filter", default="", help="подстрока имени сценария")
+    parser.add_argument("--storage", default="memory", choices=["memory", "sqlite"], help="хранилище FSM")
+    parser.add_argument("--threshold", type=float, default=0.5, help="допустимое ухудшение p50")
+    parser.add_argument("--min-delta-us", type=float, default=100,
+                        help="ухудшение p50 меньше этого (мкс) не считается регрессией")
+    parser.add_argument("--save-baseline", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,78 @@
+"""
+Бенчмарк истории расчётов: стоимость history.add() на горячем пути и время
+чтения страницы /history по мере роста таблицы до миллионов строк.
+
+    python benchmarks/bench_history.py
+    python benchmarks/bench_history.py --max-rows 5000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import SOURCE_PRIVATE, HistoryStore  # noqa: E402
+
+USERS = 50_000
+
+
+def fill(store: HistoryStore, count: int, rng: random.Random) -> None:
+    """Быстрое наполнение таблицы напрямую, минуя очередь"""
+    now = time.time()
+    chunk = []
+    for _ in range(count):
+        chunk.append((rng.randrange(USERS), now, SOURCE_PRIVATE, 100, 55.0, 60.0, 13))
+        if len(chunk) == 50_000:
+            store._insert_many_sync(chunk)
+            chunk = []
+    if chunk:
+        store._insert_many_sync(chunk)
+
+
+async def measure_pages(store: HistoryStore, rng: random.Random, queries: int) -> tuple:
+    timings = []
+    for _ in range(queries):
+        user_id = rng.randrange(USERS)
+        started = time.perf_counter()
+        entries = await store.page(user_id, limit=30)
+        if entries:
+            await store.page(user_id, entries[-1].id, limit=10)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        store = HistoryStore(os.path.join(directory, "history.sqlite3"), flush_interval=0.05)
+
+        started = time.perf_counter()
+        for i in range(args.adds):
+            store.add(i % USERS, SOURCE_PRIVATE, 100, 55.0, 60.0, 13)
+        add_cost = (time.perf_counter() - started) / args.adds
+        await store.flush()
+        print(f"history.add(): {add_cost * 1e6:.2f} мкс на вызов (запись на диск - в фоне)")
+
+        print(f"\n{'строк':>10} {'p50, мс':>9} {'p95, мс':>9}")
+        rows = args.adds
+        size = 10_000
+        while size <= args.max_rows:
+            fill(store, size - rows, rng)
+            rows = size
+            p50, p95 = await measure_pages(store, rng, args.queries)
+            print(f"{rows:>10} {p50 * 1000:>9.3f} {p95 * 1000:>9.3f}")
+            size *= 10
+        await store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=500, help="запросов /history на каждый размер")
+    parser.add_argument("--adds", type=int, default=5000, help="вызовов add() для замера")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,153 @@
+"""
+Нагрузочный тест полос обработки (lanes.py): задержка шагов диалога (/calc и
+три ответа) и ответа админа без нагрузки и во время потока inline-запросов
+(разные пользователи и числа - без попаданий в кэш), с полосами и без них.
+Обновления обрабатываются в отдельных задачах, как при polling; Bot API
+фальшивый. Каждый прогон - в отдельном процессе (настройки читаются при
+импорте calculator); прогон без полос ещё несколько минут дорабатывает
+накопившиеся inline-запросы.
+
+    python benchmarks/bench_lanes.py
+    python benchmarks/bench_lanes.py --flood-rate 3000 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from mock_bot import ADMIN_ID, ROOT, MockSession, callback_update, inline_update, message_update, setup_env
+
+DIALOG = ("/calc", "100", "55.5", "60")
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+async def child(args: argparse.Namespace) -> dict:
+    setup_env(FSM_STORAGE="memory", METRICS_ENABLED="false", THROTTLE_ENABLED="false",
+              LANES_ENABLED="true" if args.lanes else "false", LOG_LEVEL="WARNING")
+    from aiogram.methods import TelegramMethod
+
+    import calculator
+
+    bot, dp = calculator.bot, calculator.dp
+    bot.session = MockSession(record=False)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    rng = random.Random(1)
+    update_ids = iter(range(1, 10 ** 9))
+    tasks = set()
+    inline_done = 0
+
+    def mounted(update):
+        # Как при polling: обновление привязано к боту и не пересобирается в feed_update
+        return type(update).model_validate(update.model_dump(), context={"bot": bot})
+
+    async def feed(update) -> None:
+        response = await dp.feed_update(bot, update)
+        if isinstance(response, TelegramMethod):
+            await dp.silent_call_request(bot, response)
+
+    async def timed(update) -> float:
+        # Отдельная задача, как при polling: ждём её целиком
+        started = time.perf_counter()
+        await asyncio.create_task(feed(update))
+        return time.perf_counter() - started
+
+    # Обновления потока собираются заранее: разбор JSON при получении - не часть замера
+    flood_updates = [
+        mounted(inline_update(
+            f"{rng.randint(50, 5000)} {rng.uniform(40, 60):.1f} {rng.uniform(61, 75):.1f}",
+            rng.randint(10 ** 6, 10 ** 9), 10 ** 8 + i
+        ))
+        for i in range(int(args.flood_rate * args.duration))
+    ]
+
+    async def flood(deadline: float) -> None:
+        nonlocal inline_done
+        started = time.perf_counter()
+        while inline_done < len(flood_updates) and time.perf_counter() < deadline:
+            # Равномерный поток: догоняем расписание каждую миллисекунду
+            due = min(len(flood_updates), int((time.perf_counter() - started) * args.flood_rate))
+            for update in flood_updates[inline_done:due]:
+                task = asyncio.create_task(feed(update))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            inline_done = max(inline_done, due)
+            await asyncio.sleep(0.001)
+
+    async def dialogs(deadline: float, steps: list, admin: list) -> None:
+        user_id = 10_000
+        while time.perf_counter() < deadline:
+            user_id += 1
+            for text in DIALOG:
+                steps.append(await timed(mounted(message_update(text, user_id, update_id=next(update_ids)))))
+            await timed(mounted(callback_update(f"reply_to_{user_id}", ADMIN_ID, next(update_ids))))
+            admin.append(await timed(mounted(message_update("Ответ пользователю", ADMIN_ID, update_id=next(update_ids)))))
+            await asyncio.sleep(args.dialog_pause)
+
+    steps, admin = [], []
+    deadline = time.perf_counter() + args.duration
+    jobs = [dialogs(deadline, steps, admin)]
+    if args.flood_rate:
+        jobs.append(flood(deadline))
+    await asyncio.gather(*jobs)
+    backlog = len(tasks)
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+
+    result = {
+        "steps": len(steps),
+        "step_p50": percentile(steps, 0.5), "step_p95": percentile(steps, 0.95), "step_p99": percentile(steps, 0.99),
+        "admin_p50": percentile(admin, 0.5), "admin_p95": percentile(admin, 0.95),
+        "inline_sent": inline_done, "inline_answered": bot.session.counts["answerInlineQuery"],
+        "backlog": backlog,
+    }
+    if args.lanes:
+        result["shed"] = calculator.update_scheduler.lanes["inline"].shed
+    return result
+
+
+def run(lanes: bool, flood_rate: int, args: argparse.Namespace) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--child",
+               "--flood-rate", str(flood_rate), "--duration", str(args.duration),
+               "--dialog-pause", str(args.dialog_pause)]
+    if lanes:
+        command.append("--lanes")
+    output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args: argparse.Namespace) -> None:
+    print(f"Поток inline: {args.flood_rate} запросов/с, {args.duration:g} с; диалог /calc из 4 шагов "
+          f"и ответ админа, пауза {args.dialog_pause:g} с")
+    print(f"{'':<26} {'шагов':>6} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} {'админ p95':>10} "
+          f"{'inline: ответов':>16} {'отброшено':>10}")
+    for label, lanes, rate in (
+        ("без нагрузки", False, 0),
+        ("поток inline, без полос", False, args.flood_rate),
+        ("поток inline, с полосами", True, args.flood_rate),
+    ):
+        r = run(lanes, rate, args)
+        inline = f"{r['inline_answered']}/{r['inline_sent']}" if rate else "-"
+        print(f"{label:<26} {r['steps']:>6} {r['step_p50'] * 1e3:>8.1f} {r['step_p95'] * 1e3:>8.1f} "
+              f"{r['step_p99'] * 1e3:>8.1f} {r['admin_p95'] * 1e3:>10.1f} {inline:>16} {r.get('shed', '-'):>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flood-rate", type=int, default=2000, help="inline-запросов в секунду")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность прогона (сек)")
+    parser.add_argument("--dialog-pause", type=float, default=0.05, help="пауза между диалогами (сек)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--lanes", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(asyncio.run(child(args))))
+    else:
+        main(args)
@@ -0,0 +1,125 @@
+"""
+Сколько времени цикл событий тратит на логирование: прежняя схема
+(basicConfig, f-строки, запись в файл прямо в обработчике) против очереди с
+фоновым потоком (logs.py) - без прореживания и с правилами по умолчанию.
+На каждое inline-обновление пишутся две строки, как в боте: «Inline-запрос
+обработан» и итоговая строка aiogram. ``--slow-disk-ms`` добавляет задержку
+к каждому сбросу файла (медленный или занятый диск).
+
+    python benchmarks/bench_logging.py
+    python benchmarks/bench_logging.py --updates 5000 --slow-disk-ms 1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from logging.handlers import QueueListener
+from queue import SimpleQueue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from logs import TEXT_FORMAT, JsonFormatter, LazyQueueHandler, LogFilter, current_update_id, parse_sampling  # noqa: E402
+
+QUERY = "150 52.5 60 55"
+
+
+class SlowFileHandler(logging.FileHandler):
+    """Файл, сброс которого занимает ``delay`` секунд"""
+
+    def __init__(self, path: str, delay: float):
+        super().__init__(path, encoding="utf-8")
+        self.delay = delay
+
+    def flush(self) -> None:
+        super().flush()
+        if self.delay:
+            time.sleep(self.delay)
+
+
+async def ticker(lags: list, stop: asyncio.Event) -> None:
+    """Задержки пробуждения по таймеру 1 мс - насколько цикл был занят"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + 0.001
+        await asyncio.sleep(0.001)
+        lags.append(loop.time() - expected)
+
+
+async def feed(label: str, handler: logging.Handler, lazy: bool, args: argparse.Namespace) -> None:
+    # Те же имена логгеров, что и в боте: по ним выбираются правила прореживания
+    log, event_log = logger_for("calculator", handler), logger_for("aiogram.event", handler)
+    lags, stop = [], asyncio.Event()
+    watcher = asyncio.create_task(ticker(lags, stop))
+    blocked = 0.0
+    for update_id in range(args.updates):
+        current_update_id.set(update_id)
+        started = time.perf_counter()
+        if lazy:
+            log.info("Inline-запрос обработан: %s", QUERY, extra={"event": "inline"})
+            event_log.info("Update id=%s is %s. Duration %d ms by bot id=%d", update_id, "handled", 3, 123456)
+        else:
+            log.info(f"Inline-запрос обработан: {QUERY}")
+            event_log.info(f"Update id={update_id} is handled. Duration 3 ms by bot id=123456")
+        blocked += time.perf_counter() - started
+        if update_id % args.batch == 0:
+            await asyncio.sleep(0)
+    stop.set()
+    await watcher
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+    print(f"{label:<34} {blocked / args.updates * 1e6:>8.1f} {blocked * 1e3:>9.0f} "
+          f"{p99 * 1e3:>9.2f} {(lags[-1] if lags else 0) * 1e3:>9.2f}")
+
+
+def logger_for(name: str, handler: logging.Handler) -> logging.Logger:
+    log = logging.getLogger(name)
+    log.propagate = False
+    log.handlers = [handler]
+    log.setLevel(logging.INFO)
+    return log
+
+
+async def main(args: argparse.Namespace) -> None:
+    delay = args.slow_disk_ms / 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.updates} inline-обновлений, сброс файла +{args.slow_disk_ms:g} мс, "
+              f"LOG_SAMPLING={config.LOG_SAMPLING}")
+        print(f"{'':<34} {'мкс/обн':>8} {'всего, мс':>9} {'p99 лаг':>9} {'макс лаг':>9}")
+
+        output = SlowFileHandler(os.path.join(tmp, "sync.log"), delay)
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+        await feed("basicConfig, f-строки", output, False, args)
+        output.close()
+
+        rules = {
+            "очередь, JSON, без прореживания": {},
+            "очередь, JSON, LOG_SAMPLING": parse_sampling(config.LOG_SAMPLING),
+        }
+        for number, (label, sampling) in enumerate(rules.items()):
+            output = SlowFileHandler(os.path.join(tmp, f"queue{number}.log"), delay)
+            output.setFormatter(JsonFormatter())
+            records = SimpleQueue()
+            listener = QueueListener(records, output)
+            handler = LazyQueueHandler(records)
+            log_filter = LogFilter(sampling)
+            handler.addFilter(log_filter)
+            listener.start()
+            await feed(label, handler, True, args)
+            started = time.perf_counter()
+            listener.stop()
+            output.close()
+            stats = log_filter.stats()
+            print(f"{'':<34} фоновый поток дописал за {(time.perf_counter() - started) * 1e3:.0f} мс, "
+                  f"записано строк: {stats['written']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=20000, help="inline-обновлений")
+    parser.add_argument("--batch", type=int, default=10, help="обновлений между переключениями цикла")
+    parser.add_argument("--slow-disk-ms", type=float, default=0.0, help="задержка сброса файла (мс)")
+    asyncio.run(main(parser.parse_args()))
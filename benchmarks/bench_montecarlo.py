@@ -0,0 +1,72 @@
+"""
+Бенчмарк реалистичного пути: время моделирования 10^5 и 10^6 путей для
+разных сценариев (с NumPy и без) и стоимость ответа из кэша.
+
+    python benchmarks/bench_montecarlo.py
+    python benchmarks/bench_montecarlo.py --horizon 5000 --no-python
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch  # noqa: E402
+from montecarlo import MonteCarloEngine, quantize, simulate  # noqa: E402
+
+# (матчи, текущий WR, цель, шанс победы)
+SCENARIOS = [
+    (100, 55, 60, 70),
+    (100, 55, 60, 60),
+    (100, 55, 60, 55),
+    (1000, 50, 55, 56),
+    (5000, 50, 55, 52),
+]
+
+
+def measure(key, paths: int, horizon: int) -> tuple:
+    started = time.perf_counter()
+    result = simulate(key, paths, horizon)
+    return time.perf_counter() - started, result
+
+
+def report(label: str, paths_list, args: argparse.Namespace) -> None:
+    print(f"\n{label}")
+    print(f"{'сценарий':<22} {'путей':>8} {'мс':>8} {'медиана':>8} {'p90':>6} {'дойдут':>7}")
+    for scenario in SCENARIOS:
+        key = quantize(*scenario)
+        for paths in paths_list:
+            seconds, result = measure(key, paths, args.horizon)
+            median = result.median if result.median is not None else f">{args.horizon}"
+            p90 = result.p90 if result.p90 is not None else f">{args.horizon}"
+            print(f"{' '.join(f'{value:g}' for value in scenario):<22} {paths:>8} {seconds * 1000:>8.1f} "
+                  f"{median:>8} {p90:>6} {result.reached * 100:>6.1f}%")
+
+
+async def measure_cache(args: argparse.Namespace) -> None:
+    engine = MonteCarloEngine(paths=100000, horizon=args.horizon)
+    await engine.run(100, 55, 60, 60)
+    started = time.perf_counter()
+    for _ in range(10000):
+        await engine.run(100, 55.04, 60.01, 60.2)
+    print(f"\nОтвет из кэша (округлённый ключ): {(time.perf_counter() - started) / 10000 * 1e6:.1f} мкс")
+
+
+def main(args: argparse.Namespace) -> None:
+    if batch.load_numpy() is None:
+        print("NumPy не установлен - только вариант на чистом Python")
+    else:
+        report("NumPy", (100_000, 1_000_000), args)
+    asyncio.run(measure_cache(args))
+    if not args.no_python:
+        batch.np, batch._numpy_checked = None, True
+        report("Без NumPy", (100_000,), args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--horizon", type=int, default=3000, help="предел матчей")
+    parser.add_argument("--no-python", action="store_true", help="не замерять вариант без NumPy")
+    main(parser.parse_args())
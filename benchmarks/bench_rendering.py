@@ -0,0 +1,94 @@
+"""
+Микробенчмарк отрисовки результата: прежний путь (f-строка и сборка прогресс-бара
+при каждом вызове) против rendering.render_result (готовый шаблон и таблица баров).
+
+    python benchmarks/bench_rendering.py
+    python benchmarks/bench_rendering.py -n 200000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import calculate_batch  # noqa: E402
+from rendering import render_result  # noqa: E402
+
+
+def legacy_progress_bar(current: float, goal: float, length: int = 10) -> str:
+    percentage = min(current / goal * 100, 100) if goal > 0 else 0
+    filled = int(length * percentage / 100)
+    bar = "🟩" * filled + "⬜" * (length - filled)
+    return f"{bar} {percentage:.1f}%"
+
+
+def legacy_render(total_matches: int, current_wr: float, desired_wr: float, result: dict) -> str:
+    if 'error' in result:
+        return f"❌ <b>Ошибка:</b> {result['error']}"
+
+    progress_bar = legacy_progress_bar(current_wr, desired_wr)
+    return (
+        "╔════════════════════════╗\n"
+        "║  ✅ <b>РАСЧЁТ ЗАВЕРШЁН!</b> ✅  ║\n"
+        "╚════════════════════════╝\n\n"
+        f"📊 <b>ИСХОДНЫЕ ДАННЫЕ:</b>\n"
+        f"┣ Матчей: <code>{total_matches}</code>\n"
+        f"┣ Текущий WR: <code>{current_wr:.1f}%</code>\n\n"
+        f"{progress_bar}\n\n"
+        f"🎯 <b>ЦЕЛЬ: {desired_wr:.1f}%</b>\n\n"
+        f"🏆 <b>НУЖНО ВЫИГРАТЬ ПОДРЯД:</b>\n"
+        f"<b><u>{result['wins_needed']} матч(ей)</u></b> 🔥\n\n"
+        f"📈 <b>ИТОГОВАЯ СТАТИСТИКА:</b>\n"
+        f"┣ Всего матчей: <code>{result['new_total_matches']}</code>\n"
+        f"┗ Итоговый WR: <code>{result['actual_new_wr']:.2f}%</code>\n\n"
+        f"💪 <b>Удачи на поле боя!</b> 🎮"
+    )
+
+
+def make_inputs(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    matches = [rng.randint(1, 5000) for _ in range(count)]
+    current = [round(rng.uniform(30, 70), 2) for _ in range(count)]
+    desired = [round(c + rng.uniform(-2, 20), 2) for c in current]
+    columns = calculate_batch(matches, current, desired)
+    inputs = []
+    for i in range(count):
+        if columns['error'][i]:
+            result = {'error': 'Желаемый винрейт должен быть выше текущего'}
+        else:
+            result = {name: columns[name][i] for name in ('wins_needed', 'new_total_matches', 'actual_new_wr')}
+        inputs.append((matches[i], current[i], desired[i], result))
+    return inputs
+
+
+def main(args: argparse.Namespace) -> None:
+    inputs = make_inputs(args.inputs)
+    mismatches = sum(legacy_render(*item) != render_result(*item) for item in inputs)
+    if mismatches:
+        sys.exit(f"Тексты различаются в {mismatches} случаях из {len(inputs)}")
+
+    def run(render):
+        for item in inputs:
+            render(*item)
+
+    loops = max(1, args.number // len(inputs))
+    best = {"f-строка": float("inf"), "rendering": float("inf")}
+    # Замеры чередуются, чтобы фоновый шум одинаково влиял на оба варианта
+    for _ in range(args.repeat):
+        best["f-строка"] = min(best["f-строка"], timeit.timeit(lambda: run(legacy_render), number=loops))
+        best["rendering"] = min(best["rendering"], timeit.timeit(lambda: run(render_result), number=loops))
+
+    calls = loops * len(inputs)
+    for name, seconds in best.items():
+        print(f"{name:<10} {seconds / calls * 1e9:>8.0f} нс/вызов")
+    print(f"Ускорение: x{best['f-строка'] / best['rendering']:.2f} (тексты совпадают на {len(inputs)} входах)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--number", type=int, default=100000, help="вызовов в одном замере")
+    parser.add_argument("-r", "--repeat", type=int, default=7)
+    parser.add_argument("--inputs", type=int, default=1000, help="число разных входных данных")
+    main(parser.parse_args())
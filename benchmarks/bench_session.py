@@ -0,0 +1,106 @@
+"""
+HTTP-сессия бота против локального фальшивого Bot API: сколько соединений
+открывается (каждое - TCP-, а с api.telegram.org ещё и TLS-рукопожатие) и
+какова задержка при пачках параллельных sendMessage с паузами между ними.
+Сравниваются AiohttpSession aiogram по умолчанию и TunedAiohttpSession с
+разным keep-alive и пределом соединений на хост.
+
+    python benchmarks/bench_session.py
+    python benchmarks/bench_session.py --bursts 10 --concurrency 100 --gap 3 --latency-ms 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web  # noqa: E402
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+from mock_bot import BOT_ID  # noqa: E402
+from session import TunedAiohttpSession  # noqa: E402
+
+TOKEN = f"{BOT_ID}:BENCHMARK"
+
+
+class FakeBotAPI:
+    """Отвечает на sendMessage после задержки и считает TCP-соединения"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.transports = set()
+        self.message_id = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.transports.add(request.transport)
+        await asyncio.sleep(self.latency)
+        self.message_id += 1
+        return web.json_response({"ok": True, "result": {
+            "message_id": self.message_id, "date": int(time.time()),
+            "chat": {"id": 1, "type": "private"}, "text": "ok",
+        }})
+
+
+async def load(bot: Bot, args: argparse.Namespace) -> list:
+    latencies = []
+
+    async def send(chat_id: int) -> None:
+        started = time.perf_counter()
+        await bot.send_message(chat_id, "100 50 60")
+        latencies.append(time.perf_counter() - started)
+
+    for burst in range(args.bursts):
+        if burst:
+            await asyncio.sleep(args.gap)
+        await asyncio.gather(*(send(chat_id) for chat_id in range(1, args.concurrency + 1)))
+    return sorted(latencies)
+
+
+async def main(args: argparse.Namespace) -> None:
+    fake = FakeBotAPI(args.latency_ms / 1000)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", fake.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    api = TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")
+
+    sessions = {
+        "aiogram по умолчанию": AiohttpSession(api=api),
+        f"keep-alive {args.short_keepalive:g} с (короче паузы)": TunedAiohttpSession(
+            api=api, keepalive_timeout=args.short_keepalive),
+        "keep-alive 60 с": TunedAiohttpSession(api=api, keepalive_timeout=60),
+        f"keep-alive 60 с, {args.per_host} на хост": TunedAiohttpSession(
+            api=api, keepalive_timeout=60, limit_per_host=args.per_host),
+    }
+    total = args.bursts * args.concurrency
+    print(f"{args.bursts} пачек по {args.concurrency} sendMessage, пауза {args.gap:g} с, "
+          f"ответ сервера {args.latency_ms:g} мс")
+    print(f"{'':<30} {'соединений':>10} {'повторно':>9} {'p50, мс':>8} {'p95, мс':>8}")
+    for label, session in sessions.items():
+        fake.transports.clear()
+        bot = Bot(token=TOKEN, session=session)
+        latencies = await load(bot, args)
+        await session.close()
+        reused = f"{session.reused_connections:>9}" if isinstance(session, TunedAiohttpSession) else f"{'-':>9}"
+        print(f"{label:<30} {len(fake.transports):>10} {reused} "
+              f"{latencies[total // 2] * 1e3:>8.1f} {latencies[int(total * 0.95)] * 1e3:>8.1f}")
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bursts", type=int, default=5, help="пачек запросов")
+    parser.add_argument("--concurrency", type=int, default=50, help="параллельных запросов в пачке")
+    parser.add_argument("--gap", type=float, default=2.0, help="пауза между пачками (сек)")
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="время ответа сервера (мс)")
+    parser.add_argument("--short-keepalive", type=float, default=1.0, help="keep-alive меньше паузы (сек)")
+    parser.add_argument("--per-host", type=int, default=10, help="предел соединений на хост")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+"""
+Длительный тест хранилища FSM в памяти: миллион заброшенных диалогов (расчёт
+и сообщение админу, брошенные на середине). Сравнивается MemoryStorage из
+aiogram с BoundedMemoryStorage при пределе памяти и при коротком времени
+жизни; память процесса замеряется через tracemalloc (он замедляет работу в
+несколько раз, поэтому полный прогон занимает около 10 минут).
+
+    python benchmarks/bench_sessions.py
+    python benchmarks/bench_sessions.py --sessions 200000 --limit-mb 8 --ttl 0.5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+
+from storage import BoundedMemoryStorage, parse_state_ttls  # noqa: E402
+
+BOT_ID = 123456
+MESSAGE = "Привет! Подскажите, пожалуйста, как считается винрейт аккаунта? " * 3
+
+
+async def abandon(storage, user_id: int, rng: random.Random) -> None:
+    """Диалог, брошенный на середине, - так же, как его пишут обработчики"""
+    key = StorageKey(bot_id=BOT_ID, chat_id=user_id, user_id=user_id)
+    if rng.random() < 0.8:
+        await storage.set_state(key, "WinrateCalc:waiting_for_matches")
+        await storage.update_data(key, {"total_matches": rng.randint(1, 5000)})
+        await storage.set_state(key, "WinrateCalc:waiting_for_current_wr")
+        await storage.update_data(key, {"current_wr": round(rng.uniform(30, 70), 1)})
+        await storage.set_state(key, "WinrateCalc:waiting_for_desired_wr")
+    else:
+        await storage.set_state(key, "AdminMessage:waiting_for_message")
+        await storage.update_data(key, {
+            "user_message": MESSAGE[:rng.randint(20, len(MESSAGE))],
+            "user_id": user_id,
+            "username": f"user{user_id}",
+            "full_name": f"Игрок {user_id}",
+        })
+        await storage.set_state(key, "AdminMessage:waiting_for_confirmation")
+
+
+def sessions_of(storage) -> int:
+    if isinstance(storage, BoundedMemoryStorage):
+        return storage.sessions
+    return len(storage.storage)
+
+
+async def soak(label: str, storage, args: argparse.Namespace) -> None:
+    rng = random.Random(1)
+    print(f"\n{label}")
+    print(f"{'диалогов':>10} {'сессий':>9} {'память, МБ':>11} {'оценка, МБ':>11} {'диалогов/с':>11}")
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    step = args.sessions // 10
+    for user_id in range(1, args.sessions + 1):
+        await abandon(storage, 10_000_000 + user_id, rng)
+        if user_id % step == 0:
+            traced = (tracemalloc.get_traced_memory()[0] - baseline) / 2 ** 20
+            estimate = f"{storage.total_bytes / 2 ** 20:>11.1f}" if isinstance(storage, BoundedMemoryStorage) else f"{'-':>11}"
+            rate = user_id / (time.perf_counter() - started)
+            print(f"{user_id:>10} {sessions_of(storage):>9} {traced:>11.1f} {estimate} {rate:>11.0f}")
+    tracemalloc.stop()
+    if isinstance(storage, BoundedMemoryStorage):
+        stats = storage.stats()
+        print(f"На сессию: {stats['bytes_per_session']:.0f} байт (оценка); истекло {stats['expirations']}, "
+              f"вытеснено {stats['evictions']}")
+    await storage.close()
+
+
+async def main(args: argparse.Namespace) -> None:
+    if not args.skip_unbounded:
+        await soak("MemoryStorage (aiogram, без ограничений)", MemoryStorage(), args)
+    await soak(
+        f"BoundedMemoryStorage: предел {args.limit_mb:g} МБ",
+        BoundedMemoryStorage(max_bytes=int(args.limit_mb * 2 ** 20)),
+        args
+    )
+    await soak(
+        f"BoundedMemoryStorage: время жизни WinrateCalc/AdminMessage {args.ttl:g} с",
+        BoundedMemoryStorage(ttl=3600, state_ttls=parse_state_ttls(f"WinrateCalc={args.ttl},AdminMessage={args.ttl}"),
+                             max_bytes=1024 * 2 ** 20),
+        args
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1_000_000, help="заброшенных диалогов")
+    parser.add_argument("--limit-mb", type=float, default=32, help="предел памяти хранилища")
+    parser.add_argument("--ttl", type=float, default=1.0, help="время жизни сессии для третьего прогона (сек)")
+    parser.add_argument("--skip-unbounded", action="store_true", help="не запускать MemoryStorage")
+    asyncio.run(main(parser.parse_args()))
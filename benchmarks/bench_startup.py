@@ -0,0 +1,80 @@
+"""
+Бенчмарк холодного запуска: импорт calculator в новом процессе, фаза запуска
+(данные бота, меню команд, прогрев) и первое обновление. Bot API фальшивый.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py -n 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from mock_bot import ROOT, MockSession, message_update, setup_env
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import calculator; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def measure_import(runs: int) -> list:
+    """Время ``import calculator`` в свежем интерпретаторе (сек)"""
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+async def measure_startup() -> list:
+    """Фаза запуска дважды: без сохранённого хэша команд и с ним"""
+    import calculator
+
+    rows = []
+    for label in ("первый запуск", "повторный запуск"):
+        session = calculator.bot.session = MockSession()
+        calculator.bot_username = None
+
+        started = time.perf_counter()
+        await calculator.set_bot_commands()
+        await calculator.dp.emit_startup(bot=calculator.bot, dispatcher=calculator.dp)
+        startup = time.perf_counter() - started
+
+        started = time.perf_counter()
+        response = await calculator.dp.feed_update(calculator.bot, message_update("/start", 42))
+        if response is not None:
+            await calculator.bot(response)
+        first_update = time.perf_counter() - started
+
+        await calculator.dp.emit_shutdown(bot=calculator.bot, dispatcher=calculator.dp)
+        rows.append((label, startup, first_update, dict(session.counts)))
+    await calculator.dp.storage.close()
+    return rows
+
+
+def main(args: argparse.Namespace) -> None:
+    setup_env(FSM_STORAGE="memory", METRICS_ENABLED="false")
+
+    timings = measure_import(args.runs)
+    print(f"import calculator: медиана {statistics.median(timings) * 1000:.0f} мс, "
+          f"минимум {min(timings) * 1000:.0f} мс ({args.runs} запусков)")
+
+    import logging
+    logging.disable(logging.INFO)
+    for label, startup, first_update, counts in asyncio.run(measure_startup()):
+        calls = ", ".join(f"{name}×{count}" for name, count in sorted(counts.items())) or "нет"
+        print(f"{label:<17} запуск {startup * 1000:>7.1f} мс, первое обновление {first_update * 1000:>6.1f} мс; "
+              f"вызовы API: {calls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--runs", type=int, default=5, help="запусков для замера импорта")
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""
+Нагрузочный тест ThrottlingMiddleware: цена проверки на обновление (реальные
+Update, случайные пользователи из 10 млн), число корзин в памяти при пределе
+max_users и поведение при флуде одного пользователя - сколько обновлений
+отброшено и сколько предупреждений отправлено.
+
+    python benchmarks/bench_throttling.py
+    python benchmarks/bench_throttling.py --updates 200000 --max-users 10000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.types import User  # noqa: E402
+
+from mock_bot import callback_update, inline_update, message_update  # noqa: E402
+from throttling import ThrottlingMiddleware  # noqa: E402
+
+LIMITS = {'message': (1.0, 10), 'callback_query': (2.0, 10), 'inline_query': (4.0, 20)}
+
+
+async def handler(event, data) -> bool:
+    return True
+
+
+def make_events(count: int, users: int, rng: random.Random) -> list:
+    """(Update, data) как их видит внешний middleware после UserContextMiddleware"""
+    updates = (message_update("100 50 60"), callback_update("calc_again"), inline_update("100 50 60"))
+    return [
+        (updates[i % 3], {'event_from_user': User(id=rng.randint(1, users), is_bot=False, first_name="u")})
+        for i in range(count)
+    ]
+
+
+async def run(middleware, events: list, count: int) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        update, data = events[i % len(events)]
+        if middleware is None:
+            await handler(update, data)
+        else:
+            await middleware(handler, update, data)
+    return (time.perf_counter() - started) / count
+
+
+async def hot_path(args: argparse.Namespace) -> None:
+    events = make_events(args.sample, args.users, random.Random(1))
+    print(f"Проверка на обновление ({args.updates} обновлений, {args.sample} пользователей из {args.users}):")
+    direct = await run(None, events, args.updates)
+    throttled = await run(ThrottlingMiddleware(LIMITS, max_users=args.max_users), events, args.updates)
+    print(f"  без middleware: {direct * 1e9:>6.0f} нс/обновление")
+    print(f"  с middleware:   {throttled * 1e9:>6.0f} нс/обновление (+{(throttled - direct) * 1e9:.0f} нс)")
+
+    # Память корзин отдельным прогоном: tracemalloc замедляет работу в разы
+    middleware = ThrottlingMiddleware(LIMITS, max_users=args.max_users)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    await run(middleware, events, args.updates)
+    traced = (tracemalloc.get_traced_memory()[0] - baseline) / 2 ** 20
+    tracemalloc.stop()
+    stats = middleware.stats()
+    print(f"  корзин: {stats['tracked']} (предел {args.max_users} на тип), вытеснено {stats['evictions']}, "
+          f"память {traced:.1f} МБ")
+
+
+async def flood(args: argparse.Namespace) -> None:
+    middleware = ThrottlingMiddleware(LIMITS, max_users=args.max_users)
+    user = User(id=42, is_bot=False, first_name="u")
+    calls = 0
+
+    async def counting(event, data):
+        nonlocal calls
+        calls += 1
+
+    async def notify(event):
+        middleware.notices += 1
+
+    # Предупреждения не отправляются (нет бота), только считаются
+    middleware._notify = notify
+
+    update = inline_update("100 50", 42)
+    print(f"\nФлуд одного пользователя: {args.flood} inline-запросов за {args.flood_seconds:g} с")
+    started = time.perf_counter()
+    for i in range(args.flood):
+        deadline = started + args.flood_seconds * i / args.flood
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(0)
+        await middleware(counting, update, {'event_from_user': user})
+    rate, burst = LIMITS['inline_query']
+    print(f"  обработано {calls} (ожидается около {burst + rate * args.flood_seconds:.0f}), "
+          f"отброшено {middleware.stats()['dropped_inline_query']}, предупреждений {middleware.notices}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    await hot_path(args)
+    await flood(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=1_000_000, help="обновлений в замере")
+    parser.add_argument("--sample", type=int, default=300_000, help="разных пользователей в замере (по кругу)")
+    parser.add_argument("--users", type=int, default=10_000_000, help="диапазон id пользователей")
+    parser.add_argument("--max-users", type=int, default=50_000, help="предел корзин на тип обновлений")
+    parser.add_argument("--flood", type=int, default=5000, help="обновлений при флуде")
+    parser.add_argument("--flood-seconds", type=float, default=2.0, help="длительность флуда")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,128 @@
+"""Фальшивая сессия Bot API и построители синтетических обновлений для бенчмарков"""
+import datetime
+import os
+import sys
+import tempfile
+import typing
+from collections import Counter
+from typing import Any, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+BOT_ID = 123456
+ADMIN_ID = 999
+
+
+def setup_env(**overrides: str) -> None:
+    """Переменные окружения для импорта calculator без настоящего токена"""
+    os.environ.setdefault("BOT_TOKEN", f"{BOT_ID}:BENCHMARK")
+    os.environ.setdefault("ADMIN_ID", str(ADMIN_ID))
+    os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="bot-bench-"))
+    os.environ.update(overrides)
+
+
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from aiogram.types import Chat, Message, Update, User  # noqa: E402
+
+
+class MockSession(BaseSession):
+    """Сессия, которая не ходит в сеть, а записывает вызовы и возвращает правдоподобные ответы"""
+
+    def __init__(self, record: bool = True, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.record = record
+        self.calls = []
+        self.counts = Counter()
+        self._message_id = 0
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args: Any, **kwargs: Any):
+        yield b""
+
+    def fake_result(self, method: TelegramMethod) -> Any:
+        returning = method.__returning__
+        if typing.get_origin(returning) is typing.Union:
+            returning = typing.get_args(returning)[0]
+        if returning is Message:
+            self._message_id += 1
+            chat_id = getattr(method, "chat_id", None) or 1
+            return Message(
+                message_id=self._message_id,
+                date=datetime.datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 1, type="private"),
+                text=getattr(method, "text", None) or "",
+            )
+        if returning is User:
+            return User(id=BOT_ID, is_bot=True, first_name="Bench", username="bench_bot")
+        return True
+
+    async def make_request(self, bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.counts[method.__api_method__] += 1
+        if self.record:
+            self.calls.append(method)
+        return self.fake_result(method)
+
+
+def install_session(bot, session: BaseSession) -> BaseSession:
+    """Замена сессии бота с переносом middleware запросов (планировщик отправки, метрики)"""
+    for middleware in bot.session.middleware:
+        session.middleware(middleware)
+    bot.session = session
+    return session
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def message_update(text: str, user_id: int = 1, chat_type: str = "private", update_id: int = 1) -> Update:
+    chat_id = user_id if chat_type == "private" else -user_id
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": chat_type},
+            "from": _user(user_id),
+            "text": text,
+        },
+    })
+
+
+def inline_update(query: str, user_id: int = 1, update_id: int = 1) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "inline_query": {"id": str(update_id), "from": _user(user_id), "query": query, "offset": ""},
+    })
+
+
+def callback_update(data: str, user_id: int = 1, update_id: int = 1) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(user_id),
+            "chat_instance": "bench",
+            "data": data,
+            "message": {"message_id": 1, "date": 0, "chat": {"id": user_id, "type": "private"}, "text": "..."},
+        },
+    })
+
+
+def chat_member_update(chat_id: int = -100, update_id: int = 1) -> Update:
+    bot_user = {"id": BOT_ID, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+    return Update.model_validate({
+        "update_id": update_id,
+        "my_chat_member": {
+            "chat": {"id": chat_id, "type": "group", "title": "Bench group"},
+            "from": _user(1),
+            "date": 0,
+            "old_chat_member": {"status": "left", "user": bot_user},
+            "new_chat_member": {"status": "member", "user": bot_user},
+        },
+    })
@@ -0,0 +1,531 @@
+"""
+Рассылка администратора всем пользователям: реестр пользователей, отправка
+с ограниченным параллелизмом, контрольные точки и прогресс в чате админа.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Collection, Dict, List, NamedTuple, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, TelegramObject
+
+from cache import LRUCache
+from rendering import progress_bar
+from sender import background
+
+logger = logging.getLogger(__name__)
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_CANCELLED = "cancelled"
+
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+# Ошибки 400, после которых писать пользователю бессмысленно
+GONE_ERRORS = ("chat not found", "user is deactivated", "bot was blocked", "peer_id_invalid")
+
+STATUS_LABELS = {
+    STATUS_RUNNING: "⏳ идёт",
+    STATUS_DONE: "✅ завершена",
+    STATUS_CANCELLED: "⏹ остановлена",
+}
+
+
+class BroadcastState(NamedTuple):
+    id: int
+    text: str
+    status: str
+    cursor: int
+    total: int
+    sent: int
+    blocked: int
+    failed: int
+    admin_chat_id: int
+    progress_message_id: Optional[int]
+    started_at: float
+
+
+BROADCAST_COLUMNS = (
+    "id, text, status, cursor, total, sent, blocked, failed, admin_chat_id, progress_message_id, started_at"
+)
+
+
+class BroadcastStore:
+    """
+    Реестр пользователей и состояние рассылок в SQLite (WAL).
+
+    ``touch()`` вызывается на каждое личное сообщение: уже известные
+    пользователи отсеиваются LRU-кэшем в памяти, новые копятся и
+    записываются пачкой раз в ``flush_interval`` секунд.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, seen_cache_size: int = 100000):
+        self.flush_interval = flush_interval
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Все обращения к соединению идут из одного потока
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="broadcast-sqlite")
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "user_id INTEGER PRIMARY KEY, first_seen REAL NOT NULL, blocked INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS broadcasts ("
+            "id INTEGER PRIMARY KEY, text TEXT NOT NULL, status TEXT NOT NULL, "
+            "cursor INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL, "
+            "sent INTEGER NOT NULL DEFAULT 0, blocked INTEGER NOT NULL DEFAULT 0, "
+            "failed INTEGER NOT NULL DEFAULT 0, admin_chat_id INTEGER NOT NULL, "
+            "progress_message_id INTEGER, started_at REAL NOT NULL, finished_at REAL, "
+            "owner TEXT, lease_until REAL NOT NULL DEFAULT 0)"
+        )
+        self._seen = LRUCache(maxsize=seen_cache_size)
+        self._pending: List[int] = []
+        self._writer: Optional[asyncio.Task] = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # Реестр пользователей
+
+    def touch(self, user_id: int) -> None:
+        """Отметка, что пользователь пишет боту (без ожидания записи на диск)"""
+        if user_id in self._seen:
+            return
+        self._seen.set(user_id, True)
+        self._pending.append(user_id)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_later())
+
+    async def _write_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("Ошибка записи реестра пользователей: %s", e)
+
+    def _upsert_users_sync(self, user_ids: List[int]) -> None:
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN")
+            # Написавший снова пользователь, видимо, разблокировал бота
+            self._conn.executemany(
+                "INSERT INTO users (user_id, first_seen) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET blocked = 0 WHERE blocked = 1",
+                [(user_id, now) for user_id in user_ids]
+            )
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        user_ids, self._pending = self._pending, []
+        try:
+            await self._run(self._upsert_users_sync, user_ids)
+        except Exception:
+            self._pending[:0] = user_ids
+            raise
+
+    def forget(self, user_id: int) -> None:
+        """Следующее сообщение пользователя снова попадёт в базу (снимет блокировку)"""
+        self._seen.pop(user_id)
+
+    def _count_users_sync(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM users WHERE blocked = 0").fetchone()[0]
+
+    async def count_users(self) -> int:
+        """Число пользователей, которым можно писать"""
+        await self.flush()
+        return await self._run(self._count_users_sync)
+
+    def _recipients_sync(self, after_user_id: int, limit: int) -> List[int]:
+        return [row[0] for row in self._conn.execute(
+            "SELECT user_id FROM users WHERE user_id > ? AND blocked = 0 ORDER BY user_id LIMIT ?",
+            (after_user_id, limit)
+        )]
+
+    async def recipients(self, after_user_id: int, limit: int) -> List[int]:
+        """Следующая порция получателей по возрастанию user_id"""
+        return await self._run(self._recipients_sync, after_user_id, limit)
+
+    # Рассылки
+
+    def _create_sync(self, text: str, admin_chat_id: int, owner: str, lease_until: float) -> BroadcastState:
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            total = self._count_users_sync()
+            cursor = self._conn.execute(
+                "INSERT INTO broadcasts (text, status, total, admin_chat_id, started_at, owner, lease_until) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (text, STATUS_RUNNING, total, admin_chat_id, time.time(), owner, lease_until)
+            )
+            return self._get_sync(cursor.lastrowid)
+
+    async def create(self, text: str, admin_chat_id: int, owner: str, lease_until: float) -> BroadcastState:
+        await self.flush()
+        return await self._run(self._create_sync, text, admin_chat_id, owner, lease_until)
+
+    def _get_sync(self, broadcast_id: int) -> Optional[BroadcastState]:
+        row = self._conn.execute(
+            f"SELECT {BROADCAST_COLUMNS} FROM broadcasts WHERE id = ?", (broadcast_id,)
+        ).fetchone()
+        return BroadcastState(*row) if row else None
+
+    async def get(self, broadcast_id: int) -> Optional[BroadcastState]:
+        return await self._run(self._get_sync, broadcast_id)
+
+    def _claim_sync(self, owner: str, now: float, lease_until: float,
+                    running: Collection[int]) -> List[BroadcastState]:
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM broadcasts WHERE status = ? AND lease_until < ?", (STATUS_RUNNING, now)
+            ) if row[0] not in running]
+            self._conn.executemany(
+                "UPDATE broadcasts SET owner = ?, lease_until = ? WHERE id = ?",
+                [(owner, lease_until, broadcast_id) for broadcast_id in ids]
+            )
+            return [self._get_sync(broadcast_id) for broadcast_id in ids]
+
+    async def claim(self, owner: str, now: float, lease_until: float,
+                    running: Collection[int] = ()) -> List[BroadcastState]:
+        """
+        Незавершённые рассылки, которые никто не ведёт (после перезапуска).
+        ``running`` - рассылки, которые этот процесс уже ведёт: их не
+        подхватываем повторно, даже если аренда успела истечь.
+        """
+        return await self._run(self._claim_sync, owner, now, lease_until, frozenset(running))
+
+    def _renew_sync(self, broadcast_id: int, owner: str, lease_until: float) -> bool:
+        with self._conn:
+            cursor = self._conn.execute(
+                "UPDATE broadcasts SET lease_until = ? WHERE id = ? AND owner = ? AND status = ?",
+                (lease_until, broadcast_id, owner, STATUS_RUNNING)
+            )
+            return cursor.rowcount > 0
+
+    async def renew(self, broadcast_id: int, owner: str, lease_until: float) -> bool:
+        """Продление аренды без контрольной точки; False - рассылку ведёт другой процесс"""
+        return await self._run(self._renew_sync, broadcast_id, owner, lease_until)
+
+    def _checkpoint_sync(self, state: BroadcastState, blocked_ids: List[int], owner: str,
+                         lease_until: float) -> Optional[str]:
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "UPDATE users SET blocked = 1 WHERE user_id = ?", [(user_id,) for user_id in blocked_ids]
+            )
+            self._conn.execute(
+                "UPDATE broadcasts SET cursor = ?, sent = ?, blocked = ?, failed = ?, progress_message_id = ?, "
+                "lease_until = ? WHERE id = ? AND owner = ?",
+                (state.cursor, state.sent, state.blocked, state.failed, state.progress_message_id,
+                 lease_until, state.id, owner)
+            )
+            status, current_owner = self._conn.execute(
+                "SELECT status, owner FROM broadcasts WHERE id = ?", (state.id,)
+            ).fetchone()
+            return status if current_owner == owner else None
+
+    async def checkpoint(self, state: BroadcastState, blocked_ids: List[int], owner: str,
+                         lease_until: float) -> Optional[str]:
+        """
+        Сохранение прогресса. Возвращает текущий статус (рассылку могли
+        остановить) или None, если её уже ведёт другой процесс.
+        """
+        return await self._run(self._checkpoint_sync, state, blocked_ids, owner, lease_until)
+
+    def _finish_sync(self, broadcast_id: int, status: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "UPDATE broadcasts SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (status, time.time(), broadcast_id, STATUS_RUNNING)
+            )
+
+    async def finish(self, broadcast_id: int, status: str) -> None:
+        await self._run(self._finish_sync, broadcast_id, status)
+
+    def _release_sync(self, owner: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "UPDATE broadcasts SET lease_until = 0 WHERE owner = ? AND status = ?", (owner, STATUS_RUNNING)
+            )
+
+    async def release(self, owner: str) -> None:
+        """Снятие аренды: после перезапуска рассылки подхватываются сразу"""
+        await self._run(self._release_sync, owner)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        await self.flush()
+        await self._run(self._conn.close)
+        self._executor.shutdown()
+
+
+class UserRegistryMiddleware(BaseMiddleware):
+    """Внешний middleware dp.update: запоминает пользователей личных чатов"""
+
+    def __init__(self, store: BroadcastStore):
+        self.store = store
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat")
+        if chat is not None and chat.type == "private":
+            self.store.touch(chat.id)
+        return await handler(event, data)
+
+
+def render_progress(state: BroadcastState, rate: float) -> str:
+    """Текст сообщения о ходе рассылки"""
+    done = state.sent + state.blocked + state.failed
+    lines = [
+        f"📣 <b>Рассылка #{state.id}</b> - {STATUS_LABELS.get(state.status, state.status)}\n",
+        progress_bar(done, state.total) if state.total else progress_bar(1, 1),
+        f"\n📬 Обработано: <code>{done}</code> из <code>{state.total}</code>",
+        f"✅ Доставлено: <code>{state.sent}</code>",
+        f"⛔ Заблокировали бота: <code>{state.blocked}</code>",
+        f"❌ Ошибки: <code>{state.failed}</code>",
+    ]
+    if state.status == STATUS_RUNNING and rate > 0:
+        left = max(0, state.total - done) / rate
+        lines.append(f"⏱ {rate:.1f} сообщ./с, осталось ~{left / 60:.0f} мин")
+    return "\n".join(lines)
+
+
+def stop_keyboard(broadcast_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="⏹ Остановить", callback_data=f"broadcast_stop:{broadcast_id}")
+    ]])
+
+
+class Broadcaster:
+    """
+    Отправка рассылок.
+
+    Получатели идут порциями по ``chunk_size`` в порядке user_id; внутри порции
+    ``concurrency`` задач отправляют сообщения через общий планировщик
+    (фоновый приоритет: лимиты Telegram и повтор после 429 - на нём). После
+    каждой порции позиция и счётчики сохраняются, поэтому после перезапуска
+    рассылка продолжается с последней контрольной точки (повторно может уйти
+    не больше одной порции). Заблокировавшие бота пользователи помечаются и в
+    следующие рассылки не попадают.
+    """
+
+    def __init__(
+        self,
+        store: BroadcastStore,
+        bot: Bot,
+        concurrency: int = 25,
+        chunk_size: int = 200,
+        progress_interval: float = 5.0,
+        lease: float = 120.0,
+        max_retries: int = 3,
+    ):
+        self.store = store
+        self.bot = bot
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.progress_interval = progress_interval
+        self.lease = lease
+        self.max_retries = max_retries
+        # Владелец рассылки: в режиме нескольких процессов ведёт только один
+        self.owner = uuid.uuid4().hex
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def start(self, text: str, admin_chat_id: int) -> BroadcastState:
+        """Новая рассылка: сообщение о прогрессе админу и фоновая отправка"""
+        state = await self.store.create(text, admin_chat_id, self.owner, time.time() + self.lease)
+        progress = await self.bot.send_message(
+            admin_chat_id, render_progress(state, 0), parse_mode="HTML", reply_markup=stop_keyboard(state.id)
+        )
+        state = state._replace(progress_message_id=progress.message_id)
+        await self.store.checkpoint(state, [], self.owner, time.time() + self.lease)
+        self._spawn(state)
+        logger.info("Запущена рассылка #%s на %s пользователей", state.id, state.total)
+        return state
+
+    async def resume(self) -> None:
+        """
+        Продолжение рассылок, прерванных перезапуском. Рассылки упавшего
+        процесса подхватываются, когда истечёт их аренда.
+        """
+        await self._claim()
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _claim(self) -> None:
+        claimed = await self.store.claim(self.owner, time.time(), time.time() + self.lease, set(self._tasks))
+        for state in claimed:
+            logger.info("Продолжение рассылки #%s с пользователя %s", state.id, state.cursor)
+            self._spawn(state)
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 2)
+            try:
+                await self._claim()
+            except Exception as e:
+                logger.error("Ошибка проверки незавершённых рассылок: %s", e)
+
+    def _spawn(self, state: BroadcastState) -> None:
+        self._tasks[state.id] = asyncio.create_task(self._run(state))
+
+    async def _keep_lease(self, broadcast_id: int) -> None:
+        """
+        Продление аренды, пока идёт порция: ожидание retry_after или очередь
+        фонового приоритета могут растянуть её дольше ``lease``.
+        """
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                if not await self.store.renew(broadcast_id, self.owner, time.time() + self.lease):
+                    return
+            except Exception as e:
+                logger.error("Не удалось продлить аренду рассылки #%s: %s", broadcast_id, e)
+
+    async def stop(self, broadcast_id: int) -> bool:
+        """Остановка рассылки; в других процессах она заметит это на контрольной точке"""
+        state = await self.store.get(broadcast_id)
+        if state is None or state.status != STATUS_RUNNING:
+            return False
+        await self.store.finish(broadcast_id, STATUS_CANCELLED)
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            # Рассылка этого процесса: останавливаем сразу, не дожидаясь конца порции
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            state = await self.store.get(broadcast_id)
+            await self._report(state, 0)
+            logger.info("Рассылка #%s остановлена администратором", broadcast_id)
+        return True
+
+    async def _send(self, user_id: int, text: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.bot.send_message(user_id, text, parse_mode="HTML")
+                return SENT
+            except TelegramForbiddenError:
+                return BLOCKED
+            except TelegramBadRequest as e:
+                return BLOCKED if any(error in e.message.lower() for error in GONE_ERRORS) else FAILED
+            except TelegramRetryAfter as e:
+                # Планировщик уже исчерпал свои повторы - ждём и пробуем снова
+                if attempt == self.max_retries:
+                    return FAILED
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.debug("Рассылка: ошибка отправки пользователю %s: %s", user_id, e)
+                return FAILED
+        return FAILED
+
+    async def _fan_out(self, user_ids: List[int], text: str) -> Tuple[int, List[int], int]:
+        """Отправка порции; возвращает (доставлено, заблокировавшие, ошибки)"""
+        sent = failed = 0
+        blocked: List[int] = []
+        recipients = iter(user_ids)
+
+        async def worker() -> None:
+            nonlocal sent, failed
+            for user_id in recipients:
+                outcome = await self._send(user_id, text)
+                if outcome == SENT:
+                    sent += 1
+                elif outcome == BLOCKED:
+                    blocked.append(user_id)
+                else:
+                    failed += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(user_ids)))))
+        return sent, blocked, failed
+
+    async def _report(self, state: BroadcastState, rate: float) -> None:
+        if state.progress_message_id is None:
+            return
+        try:
+            await self.bot.edit_message_text(
+                render_progress(state, rate),
+                chat_id=state.admin_chat_id,
+                message_id=state.progress_message_id,
+                parse_mode="HTML",
+                reply_markup=stop_keyboard(state.id) if state.status == STATUS_RUNNING else None,
+            )
+        except Exception as e:
+            logger.debug("Не удалось обновить прогресс рассылки #%s: %s", state.id, e)
+
+    async def _run(self, state: BroadcastState) -> None:
+        started = time.monotonic()
+        done_before = state.sent + state.blocked + state.failed
+        reported = started
+        status = STATUS_RUNNING
+        keeper = asyncio.create_task(self._keep_lease(state.id))
+        try:
+            with background():
+                while status == STATUS_RUNNING:
+                    user_ids = await self.store.recipients(state.cursor, self.chunk_size)
+                    if not user_ids:
+                        status = STATUS_DONE
+                        break
+                    sent, blocked, failed = await self._fan_out(user_ids, state.text)
+                    for user_id in blocked:
+                        self.store.forget(user_id)
+                    state = state._replace(
+                        cursor=user_ids[-1],
+                        sent=state.sent + sent,
+                        blocked=state.blocked + len(blocked),
+                        failed=state.failed + failed,
+                    )
+                    status = await self.store.checkpoint(state, blocked, self.owner, time.time() + self.lease)
+                    if status is None:
+                        logger.warning("Рассылку #%s продолжает другой процесс", state.id)
+                        return
+                    now = time.monotonic()
+                    if now - reported >= self.progress_interval:
+                        reported = now
+                        done = state.sent + state.blocked + state.failed - done_before
+                        await self._report(state, done / (now - started))
+            await self.store.finish(state.id, status)
+            state = state._replace(status=status)
+            await self._report(state, 0)
+            logger.info(
+                "Рассылка #%s %s: доставлено %s, заблокировали %s, ошибок %s",
+                state.id, STATUS_LABELS[status], state.sent, state.blocked, state.failed
+            )
+        except asyncio.CancelledError:
+            # Остановка бота: рассылка продолжится после запуска с последней контрольной точки
+            raise
+        except Exception as e:
+            logger.error("Ошибка рассылки #%s: %s", state.id, e)
+        finally:
+            keeper.cancel()
+            if self._tasks.get(state.id) is asyncio.current_task():
+                self._tasks.pop(state.id)
+
+    async def close(self) -> None:
+        """Остановка фоновых рассылок (без отметки о завершении)"""
+        tasks = list(self._tasks.values())
+        if self._watcher is not None:
+            tasks.append(self._watcher)
+            self._watcher = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.store.release(self.owner)
+
+    def stats(self) -> dict:
+        return {'running': len(self._tasks)}
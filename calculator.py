@@ -1,16 +1,21 @@
 import asyncio
+import functools
+import hashlib
+import html
+import json
 import logging
 import os
+import secrets
+import time
+from typing import Optional
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.filters import Command, CommandStart
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import (
     Message,
     ReplyKeyboardMarkup,
-    KeyboardButton,
     InlineKeyboardMarkup,
     InlineKeyboardButton,
     CallbackQuery,
@@ -19,23 +24,57 @@ from aiogram.types import (
     BotCommandScopeAllPrivateChats,
     BotCommandScopeAllGroupChats,
     InlineQuery,
-    InlineQueryResultArticle,
-    InputTextMessageContent,
-    ChatMemberUpdated
+    ChatMemberUpdated,
+    ChosenInlineResult,
+    BufferedInputFile,
+    FSInputFile
 )
 from aiogram.filters import ChatMemberUpdatedFilter, JOIN_TRANSITION
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+import batch
+from broadcast import BroadcastStore, Broadcaster, UserRegistryMiddleware
+from cache import LRUCache
+import config
+from config import BOT_TOKEN, ADMIN_ID
+from heroes import MAX_HEROES, HeroPool, format_pool, parse_heroes
+from history import SOURCE_INLINE, SOURCE_PRIVATE, HistoryStore, sparkline
+from inline import (
+    RESULT_COMPUTED,
+    normalize_query,
+    parse_query,
+    InlineCoalescer,
+    help_answer,
+    hint_answer,
+    prepare_answers,
+    computed_answer,
+    montecarlo_answer,
+    combine_answers,
+    answer_method,
+    inline_stats
+)
+from lanes import LANE_ADMIN, LANE_CONVERSATION, LANE_GROUP, LANE_INLINE, UpdateScheduler
+from logs import UpdateContextMiddleware, parse_sampling, setup_logging
+import metrics
+from montecarlo import MonteCarloEngine
+from outbox import AdminOutbox
+from profiler import MODE_CPROFILE, MODE_SAMPLE, Profiler
+from rendering import render_montecarlo, render_result
+import replies
+from replies import answer
+from sender import create_scheduler
+from session import create_session
+from storage import BoundedMemoryStorage, create_storage
+from throttling import ThrottlingMiddleware
+
+# Настройка логирования: запись в фоновом потоке, JSON, прореживание частых событий
+log_filter = setup_logging(
+    level=config.LOG_LEVEL,
+    fmt=config.LOG_FORMAT,
+    sampling=parse_sampling(config.LOG_SAMPLING),
+    path=config.LOG_FILE
 )
 logger = logging.getLogger(__name__)
 
-# Токен бота и ID администратора
-BOT_TOKEN = 
-ADMIN_ID = 
-
 
 # Определяем состояния FSM для пошагового ввода
 class WinrateCalc(StatesGroup):
@@ -55,83 +94,90 @@ class AdminReply(StatesGroup):
     waiting_for_reply = State()
 
 
-# Функции для создания клавиатур
+# Состояния для рассылки админа всем пользователям (/broadcast)
+class BroadcastMessage(StatesGroup):
+    waiting_for_text = State()
+    waiting_for_confirmation = State()
+
+
+# Состояние для пакетного расчёта (/batch)
+class BatchCalc(StatesGroup):
+    waiting_for_data = State()
+
+
+# Состояние для списка героев аккаунта (/heroes)
+class HeroesCalc(StatesGroup):
+    collecting = State()
+
+
+# Функции для создания клавиатур (статические собраны один раз в replies.py)
 def get_main_keyboard() -> ReplyKeyboardMarkup:
-    """Создание главной Reply-клавиатуры"""
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [
-                KeyboardButton(text="🎯 Рассчитать винрейт"),
-                KeyboardButton(text="📖 Справка")
-            ],
-            [
-                KeyboardButton(text="ℹ️ О боте")
-            ]
-        ],
-        resize_keyboard=True,
-    )
-    return keyboard
+    """Главная Reply-клавиатура"""
+    return replies.MAIN_KEYBOARD
 
 
 def get_cancel_keyboard() -> ReplyKeyboardMarkup:
-    """Создание Reply-клавиатуры с кнопкой отмены расчёта"""
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="❌ Отменить расчет")]
-        ],
-        resize_keyboard=True,
-        input_field_placeholder="Введите значение или отмените..."
-    )
-    return keyboard
+    """Reply-клавиатура с кнопкой отмены расчёта"""
+    return replies.CANCEL_KEYBOARD
 
 
 def get_cancel_admin_keyboard() -> ReplyKeyboardMarkup:
-    """Создание Reply-клавиатуры с кнопкой отмены отправки сообщения админу"""
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="❌ Отменить отправку")]
-        ],
-        resize_keyboard=True,
-        input_field_placeholder="Напишите ваше сообщение..."
-    )
-    return keyboard
+    """Reply-клавиатура с кнопкой отмены отправки сообщения админу"""
+    return replies.CANCEL_ADMIN_KEYBOARD
 
 
 def get_start_inline_keyboard() -> InlineKeyboardMarkup:
-    """Создание inline-клавиатуры для стартового сообщения"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="🎯 Начать расчёт", callback_data="start_calc"),
-                InlineKeyboardButton(text="📖 Помощь", callback_data="show_help")
-            ],
-            [
-                InlineKeyboardButton(text="ℹ️ О боте", callback_data="about_bot")
-            ]
-        ]
-    )
-    return keyboard
+    """Inline-клавиатура для стартового сообщения"""
+    return replies.START_INLINE_KEYBOARD
 
 
 def get_result_keyboard() -> InlineKeyboardMarkup:
-    """Создание inline-клавиатуры для результатов"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="🔄 Новый расчёт", callback_data="start_calc"),
-                InlineKeyboardButton(text="📊 Справка", callback_data="show_help")
-            ]
-        ]
+    """Inline-клавиатура для результатов"""
+    return replies.RESULT_KEYBOARD
+
+
+def get_montecarlo_button(total_matches: int, current_wr: float, desired_wr: float) -> InlineKeyboardButton:
+    """Кнопка "Реалистичный путь" для результата расчёта"""
+    return InlineKeyboardButton(
+        text="🎲 Реалистичный путь",
+        callback_data=f"montecarlo:{total_matches}:{current_wr:g}:{desired_wr:g}"
     )
-    return keyboard
 
 
-def create_progress_bar(current: float, goal: float, length: int = 10) -> str:
-    """Создание визуального прогресс-бара"""
-    percentage = min(current / goal * 100, 100) if goal > 0 else 0
-    filled = int(length * percentage / 100)
-    bar = "🟩" * filled + "⬜" * (length - filled)
-    return f"{bar} {percentage:.1f}%"
+def get_whatif_keyboard(total_matches: int, current_wr: float, span: int,
+                        desired_wr: Optional[float] = None) -> InlineKeyboardMarkup:
+    """Создание inline-клавиатуры для таблицы "что если" с кнопками изменения диапазона"""
+    base = f"whatif:{total_matches}:{current_wr:g}"
+    suffix = f":{desired_wr:g}" if desired_wr is not None else ""
+    range_buttons = []
+    if span > config.WHATIF_MIN_SPAN:
+        range_buttons.append(InlineKeyboardButton(text="➖ Сузить", callback_data=f"{base}:{span - config.WHATIF_SPAN_DELTA}{suffix}"))
+    if span < config.WHATIF_MAX_SPAN:
+        range_buttons.append(InlineKeyboardButton(text="➕ Расширить", callback_data=f"{base}:{span + config.WHATIF_SPAN_DELTA}{suffix}"))
+    
+    rows = [range_buttons]
+    if desired_wr is not None and montecarlo_engine is not None:
+        rows.append([get_montecarlo_button(total_matches, current_wr, desired_wr)])
+    rows.append(replies.RESULT_BUTTONS)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def get_montecarlo_keyboard(total_matches: int, current_wr: float, desired_wr: float,
+                            win_rate: float) -> InlineKeyboardMarkup:
+    """Кнопки изменения шанса победы для реалистичного пути"""
+    base = f"montecarlo_wr:{total_matches}:{current_wr:g}:{desired_wr:g}"
+    step = config.MONTECARLO_WIN_RATE_STEP
+    buttons = []
+    if win_rate - step >= 0:
+        buttons.append(InlineKeyboardButton(text=f"➖ {step:g}%", callback_data=f"{base}:{win_rate - step:g}"))
+    if win_rate + step <= 100:
+        buttons.append(InlineKeyboardButton(text=f"➕ {step:g}%", callback_data=f"{base}:{win_rate + step:g}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons, replies.RESULT_BUTTONS])
+
+
+def get_heroes_keyboard() -> InlineKeyboardMarkup:
+    """Кнопки под сводкой по героям"""
+    return replies.HEROES_KEYBOARD
 
 
 def calculate_wins_needed(total_matches: int, current_wr: float, desired_wr: float) -> dict:
@@ -164,30 +210,240 @@ def calculate_wins_needed(total_matches: int, current_wr: float, desired_wr: flo
     }
 
 
+def format_whatif_text(total_matches: int, current_wr: float, span: int) -> str:
+    """
+    Таблица "что если": сколько побед нужно для целей current+step ... current+span*step.
+    Все цели считаются одним векторным проходом через batch.calculate_batch.
+    """
+    step = config.WHATIF_STEP
+    targets = [round(current_wr + step * i, 2) for i in range(1, span + 1)]
+    targets = [target for target in targets if target < 100]
+    if not targets:
+        return "🔄 <b>Что дальше?</b>"
+    
+    results = batch.calculate_batch([total_matches] * len(targets), [current_wr] * len(targets), targets)
+    lines = [f"{'Цель':>7} {'Побед':>6} {'Матчей':>7}"]
+    for target, wins, new_matches in zip(targets, results['wins_needed'], results['new_total_matches']):
+        lines.append(f"{target:>6.1f}% {wins:>6} {new_matches:>7}")
+    table = "\n".join(lines)
+    return (
+        "📊 <b>А ЧТО ЕСЛИ?</b> Побед подряд для других целей:\n"
+        f"<pre>{table}</pre>\n\n"
+        "🔄 <b>Что дальше?</b>"
+    )
+
+
+# Кэш результатов: популярные вводы и повторные inline-запросы не пересчитываются
+RESULT_CACHE_SIZE = 4096
+RESULT_CACHE_TTL = 3600
+result_cache = LRUCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+# Списки героев (/heroes) между сообщениями: суммы и стоимости не пересчитываются
+# по всем героям. Запись действительна, пока ревизия совпадает с данными FSM
+HERO_POOL_CACHE_SIZE = 1024
+HERO_POOL_CACHE_TTL = 1800
+hero_pools = LRUCache(maxsize=HERO_POOL_CACHE_SIZE, ttl=HERO_POOL_CACHE_TTL)
+
+
+def get_calculation(total_matches: int, current_wr: float, desired_wr: float) -> tuple:
+    """
+    Возвращает (результат, текст сообщения) для нормализованных входных данных.
+    Общий кэш для личного расчёта и inline-режима.
+    """
+    key = (total_matches, round(current_wr, 2), round(desired_wr, 2))
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    total_matches, current_wr, desired_wr = key
+    result = calculate_wins_needed(total_matches, current_wr, desired_wr)
+    cached = (result, render_result(total_matches, current_wr, desired_wr, result))
+    result_cache.set(key, cached)
+    return cached
+
+
+# Ограничения пакетного расчёта
+BATCH_MAX_ROWS = 100000
+BATCH_MAX_FILE_SIZE = 5 * 1024 * 1024
+BATCH_TABLE_ROWS = 40
+
+
 # Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
+bot = Bot(token=BOT_TOKEN, session=create_session())
+send_scheduler = create_scheduler()
+bot.session.middleware(send_scheduler)
+storage = create_storage()
 dp = Dispatcher(storage=storage)
 
+if config.METRICS_ENABLED:
+    metrics.setup_metrics(dp, bot)
+    metrics.register_stats("bot_result_cache", "Кэш результатов расчёта", result_cache.stats)
+    metrics.register_stats("bot_hero_pools", "Кэш списков героев /heroes", hero_pools.stats)
+    metrics.register_stats("bot_inline_answers", "Inline-ответы по типам", lambda: inline_stats)
+    metrics.register_stats("bot_send_scheduler", "Очередь и задержка отправки", send_scheduler.stats)
+    metrics.register_stats("bot_http", "Запросы к Bot API: соединения, кэш DNS, задержка", bot.session.stats)
+    if isinstance(storage, BoundedMemoryStorage):
+        metrics.register_stats("bot_fsm_memory", "Сессии FSM в памяти: число, байты, удаления", storage.stats)
+        metrics.registry.register(metrics.Gauge(
+            "bot_fsm_memory_bytes", "Память сессий FSM по состояниям (оценка)", ["state"], storage.memory_by_state
+        ))
+
+history = HistoryStore(
+    config.HISTORY_PATH,
+    flush_interval=config.HISTORY_FLUSH_INTERVAL
+) if config.HISTORY_ENABLED else None
+
+admin_outbox = AdminOutbox(
+    config.OUTBOX_PATH, bot, ADMIN_ID,
+    base_delay=config.OUTBOX_BASE_DELAY,
+    max_delay=config.OUTBOX_MAX_DELAY,
+    max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+    dedup_window=config.OUTBOX_DEDUP_WINDOW,
+    digest_threshold=config.OUTBOX_DIGEST_THRESHOLD,
+    digest_max=config.OUTBOX_DIGEST_MAX,
+    min_interval=config.OUTBOX_MIN_INTERVAL,
+    retention_days=config.OUTBOX_RETENTION_DAYS
+)
+
+# update_id обновления во всех строках лога, записанных при его обработке
+dp.update.outer_middleware(UpdateContextMiddleware())
+if config.METRICS_ENABLED:
+    metrics.register_stats("bot_logging", "Логирование: записано и отброшено прореживанием", log_filter.stats)
+
+# Защита от флуда - до остальных middleware, чтобы лишние обновления не делали работы
+if config.THROTTLE_ENABLED:
+    throttling = ThrottlingMiddleware(
+        {
+            "message": (config.THROTTLE_MESSAGE_RATE, config.THROTTLE_MESSAGE_BURST),
+            "callback_query": (config.THROTTLE_CALLBACK_RATE, config.THROTTLE_CALLBACK_BURST),
+            "inline_query": (config.THROTTLE_INLINE_RATE, config.THROTTLE_INLINE_BURST),
+        },
+        max_users=config.THROTTLE_MAX_USERS,
+        exempt=(ADMIN_ID,)
+    )
+    dp.update.outer_middleware(throttling)
+    if config.METRICS_ENABLED:
+        metrics.register_stats("bot_throttling", "Защита от флуда: пропущено и отброшено", throttling.stats)
+
+# Полосы обработки: всплеск inline-запросов не задерживает диалоги, админа и группы
+if config.LANES_ENABLED:
+    update_scheduler = UpdateScheduler(
+        {
+            LANE_INLINE: (config.LANE_INLINE_CONCURRENCY, config.LANE_INLINE_QUEUE),
+            LANE_CONVERSATION: (config.LANE_CONVERSATION_CONCURRENCY, config.LANE_CONVERSATION_QUEUE),
+            LANE_ADMIN: (config.LANE_ADMIN_CONCURRENCY, config.LANE_ADMIN_QUEUE),
+            LANE_GROUP: (config.LANE_GROUP_CONCURRENCY, config.LANE_GROUP_QUEUE),
+        },
+        admin_id=ADMIN_ID
+    )
+    dp.update.outer_middleware(update_scheduler)
+    if config.METRICS_ENABLED:
+        metrics.registry.register(metrics.Gauge(
+            "bot_lanes", "Полосы обработки: в работе, в очереди, отброшено, ожидание", ["lane", "key"],
+            update_scheduler.stats
+        ))
+
+# Реестр пользователей личных чатов (получатели /broadcast) и рассылки
+broadcast_store = BroadcastStore(config.BROADCAST_PATH)
+dp.update.outer_middleware(UserRegistryMiddleware(broadcast_store))
+broadcaster = Broadcaster(
+    broadcast_store, bot,
+    concurrency=config.BROADCAST_CONCURRENCY,
+    chunk_size=config.BROADCAST_CHUNK_SIZE,
+    progress_interval=config.BROADCAST_PROGRESS_INTERVAL
+)
+
+if config.METRICS_ENABLED:
+    metrics.register_stats("bot_broadcast", "Рассылки в работе", broadcaster.stats)
+    metrics.register_stats("bot_admin_outbox", "Доставка сообщений админу", admin_outbox.stats)
+    metrics.registry.register(metrics.Gauge(
+        "bot_admin_outbox_messages", "Сообщения админу в базе по статусам", ["status"], admin_outbox.counts
+    ))
+
+# Реалистичный путь: моделирование в отдельном потоке с кэшем по округлённым данным
+montecarlo_engine = MonteCarloEngine(
+    paths=config.MONTECARLO_PATHS,
+    horizon=config.MONTECARLO_MAX_GAMES,
+    cache_size=config.MONTECARLO_CACHE_SIZE
+) if config.MONTECARLO_ENABLED else None
+
+if config.METRICS_ENABLED and montecarlo_engine is not None:
+    metrics.register_stats("bot_montecarlo", "Реалистичный путь: кэш и моделирования", montecarlo_engine.stats)
+
+# Inline-запросы одного пользователя: новый отменяет обработку предыдущего
+inline_coalescer = InlineCoalescer()
+
+if config.METRICS_ENABLED:
+    metrics.register_stats("bot_inline_coalescing", "Отменённые и устаревшие inline-запросы", inline_coalescer.stats)
+
+profiler = Profiler(
+    dp, bot, config.PROFILE_DIR,
+    top=config.PROFILE_TOP,
+    sample_interval=config.PROFILE_SAMPLE_INTERVAL
+)
+
+# Имя бота: запрашивается один раз при запуске и дальше не требует обращений к API
+bot_username: Optional[str] = None
+
+
+async def get_bot_username() -> str:
+    """Username бота (из кэша, заполненного при запуске)"""
+    global bot_username
+    if bot_username is None:
+        bot_username = (await bot.me()).username
+    return bot_username
+
+
+@dp.startup()
+async def on_startup():
+    """Прогрев: данные бота, статические ответы и отложенные импорты"""
+    username = await get_bot_username()
+    prepare_answers(username)
+    get_group_welcome_text(username)
+    # NumPy нужен только для таблицы "что если" и /batch - грузим его в фоне,
+    # не задерживая начало приёма обновлений
+    asyncio.get_running_loop().run_in_executor(None, batch.load_numpy)
+    # Доставка сообщений админу, в том числе не отправленных до перезапуска
+    await admin_outbox.start()
+    # Рассылки, прерванные перезапуском, продолжаются с контрольной точки
+    await broadcaster.resume()
+    logger.info("Бот @%s готов к работе", username)
+
+
+@dp.shutdown()
+async def on_shutdown():
+    """Запись оставшейся истории расчётов, остановка очереди сообщений админу и рассылок"""
+    if history is not None:
+        await history.close()
+    await admin_outbox.close()
+    await broadcaster.close()
+    await broadcast_store.close()
+
+
+@functools.lru_cache(maxsize=4)
+def get_group_welcome_text(username: str) -> str:
+    """Приветствие при добавлении бота в группу"""
+    return (
+        "🎮 <b>MLBB Winrate Calculator</b>\n\n"
+        "👋 Привет! Я бот-калькулятор винрейта для Mobile Legends!\n\n"
+        "💡 <b>Как использовать:</b>\n"
+        "Напишите <code>@" + username + " 100 55 60</code>\n\n"
+        "📋 <b>Формат:</b> <code>матчи текущий_WR желаемый_WR</code>\n\n"
+        "📝 <b>Пример:</b> <code>@" + username + " 150 52.5 60</code>\n\n"
+        "💡 Для полного функционала (с кнопками, подробной справкой, связью с админом) напишите боту в личные сообщения!"
+    )
+
+
 @dp.my_chat_member(ChatMemberUpdatedFilter(member_status_changed=JOIN_TRANSITION))
 async def bot_added_to_chat(event: ChatMemberUpdated):
     """Обработчик добавления бота в группу"""
     if event.chat.type in ['group', 'supergroup']:
-        welcome_text = (
-            "🎮 <b>MLBB Winrate Calculator</b>\n\n"
-            "👋 Привет! Я бот-калькулятор винрейта для Mobile Legends!\n\n"
-            "💡 <b>Как использовать:</b>\n"
-            "Напишите <code>@" + (await bot.me()).username + " 100 55 60</code>\n\n"
-            "📋 <b>Формат:</b> <code>матчи текущий_WR желаемый_WR</code>\n\n"
-            "📝 <b>Пример:</b> <code>@" + (await bot.me()).username + " 150 52.5 60</code>\n\n"
-            "💡 Для полного функционала (с кнопками, подробной справкой, связью с админом) напишите боту в личные сообщения!"
-        )
         await bot.send_message(
             chat_id=event.chat.id,
-            text=welcome_text,
+            text=get_group_welcome_text(await get_bot_username()),
             parse_mode="HTML"
         )
-        logger.info(f"Бот добавлен в группу: {event.chat.title} (ID: {event.chat.id})")
+        logger.info("Бот добавлен в группу: %s (ID: %s)", event.chat.title, event.chat.id)
 
 
 @dp.message(CommandStart())
@@ -197,30 +453,8 @@ async def cmd_start(message: Message):
     if message.chat.type in ['group', 'supergroup']:
         return
     
-    # Только в личных сообщениях
-    welcome_text = (
-        "┏━━━━━━━━━━━━━━━━━━━━━━\n"
-        "┃  🎮 <b>MLBB CALCULATOR</b> 🎮  ┃\n"
-        "┗━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        "👋 Привет! Я бот-калькулятор винрейта для <b>Mobile Legends: Bang Bang</b>!\n\n"
-        "🎯 <b>Что я умею:</b>\n"
-        "• Рассчитываю необходимое количество побед\n"
-        "• Показываю детальную статистику\n"
-        "• Работаю быстро и точно\n"
-        "• Работаю в групповых чатах (inline-режим)!\n\n"
-        "📊 Узнай, сколько побед подряд нужно одержать для достижения желаемого винрейта!\n\n"
-        "💡 Используй кнопки ниже для навигации ⬇️"
-    )
-    await message.answer(
-        welcome_text,
-        parse_mode="HTML",
-        reply_markup=get_main_keyboard()
-    )
-    await message.answer(
-        "🚀 <b>Быстрый старт:</b>",
-        parse_mode="HTML",
-        reply_markup=get_start_inline_keyboard()
-    )
+    await answer(message, replies.START)
+    await answer(message, replies.QUICK_START)
 
 
 @dp.message(Command('help'))
@@ -230,35 +464,7 @@ async def cmd_help(message: Message):
     if message.chat.type in ['group', 'supergroup']:
         return
     
-    help_text = (
-        "╔═══════════════════╗\n"
-        "║  📖 <b>ИНСТРУКЦИЯ</b> 📖  ║\n"
-        "╚═══════════════════╝\n\n"
-        "<b>🎯 Как пользоваться ботом:</b>\n\n"
-        "1️⃣ Нажми кнопку <b>\"🎯 Рассчитать винрейт\"</b> или /calc\n"
-        "2️⃣ Введи <b>количество матчей</b> на герое (например: 100)\n"
-        "3️⃣ Введи <b>текущий винрейт</b> в % (например: 55.5)\n"
-        "4️⃣ Введи <b>желаемый винрейт</b> в % (например: 60)\n\n"
-        "✅ Бот мгновенно рассчитает результат!\n\n"
-        "━━━━━━━━━━━━━━━━━━━━\n\n"
-        "<b>📱 Где найти статистику в MLBB:</b>\n\n"
-        "🎮 <b>Для героя:</b>\n"
-        "   • Профиль → Поле боя → Фавориты\n\n"
-        "📊 <b>Для аккаунта:</b>\n"
-        "   • Профиль → Поле боя → Статистика\n\n"
-        "━━━━━━━━━━━━━━━━━━━━\n\n"
-        "<b>💡 Полезные команды:</b>\n"
-        "   /calc - Начать расчёт\n"
-        "   /cancel - Отменить текущий расчёт\n"
-        "   /help - Показать эту справку\n"
-        "   /start - Главное меню"
-    )
-    
-    await message.answer(
-        help_text,
-        parse_mode="HTML",
-        reply_markup=get_main_keyboard()
-    )
+    await answer(message, replies.HELP)
 
 
 @dp.message(Command('calc'))
@@ -269,20 +475,7 @@ async def cmd_calc(message: Message, state: FSMContext):
         return
     
     await state.set_state(WinrateCalc.waiting_for_matches)
-    calc_start_text = (
-        "╔═══════════════════════╗\n"
-        "║  🎮 <b>РАСЧЁТ ВИНРЕЙТА</b> 🎮  ║\n"
-        "╚═══════════════════════╝\n\n"
-        "📊 <b>Шаг 1 из 3</b>\n\n"
-        "Введи <b>текущее количество матчей</b> на герое 🎯\n\n"
-        "📝 <i>Пример:</i> <code>100</code>\n\n"
-        "💡 Это можно найти в профиле героя во вкладке \"Избранное\""
-    )
-    await message.answer(
-        calc_start_text,
-        parse_mode="HTML",
-        reply_markup=get_cancel_keyboard()
-    )
+    await answer(message, replies.CALC_START)
 
 
 @dp.message(Command('cancel'))
@@ -290,19 +483,11 @@ async def cmd_cancel(message: Message, state: FSMContext):
     """Обработчик команды /cancel - отмена текущего расчета"""
     current_state = await state.get_state()
     if current_state is None:
-        await message.answer(
-            "⚠️ Нет активного расчета для отмены.",
-            reply_markup=get_main_keyboard()
-        )
+        await answer(message, replies.NO_ACTIVE_CALC)
         return
     
     await state.clear()
-    await message.answer(
-        "❌ <b>Расчет отменен</b>\n\n"
-        "Нажми кнопку ниже, чтобы начать заново 👇",
-        parse_mode="HTML",
-        reply_markup=get_main_keyboard()
-    )
+    await answer(message, replies.CALC_CANCELLED)
 
 
 @dp.message(Command('admin'))
@@ -312,20 +497,69 @@ async def cmd_admin(message: Message, state: FSMContext):
     if message.chat.type in ['group', 'supergroup']:
         return
     
-    admin_text = (
-        "╔════════════════════════╗\n"
-        "║  💬 <b>СВЯЗЬ С АДМИНОМ</b> 💬  ║\n"
-        "╚════════════════════════╝\n\n"
-        "👋 Привет! Если у тебя есть вопросы или предложения, я всегда на связи.\n\n"
-        "✍️ <b>Жду твоё сообщение...</b>"
-    )
-    
     await state.set_state(AdminMessage.waiting_for_message)
-    await message.answer(
-        admin_text,
-        parse_mode="HTML",
-        reply_markup=get_cancel_admin_keyboard()
-    )
+    await answer(message, replies.ADMIN)
+
+
+def parse_profile_args(args: str):
+    """Разбор аргументов /profile: [sample] [N | Ts] -> (режим, обновления, секунды)"""
+    mode, updates, seconds = MODE_CPROFILE, config.PROFILE_DEFAULT_UPDATES, config.PROFILE_MAX_SECONDS
+    for arg in args.split():
+        arg = arg.lower()
+        if arg in (MODE_SAMPLE, MODE_CPROFILE):
+            mode = arg
+        elif arg.endswith('s') and arg[:-1].isdigit():
+            updates, seconds = 0, min(int(arg[:-1]), config.PROFILE_MAX_SECONDS)
+        elif arg.isdigit():
+            updates = int(arg)
+        else:
+            raise ValueError(arg)
+    if seconds <= 0 and updates <= 0:
+        raise ValueError(args)
+    return mode, updates, seconds
+
+
+async def send_profile_report(report: str, path: str):
+    """Отправка отчёта профилирования администратору"""
+    report = report.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    await bot.send_message(ADMIN_ID, f"⏱ <b>Профилирование завершено</b>\n\n<pre>{report[:3800]}</pre>", parse_mode="HTML")
+    await bot.send_document(ADMIN_ID, FSInputFile(path), caption=f"📎 {os.path.basename(path)}")
+
+
+@dp.message(Command('profile'), F.from_user.id == ADMIN_ID)
+async def cmd_profile(message: Message, command: CommandObject):
+    """Обработчик команды /profile - профилирование без перезапуска (только для админа)"""
+    args = (command.args or "").strip()
+    if args.lower() == "stop":
+        if not profiler.active:
+            await message.answer("ℹ️ Профилирование не запущено")
+            return
+        await profiler.stop()
+        return
+    if profiler.active:
+        await message.answer(
+            f"⏳ Уже идёт профилирование: {profiler.updates} обновлений. Остановить: <code>/profile stop</code>",
+            parse_mode="HTML"
+        )
+        return
+    
+    try:
+        mode, updates, seconds = parse_profile_args(args)
+    except ValueError:
+        await message.answer(
+            "⚠️ <b>Формат:</b> <code>/profile [sample] [N | Ts]</code>\n\n"
+            "<code>/profile</code> - следующие " + str(config.PROFILE_DEFAULT_UPDATES) + " обновлений (cProfile)\n"
+            "<code>/profile 500</code> - следующие 500 обновлений\n"
+            "<code>/profile 30s</code> - 30 секунд\n"
+            "<code>/profile sample 60s</code> - сэмплирование стеков 60 секунд\n"
+            "<code>/profile stop</code> - остановить досрочно",
+            parse_mode="HTML"
+        )
+        return
+    
+    profiler.start(mode, updates, seconds, send_profile_report)
+    limit = f"{updates} обновлений (не дольше {seconds} сек)" if updates else f"{seconds} сек"
+    await message.answer(f"▶️ <b>Профилирование запущено</b> ({mode}): {limit}", parse_mode="HTML")
 
 
 @dp.message(AdminMessage.waiting_for_message)
@@ -378,38 +612,32 @@ async def callback_admin_confirm_yes(callback: CallbackQuery, state: FSMContext)
     username = data.get('username')
     full_name = data.get('full_name')
     
-    admin_notification = (
-        "📨 <b>НОВОЕ СООБЩЕНИЕ ОТ ПОЛЬЗОВАТЕЛЯ</b>\n\n"
-        f"👤 <b>От:</b> {full_name}\n"
-        f"🆔 <b>User ID:</b> <code>{user_id}</code>\n"
-        f"📝 <b>Username:</b> @{username}\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-        f"💬 <b>Сообщение:</b>\n\n{user_message}\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━━━━"
-    )
-    
-    # Создаем кнопку "Ответить" для админа
-    reply_keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="💬 Ответить пользователю", callback_data=f"reply_to_{user_id}")]
-        ]
-    )
+    if not user_message:
+        # Повторное нажатие: сообщение уже в очереди, состояние очищено
+        return
     
     try:
-        await bot.send_message(
-            chat_id=ADMIN_ID,
-            text=admin_notification,
-            parse_mode="HTML",
-            reply_markup=reply_keyboard
+        # Сообщение сохраняется в очередь и доставляется в фоне; когда админ его
+        # получит, этот же текст сменится отметкой о доставке
+        _, is_new = await admin_outbox.enqueue(
+            user_id, full_name, username, user_message,
+            receipt_chat_id=callback.message.chat.id,
+            receipt_message_id=callback.message.message_id
         )
-        await callback.message.edit_text(
-            "✅ <b>Сообщение успешно отправлено!</b>\n\n"
-            "Спасибо за обратную связь! 🙏",
-            parse_mode="HTML"
-        )
-        logger.info(f"Сообщение от пользователя {user_id} ({username}) отправлено администратору")
+        if is_new:
+            await callback.message.edit_text(
+                "📤 <b>Сообщение принято!</b>\n\n"
+                "Оно будет доставлено администратору - здесь появится отметка о доставке.",
+                parse_mode="HTML"
+            )
+            logger.info("Сообщение от пользователя %s (%s) поставлено в очередь для администратора", user_id, username)
+        else:
+            await callback.message.edit_text(
+                "ℹ️ <b>Это сообщение уже отправлено</b> администратору.",
+                parse_mode="HTML"
+            )
     except Exception as e:
-        logger.error(f"Ошибка при отправке сообщения админу: {e}")
+        logger.error("Ошибка при постановке сообщения админу в очередь: %s", e)
         await callback.message.edit_text(
             "❌ <b>Ошибка при отправке!</b> Попробуйте позже.",
             parse_mode="HTML"
@@ -458,7 +686,7 @@ async def callback_reply_to_user(callback: CallbackQuery, state: FSMContext):
         parse_mode="HTML"
     )
     
-    logger.info(f"Админ начал отвечать пользователю {user_id}")
+    logger.info("Админ начал отвечать пользователю %s", user_id)
 
 
 @dp.message(AdminReply.waiting_for_reply)
@@ -507,10 +735,10 @@ async def process_admin_reply(message: Message, state: FSMContext):
             parse_mode="HTML"
         )
         
-        logger.info(f"Админ ответил пользователю {user_id}")
+        logger.info("Админ ответил пользователю %s", user_id)
         
     except Exception as e:
-        logger.error(f"Ошибка при отправке ответа пользователю {user_id}: {e}")
+        logger.error("Ошибка при отправке ответа пользователю %s: %s", user_id, e)
         await message.answer(
             f"❌ <b>Ошибка при отправке!</b>\n\n"
             f"Возможно, пользователь заблокировал бота.\n"
@@ -521,6 +749,83 @@ async def process_admin_reply(message: Message, state: FSMContext):
     await state.clear()
 
 
+@dp.message(Command('broadcast'), F.from_user.id == ADMIN_ID)
+async def cmd_broadcast(message: Message, state: FSMContext):
+    """Обработчик команды /broadcast - рассылка всем пользователям (только для админа)"""
+    await state.set_state(BroadcastMessage.waiting_for_text)
+    await message.answer(
+        "📣 <b>Рассылка всем пользователям</b>\n\n"
+        f"👥 Получателей: <code>{await broadcast_store.count_users()}</code>\n\n"
+        "✍️ Напишите текст рассылки следующим сообщением (форматирование сохранится).\n\n"
+        "Для отмены используйте /cancel",
+        parse_mode="HTML"
+    )
+
+
+@dp.message(BroadcastMessage.waiting_for_text)
+async def process_broadcast_text(message: Message, state: FSMContext):
+    """Предпросмотр текста рассылки"""
+    if not message.text:
+        await message.answer("⚠️ Рассылка поддерживает только текст. Напишите сообщение или /cancel")
+        return
+    
+    text = (
+        "📢 <b>СООБЩЕНИЕ ОТ АДМИНИСТРАТОРА</b>\n\n"
+        f"{message.html_text}"
+    )
+    await state.update_data(broadcast_text=text)
+    await state.set_state(BroadcastMessage.waiting_for_confirmation)
+    
+    confirm_keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="📣 Да, разослать", callback_data="broadcast_confirm"),
+                InlineKeyboardButton(text="❌ Отмена", callback_data="broadcast_cancel")
+            ]
+        ]
+    )
+    await message.answer(text, parse_mode="HTML")
+    await message.answer(
+        f"❓ <b>Разослать это сообщение?</b> Получателей: <code>{await broadcast_store.count_users()}</code>",
+        parse_mode="HTML",
+        reply_markup=confirm_keyboard
+    )
+
+
+@dp.callback_query(F.data == "broadcast_confirm", F.from_user.id == ADMIN_ID)
+async def callback_broadcast_confirm(callback: CallbackQuery, state: FSMContext):
+    """Запуск рассылки"""
+    await callback.answer()
+    data = await state.get_data()
+    await state.clear()
+    text = data.get('broadcast_text')
+    if not text:
+        # Повторное нажатие: рассылка уже запущена
+        return
+    
+    await callback.message.edit_text("🚀 <b>Рассылка запущена</b>", parse_mode="HTML")
+    # Прогресс обновляется в отдельном сообщении с кнопкой остановки
+    await broadcaster.start(text, callback.message.chat.id)
+
+
+@dp.callback_query(F.data == "broadcast_cancel", F.from_user.id == ADMIN_ID)
+async def callback_broadcast_cancel(callback: CallbackQuery, state: FSMContext):
+    """Отмена рассылки до запуска"""
+    await callback.answer()
+    await state.clear()
+    await callback.message.edit_text("❌ <b>Рассылка отменена</b>", parse_mode="HTML")
+
+
+@dp.callback_query(F.data.startswith("broadcast_stop:"), F.from_user.id == ADMIN_ID)
+async def callback_broadcast_stop(callback: CallbackQuery):
+    """Остановка идущей рассылки"""
+    broadcast_id = int(callback.data.split(":")[1])
+    if await broadcaster.stop(broadcast_id):
+        await callback.answer("⏹ Рассылка остановлена")
+    else:
+        await callback.answer("Рассылка уже завершена")
+
+
 @dp.message(WinrateCalc.waiting_for_matches)
 async def process_matches(message: Message, state: FSMContext):
     """Обработка ввода количества матчей"""
@@ -583,39 +888,358 @@ async def process_desired_wr(message: Message, state: FSMContext):
     try:
         desired_wr = float(message.text.replace(',', '.'))
         data = await state.get_data()
-        result = calculate_wins_needed(data['total_matches'], data['current_wr'], desired_wr)
-        
+        result, response = get_calculation(data['total_matches'], data['current_wr'], desired_wr)
+
         if 'error' in result:
-            await message.answer(f"❌ <b>Ошибка:</b> {result['error']}", parse_mode="HTML")
+            await message.answer(response, parse_mode="HTML")
             await state.clear()
             return
-        
-        progress_bar = create_progress_bar(data['current_wr'], desired_wr)
-        response = (
-            "╔════════════════════════╗\n"
-            "║  ✅ <b>РАСЧЁТ ЗАВЕРШЁН!</b> ✅  ║\n"
-            "╚════════════════════════╝\n\n"
-            f"📊 <b>ИСХОДНЫЕ ДАННЫЕ:</b>\n"
-            f"┣ Матчей: <code>{data['total_matches']}</code>\n"
-            f"┣ Текущий WR: <code>{data['current_wr']:.1f}%</code>\n\n"
-            f"{progress_bar}\n\n"
-            f"🎯 <b>ЦЕЛЬ: {desired_wr:.1f}%</b>\n\n"
-            f"🏆 <b>НУЖНО ВЫИГРАТЬ ПОДРЯД:</b>\n"
-            f"<b><u>{result['wins_needed']} матч(ей)</u></b> 🔥\n\n"
-            f"📈 <b>ИТОГОВАЯ СТАТИСТИКА:</b>\n"
-            f"┣ Всего матчей: <code>{result['new_total_matches']}</code>\n"
-            f"┗ Итоговый WR: <code>{result['actual_new_wr']:.2f}%</code>\n\n"
-            f"💪 <b>Удачи на поле боя!</b> 🎮"
-        )
-        
+
+        if history is not None:
+            history.add(message.from_user.id, SOURCE_PRIVATE, data['total_matches'],
+                        data['current_wr'], desired_wr, result['wins_needed'])
+
         await message.answer(response, parse_mode="HTML", reply_markup=get_main_keyboard())
-        await message.answer("🔄 <b>Что дальше?</b>", parse_mode="HTML", reply_markup=get_result_keyboard())
+        if config.WHATIF_ENABLED:
+            span = config.WHATIF_DEFAULT_SPAN
+            await message.answer(
+                format_whatif_text(data['total_matches'], data['current_wr'], span),
+                parse_mode="HTML",
+                reply_markup=get_whatif_keyboard(data['total_matches'], data['current_wr'], span, desired_wr)
+            )
+        elif montecarlo_engine is not None:
+            await message.answer(
+                replies.WHAT_NEXT_TEXT,
+                parse_mode="HTML",
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [get_montecarlo_button(data['total_matches'], data['current_wr'], desired_wr)],
+                    replies.RESULT_BUTTONS
+                ])
+            )
+        else:
+            await answer(message, replies.WHAT_NEXT)
         await state.clear()
         
     except ValueError:
         await message.answer("⚠️ <b>Неверный формат!</b> Введи <b>число</b>.", parse_mode="HTML")
 
 
+async def send_batch_result(message: Message, text: str):
+    """Пакетный расчёт по тексту таблицы и отправка сводной таблицы"""
+    rows = batch.parse_rows(text)
+    if not rows['name']:
+        await message.answer("⚠️ Не нашёл ни одной строки с данными.", reply_markup=get_main_keyboard())
+        return
+    if len(rows['name']) > BATCH_MAX_ROWS:
+        await message.answer(
+            f"⚠️ Слишком много строк: <b>{len(rows['name'])}</b> (максимум {BATCH_MAX_ROWS}).",
+            parse_mode="HTML",
+            reply_markup=get_main_keyboard()
+        )
+        return
+    
+    results = batch.calculate_batch(rows['total_matches'], rows['current_wr'], rows['desired_wr'])
+    await message.answer(
+        batch.format_table(rows, results, limit=BATCH_TABLE_ROWS),
+        parse_mode="HTML",
+        reply_markup=get_main_keyboard()
+    )
+    if len(rows['name']) > BATCH_TABLE_ROWS:
+        await message.answer_document(
+            BufferedInputFile(batch.to_csv(rows, results), filename="batch_result.csv"),
+            caption="📎 Полная таблица результатов"
+        )
+    logger.info("Пакетный расчёт: %s строк", len(rows['name']))
+
+
+@dp.message(Command('batch'))
+async def cmd_batch(message: Message, state: FSMContext, command: CommandObject):
+    """Обработчик команды /batch - расчёт сразу для списка героев"""
+    # В группах не работает
+    if message.chat.type in ['group', 'supergroup']:
+        return
+    
+    # Таблица может прийти прямо в сообщении с командой
+    if command.args:
+        await send_batch_result(message, command.args)
+        return
+    
+    await state.set_state(BatchCalc.waiting_for_data)
+    await message.answer(
+        "📋 <b>ПАКЕТНЫЙ РАСЧЁТ</b>\n\n"
+        "Вставь таблицу - по одному герою в строке:\n"
+        "<code>герой матчи текущий_WR желаемый_WR</code>\n\n"
+        "📝 <i>Пример:</i>\n"
+        "<code>Layla 100 55.5 60\n"
+        "Miya 200 60 65</code>\n\n"
+        "📎 Или отправь <b>CSV-файл</b> с такими столбцами.",
+        parse_mode="HTML",
+        reply_markup=get_cancel_keyboard()
+    )
+
+
+@dp.message(BatchCalc.waiting_for_data)
+async def process_batch_data(message: Message, state: FSMContext):
+    """Обработка таблицы для пакетного расчёта (текст или CSV-файл)"""
+    if message.text in ["❌ Отменить", "❌ Отменить расчет"]:
+        await cmd_cancel(message, state)
+        return
+    
+    if message.document:
+        if message.document.file_size and message.document.file_size > BATCH_MAX_FILE_SIZE:
+            await message.answer("⚠️ Файл слишком большой (максимум 5 МБ).")
+            return
+        file = await bot.download(message.document)
+        text = file.read().decode('utf-8-sig', errors='replace')
+    elif message.text:
+        text = message.text
+    else:
+        await message.answer("⚠️ Отправь таблицу текстом или CSV-файлом.")
+        return
+    
+    await state.clear()
+    await send_batch_result(message, text)
+
+
+async def load_hero_pool(state: FSMContext) -> HeroPool:
+    """
+    Список героев пользователя: из кэша процесса, если его ревизия совпадает
+    с данными FSM (их мог изменить другой процесс), иначе - из данных FSM.
+    Запись изымается из кэша и возвращается в него в save_hero_pool.
+    """
+    data = await state.get_data()
+    cached = hero_pools.get(state.key)
+    hero_pools.pop(state.key)
+    if cached is not None and cached[0] == data.get('revision'):
+        return cached[1]
+    return HeroPool.from_data(data)
+
+
+async def save_hero_pool(state: FSMContext, pool: HeroPool) -> None:
+    revision = secrets.token_hex(8)
+    await state.update_data(pool.to_data(), revision=revision)
+    hero_pools.set(state.key, (revision, pool))
+
+
+async def update_heroes(message: Message, state: FSMContext, text: str):
+    """Добавление героев (или установка цели) и ответ сводкой с планом"""
+    notes = []
+    try:
+        target = float(text.strip().replace(',', '.').rstrip('%'))
+    except ValueError:
+        target = None
+    if target is not None and not 0 < target < 100:
+        await message.answer("⚠️ Цель должна быть <b>больше 0</b> и <b>меньше 100%</b>.", parse_mode="HTML")
+        return
+    
+    pool = await load_hero_pool(state)
+    if target is not None:
+        pool.set_target(target)
+    else:
+        heroes, removed, errors = parse_heroes(text)
+        skipped = sum(not pool.add(name, matches, current_wr) for name, matches, current_wr in heroes)
+        removed = sum(pool.remove(name) for name in removed)
+        if removed:
+            notes.append(f"🗑 Удалено героев: {removed}")
+        if skipped:
+            notes.append(f"⚠️ Не добавлено {skipped} (максимум героев - {MAX_HEROES})")
+        if errors:
+            preview = ", ".join(html.escape(line[:30]) for line in errors[:3])
+            notes.append(f"⚠️ Не понял строк: {len(errors)} ({preview})")
+    
+    await save_hero_pool(state, pool)
+    text = format_pool(pool)
+    if notes:
+        text += "\n\n" + "\n".join(notes)
+    await message.answer(text, parse_mode="HTML", reply_markup=get_heroes_keyboard())
+
+
+@dp.message(Command('heroes'))
+async def cmd_heroes(message: Message, state: FSMContext, command: CommandObject):
+    """Обработчик команды /heroes - винрейт аккаунта по списку героев и план до цели"""
+    # В группах не работает
+    if message.chat.type in ['group', 'supergroup']:
+        return
+    
+    await state.set_state(HeroesCalc.collecting)
+    if command.args:
+        await update_heroes(message, state, command.args)
+        return
+    await message.answer(replies.HEROES_START_TEXT, parse_mode="HTML", reply_markup=get_cancel_keyboard())
+
+
+@dp.message(HeroesCalc.collecting)
+async def process_heroes(message: Message, state: FSMContext):
+    """Новые герои, удаление героев или цель аккаунта"""
+    if message.text in ["❌ Отменить", "❌ Отменить расчет"]:
+        await cmd_cancel(message, state)
+        return
+    if not message.text:
+        await message.answer("⚠️ Отправь героев текстом: <code>герой матчи WR</code>", parse_mode="HTML")
+        return
+    await update_heroes(message, state, message.text)
+
+
+@dp.callback_query(F.data == "heroes_clear")
+async def callback_heroes_clear(callback: CallbackQuery, state: FSMContext):
+    """Очистка списка героев (цель сохраняется)"""
+    if await state.get_state() != HeroesCalc.collecting.state:
+        # Режим героев уже закрыт или истёк - отвечаем, чтобы кнопка не «висела»
+        await callback.answer("Список героев устарел, начни заново: /heroes", show_alert=True)
+        await callback.message.edit_reply_markup(reply_markup=None)
+        return
+    await callback.answer("🗑 Список очищен")
+    data = await state.get_data()
+    pool = HeroPool(target=data.get('target'))
+    await save_hero_pool(state, pool)
+    await callback.message.edit_text(format_pool(pool), parse_mode="HTML", reply_markup=get_heroes_keyboard())
+
+
+@dp.callback_query(F.data == "heroes_done")
+async def callback_heroes_done(callback: CallbackQuery, state: FSMContext):
+    """Выход из режима героев"""
+    await callback.answer()
+    if await state.get_state() == HeroesCalc.collecting.state:
+        await state.clear()
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await answer(callback.message, replies.WHAT_NEXT)
+
+
+@dp.callback_query(F.data.startswith("whatif:"))
+async def callback_whatif_range(callback: CallbackQuery):
+    """Изменение диапазона таблицы "что если" редактированием сообщения"""
+    await callback.answer()
+    
+    # whatif:матчи:WR:диапазон[:цель] - цель есть у кнопок, созданных с реалистичным путём
+    _, matches, current_wr, span, *desired = callback.data.split(":")
+    total_matches, current_wr = int(matches), float(current_wr)
+    desired_wr = float(desired[0]) if desired else None
+    span = max(config.WHATIF_MIN_SPAN, min(int(span), config.WHATIF_MAX_SPAN))
+    
+    await callback.message.edit_text(
+        format_whatif_text(total_matches, current_wr, span),
+        parse_mode="HTML",
+        reply_markup=get_whatif_keyboard(total_matches, current_wr, span, desired_wr)
+    )
+
+
+async def get_montecarlo_reply(total_matches: int, current_wr: float, desired_wr: float,
+                               win_rate: float) -> tuple:
+    """Текст и клавиатура реалистичного пути (или текст ошибки и None)"""
+    result, response = get_calculation(total_matches, current_wr, desired_wr)
+    if 'error' in result:
+        return response, None
+    simulation = await montecarlo_engine.run(total_matches, current_wr, desired_wr, win_rate)
+    return (
+        render_montecarlo(simulation, result['wins_needed']),
+        get_montecarlo_keyboard(total_matches, current_wr, desired_wr, simulation.win_rate)
+    )
+
+
+@dp.callback_query(F.data.startswith("montecarlo:"))
+async def callback_montecarlo(callback: CallbackQuery):
+    """Реалистичный путь к цели: шанс победы в матче равен текущему винрейту"""
+    if montecarlo_engine is None:
+        await callback.answer()
+        return
+    await callback.answer("🎲 Моделирую...")
+    
+    _, matches, current_wr, desired_wr = callback.data.split(":")
+    total_matches, current_wr, desired_wr = int(matches), float(current_wr), float(desired_wr)
+    text, keyboard = await get_montecarlo_reply(total_matches, current_wr, desired_wr, current_wr)
+    await callback.message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@dp.callback_query(F.data.startswith("montecarlo_wr:"))
+async def callback_montecarlo_win_rate(callback: CallbackQuery):
+    """Пересчёт реалистичного пути с другим шансом победы (редактированием сообщения)"""
+    if montecarlo_engine is None:
+        await callback.answer()
+        return
+    await callback.answer()
+    
+    _, matches, current_wr, desired_wr, win_rate = callback.data.split(":")
+    total_matches, current_wr, desired_wr = int(matches), float(current_wr), float(desired_wr)
+    win_rate = max(0.0, min(float(win_rate), 100.0))
+    text, keyboard = await get_montecarlo_reply(total_matches, current_wr, desired_wr, win_rate)
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+def format_history_text(entries: list, chart_values: list) -> str:
+    """Страница истории: таблица расчётов и график текущего винрейта"""
+    if not entries:
+        return (
+            "📜 <b>История пуста</b>\n\n"
+            "Здесь появятся твои расчёты - нажми /calc, чтобы сделать первый."
+        )
+    
+    lines = [f"{'Дата':<11} {'Матчи':>6} {'WR':>5} {'Цель':>5} {'Побед':>5}"]
+    for entry in entries:
+        date = time.strftime("%d.%m %H:%M", time.localtime(entry.created_at))
+        mark = "@" if entry.source == SOURCE_INLINE else " "
+        lines.append(
+            f"{date:<11} {entry.total_matches:>6} {entry.current_wr:>5.1f} "
+            f"{entry.desired_wr:>5.1f} {entry.wins_needed:>5}{mark}"
+        )
+    text = "📜 <b>ИСТОРИЯ РАСЧЁТОВ</b>\n\n"
+    if len(chart_values) > 1:
+        text += (
+            f"📈 <b>Текущий WR</b> (последние {len(chart_values)}):\n"
+            f"<code>{sparkline(chart_values)}</code>\n"
+            f"<code>{chart_values[0]:.1f}% → {chart_values[-1]:.1f}%</code>\n\n"
+        )
+    text += f"<pre>{chr(10).join(lines)}</pre>"
+    if any(entry.source == SOURCE_INLINE for entry in entries):
+        text += "\n<i>@ - расчёт в inline-режиме</i>"
+    return text
+
+
+def get_history_keyboard(entries: list, before_id: Optional[int]) -> Optional[InlineKeyboardMarkup]:
+    """Кнопки листания истории (keyset: id последней показанной записи)"""
+    buttons = []
+    if before_id is not None:
+        buttons.append(InlineKeyboardButton(text="⏮ К последним", callback_data="history:0"))
+    if len(entries) == config.HISTORY_PAGE_SIZE:
+        buttons.append(InlineKeyboardButton(text="◀️ Раньше", callback_data=f"history:{entries[-1].id}"))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
+
+
+async def render_history_page(user_id: int, before_id: Optional[int]) -> tuple:
+    """(текст, клавиатура) для страницы истории"""
+    if before_id is None:
+        # Одним запросом по индексу: точки для графика и первая страница таблицы
+        recent = await history.page(user_id, limit=max(config.HISTORY_PAGE_SIZE, config.HISTORY_CHART_POINTS))
+        entries = recent[:config.HISTORY_PAGE_SIZE]
+        chart_values = [entry.current_wr for entry in reversed(recent[:config.HISTORY_CHART_POINTS])]
+    else:
+        entries = await history.page(user_id, before_id, limit=config.HISTORY_PAGE_SIZE)
+        chart_values = []
+    return format_history_text(entries, chart_values), get_history_keyboard(entries, before_id)
+
+
+@dp.message(Command('history'))
+async def cmd_history(message: Message):
+    """Обработчик команды /history - прошлые расчёты пользователя"""
+    # В группах не работает
+    if message.chat.type in ['group', 'supergroup'] or history is None:
+        return
+    
+    text, keyboard = await render_history_page(message.from_user.id, None)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard or get_main_keyboard())
+
+
+@dp.callback_query(F.data.startswith("history:"))
+async def callback_history_page(callback: CallbackQuery):
+    """Листание истории редактированием сообщения"""
+    await callback.answer()
+    if history is None:
+        return
+    
+    before_id = int(callback.data.split(":")[1]) or None
+    text, keyboard = await render_history_page(callback.from_user.id, before_id)
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
 @dp.callback_query(F.data == "start_calc")
 async def callback_start_calc(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
@@ -647,16 +1271,7 @@ async def text_help_button(message: Message):
 @dp.message(F.text == "ℹ️ О боте")
 async def text_about_button(message: Message):
     """Обработчик кнопки 'О боте'"""
-    about_text = (
-        "╔═══════════════════╗\n"
-        "║  ℹ️ <b>О БОТЕ</b> ℹ️  ║\n"
-        "╚═══════════════════╝\n\n"
-        "🎮 <b>MLBB Winrate Calculator</b>\n\n"
-        "Умный калькулятор для игроков Mobile Legends, "
-        "который помогает планировать свой путь к желаемому винрейту.\n\n"
-        "💪 <b>Удачи на поле боя!</b> 🏆"
-    )
-    await message.answer(about_text, parse_mode="HTML", reply_markup=get_main_keyboard())
+    await answer(message, replies.ABOUT)
 
 
 @dp.message(F.text.in_({"❌ Отменить расчет", "❌ Отменить отправку"}))
@@ -671,137 +1286,128 @@ async def unknown_message(message: Message):
     if message.chat.type in ['group', 'supergroup']:
         return
     
-    # Отвечаем только в личных сообщениях
-    await message.answer(
-        "❓ <b>Не понимаю...</b>\n\n"
-        "Используй кнопки ниже 👇",
-        parse_mode="HTML",
-        reply_markup=get_main_keyboard()
+    # Отвечаем только в личных сообщениях (в режиме webhook - прямо в ответе на запрос)
+    return answer(message, replies.UNKNOWN)
+
+
+async def compute_inline_answer(query: str, matches: int, current_wr: float, desired_wr: float,
+                                win_rate: Optional[float]):
+    """Карточка расчёта и (если включён) реалистичного пути для разобранного запроса"""
+    # Вычисляем (или берём готовый результат из кэша)
+    result_data, result_text = get_calculation(matches, current_wr, desired_wr)
+
+    if 'error' in result_data:
+        title = "❌ Ошибка в данных"
+        description = result_data['error']
+    else:
+        wins = result_data['wins_needed']
+        title = f"✅ Нужно {wins} побед"
+        description = f"Из {matches} матчей ({current_wr}% → {desired_wr}%)"
+    inline_answer = computed_answer(query, title, description, result_text)
+    if montecarlo_engine is None or 'error' in result_data:
+        return inline_answer
+
+    # Пока идёт набор ("150 52.5 6" -> "150 52.5 60"), моделирование для
+    # промежуточных запросов отменяется во время паузы и не занимает поток
+    if not montecarlo_engine.is_cached(matches, current_wr, desired_wr, win_rate) and config.INLINE_DEBOUNCE > 0:
+        await asyncio.sleep(config.INLINE_DEBOUNCE)
+    # Вторая карточка - реалистичный путь; с указанным шансом победы она первая
+    simulation = await montecarlo_engine.run(matches, current_wr, desired_wr, win_rate)
+    median = f"~{simulation.median}" if simulation.median is not None else f"больше {simulation.horizon}"
+    realistic = montecarlo_answer(
+        query,
+        title=f"🎲 Реалистично: {median} матчей",
+        description=(
+            f"При шансе победы {simulation.win_rate:g}%: "
+            f"дойдут {simulation.reached * 100:.0f}% за {simulation.horizon} матчей"
+        ),
+        text=render_montecarlo(simulation, result_data['wins_needed'])
     )
+    answers = (realistic, inline_answer) if win_rate is not None else (inline_answer, realistic)
+    return combine_answers(*answers)
 
 
 @dp.inline_query()
 async def inline_calc(inline_query: InlineQuery):
     """Обработчик inline-запросов для использования бота в любом чате"""
-    query = inline_query.query.strip()
+    query = normalize_query(inline_query.query)
     
     if not query:
         # Подсказка если пусто
-        result = InlineQueryResultArticle(
-            id="help",
-            title="📊 MLBB Winrate Calculator",
-            description="Введите: матчи текущий_WR желаемый_WR (пример: 100 55 60)",
-            input_message_content=InputTextMessageContent(
-                message_text=(
-                    "🎮 <b>MLBB Winrate Calculator</b>\n\n"
-                    "💡 <b>Как использовать:</b>\n"
-                    f"Напишите: <code>@{(await bot.me()).username} 100 55 60</code>\n\n"
-                    "Формат: <b>матчи текущий_WR желаемый_WR</b>\n"
-                    "Пример: 100 55 60"
-                ),
-                parse_mode="HTML"
-            ),
-            thumb_url="https://i.imgur.com/7XhGpwU.png"
-        )
-        await inline_query.answer([result], cache_time=1, is_personal=True)
-        return
+        return answer_method(inline_query, help_answer(await get_bot_username()))
     
     # Парсим данные
     try:
-        parts = query.split()
-        if len(parts) != 3:
-            raise ValueError("Нужно 3 числа")
-        
-        matches = int(parts[0])
-        current_wr = float(parts[1].replace(',', '.'))
-        desired_wr = float(parts[2].replace(',', '.'))
-        
-        # Вычисляем
-        result_data = calculate_wins_needed(matches, current_wr, desired_wr)
-        
-        if 'error' in result_data:
-            result_text = f"❌ <b>Ошибка:</b> {result_data['error']}"
-            title = "❌ Ошибка в данных"
-            description = result_data['error']
-        else:
-            # Формируем красивый результат как в личных сообщениях
-            wins = result_data['wins_needed']
-            new_matches = result_data['new_total_matches']
-            new_wr = result_data['actual_new_wr']
-            
-            # Создаем прогресс-бар
-            progress_bar = create_progress_bar(current_wr, desired_wr)
-            
-            result_text = (
-                "╔════════════════════════╗\n"
-                "║  ✅ <b>РАСЧЁТ ЗАВЕРШЁН!</b> ✅  ║\n"
-                "╚════════════════════════╝\n\n"
-                f"📊 <b>ИСХОДНЫЕ ДАННЫЕ:</b>\n"
-                f"┣ Матчей: <code>{matches}</code>\n"
-                f"┣ Текущий WR: <code>{current_wr:.1f}%</code>\n\n"
-                f"{progress_bar}\n\n"
-                f"🎯 <b>ЦЕЛЬ: {desired_wr:.1f}%</b>\n\n"
-                f"🏆 <b>НУЖНО ВЫИГРАТЬ ПОДРЯД:</b>\n"
-                f"<b><u>{wins} матч(ей)</u></b> 🔥\n\n"
-                f"📈 <b>ИТОГОВАЯ СТАТИСТИКА:</b>\n"
-                f"┣ Всего матчей: <code>{new_matches}</code>\n"
-                f"┗ Итоговый WR: <code>{new_wr:.2f}%</code>\n\n"
-                f"💪 <b>Удачи на поле боя!</b> 🎮"
-            )
-            title = f"✅ Нужно {wins} побед"
-            description = f"Из {matches} матчей ({current_wr}% → {desired_wr}%)"
-        
-        result = InlineQueryResultArticle(
-            id=query,
-            title=title,
-            description=description,
-            input_message_content=InputTextMessageContent(
-                message_text=result_text,
-                parse_mode="HTML"
-            ),
-            thumb_url="https://i.imgur.com/7XhGpwU.png"
-        )
-        
-        await inline_query.answer([result], cache_time=1, is_personal=True)
-        logger.info(f"Inline-запрос обработан: {query}")
-        
-    except (ValueError, IndexError) as e:
-        result = InlineQueryResultArticle(
-            id="error",
-            title="❌ Неверный формат",
-            description="Используйте: матчи текущий_WR желаемый_WR (пример: 100 55 60)",
-            input_message_content=InputTextMessageContent(
-                message_text=(
-                    "❌ <b>Неверный формат данных</b>\n\n"
-                    "💡 <b>Правильный формат:</b>\n"
-                    f"<code>@{(await bot.me()).username} матчи текущий_WR желаемый_WR</code>\n\n"
-                    "<b>Пример:</b>\n"
-                    f"<code>@{(await bot.me()).username} 100 55 60</code>\n\n"
-                    "Где:\n"
-                    "• <b>100</b> - количество сыгранных матчей\n"
-                    "• <b>55</b> - текущий винрейт в %\n"
-                    "• <b>60</b> - желаемый винрейт в %"
-                ),
-                parse_mode="HTML"
-            ),
-            thumb_url="https://i.imgur.com/7XhGpwU.png"
-        )
-        await inline_query.answer([result], cache_time=1, is_personal=True)
-        logger.warning(f"Ошибка в inline-запросе: {query}, ошибка: {e}")
+        matches, current_wr, desired_wr, win_rate = parse_query(query)
+    except ValueError:
+        # Недописанный или неверный запрос - готовая подсказка без расчёта
+        return answer_method(inline_query, hint_answer(query, await get_bot_username()))
+    
+    inline_answer = await inline_coalescer.run(
+        inline_query.from_user.id,
+        compute_inline_answer(query, matches, current_wr, desired_wr, win_rate)
+    )
+    if inline_answer is None:
+        # Пользователь уже допечатал запрос - ответ на него придёт в новом обновлении
+        return None
+    
+    logger.info("Inline-запрос обработан: %s", query, extra={"event": "inline"})
+    return answer_method(inline_query, inline_answer)
+
+
+@dp.chosen_inline_result()
+async def inline_result_chosen(chosen: ChosenInlineResult):
+    """Выбранный inline-результат попадает в историю (нужен /setinlinefeedback у @BotFather)"""
+    if history is None or not chosen.result_id.startswith(RESULT_COMPUTED + ":"):
+        return
+    try:
+        matches, current_wr, desired_wr, _ = parse_query(normalize_query(chosen.query))
+    except ValueError:
+        return
+    result, _ = get_calculation(matches, current_wr, desired_wr)
+    if 'error' not in result:
+        history.add(chosen.from_user.id, SOURCE_INLINE, matches, current_wr, desired_wr, result['wins_needed'])
 
 
-async def set_bot_commands():
-    """Установка команд бота в меню"""
+# Меню команд: (область, команды)
+BOT_COMMANDS = [
     # Команды для личных сообщений
-    private_commands = [
+    (BotCommandScopeAllPrivateChats(), [
         BotCommand(command="start", description="🏠 Главное меню"),
         BotCommand(command="admin", description="💬 Написать админу")
+    ]),
+    # Для групп - пустой список (без команд)
+    (BotCommandScopeAllGroupChats(), []),
+]
+
+
+def get_commands_hash() -> str:
+    """Хэш набора команд (вместе с id бота), чтобы не устанавливать их повторно"""
+    payload = [bot.id] + [
+        [scope.model_dump(mode="json"), [command.model_dump(mode="json") for command in commands]]
+        for scope, commands in BOT_COMMANDS
     ]
-    await bot.set_my_commands(private_commands, scope=BotCommandScopeAllPrivateChats())
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+async def set_bot_commands(force: bool = False):
+    """Установка команд бота в меню (пропускается, если набор не менялся)"""
+    commands_hash = get_commands_hash()
+    try:
+        with open(config.COMMANDS_HASH_PATH, encoding="utf-8") as f:
+            saved_hash = f.read().strip()
+    except OSError:
+        saved_hash = None
+    if saved_hash == commands_hash and not force:
+        logger.info("Команды бота не изменились - установка пропущена")
+        return
     
-    # Для групп - пустой список (без команд)
-    await bot.set_my_commands([], scope=BotCommandScopeAllGroupChats())
+    for scope, commands in BOT_COMMANDS:
+        await bot.set_my_commands(commands, scope=scope)
     
+    os.makedirs(os.path.dirname(config.COMMANDS_HASH_PATH) or ".", exist_ok=True)
+    with open(config.COMMANDS_HASH_PATH, "w", encoding="utf-8") as f:
+        f.write(commands_hash)
     logger.info("Команды бота установлены: только для личных сообщений")
 
 
@@ -809,12 +1415,21 @@ async def main():
     """Главная функция запуска бота"""
     logger.info("Запуск бота...")
     
+    metrics_runner = None
     try:
+        if config.METRICS_ENABLED:
+            metrics_runner = await metrics.start_metrics_server(config.METRICS_HOST, config.METRICS_PORT)
         await set_bot_commands()
         
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        if config.BOT_MODE == "webhook":
+            from webhook import run_webhook
+            await run_webhook(dp, bot)
+        else:
+            await bot.delete_webhook(drop_pending_updates=config.DROP_PENDING_UPDATES)
+            await dp.start_polling(bot)
     finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await bot.session.close()
 
 
@@ -0,0 +1,189 @@
+"""Настройки бота из переменных окружения"""
+import os
+
+
+def _get_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _get_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+# Токен бота и ID администратора
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+ADMIN_ID = _get_int("ADMIN_ID", 0)
+
+# Время кэширования inline-ответов на стороне Telegram (секунды) по классам результатов
+INLINE_CACHE_TIME_HELP = _get_int("INLINE_CACHE_TIME_HELP", 86400)
+INLINE_CACHE_TIME_ERROR = _get_int("INLINE_CACHE_TIME_ERROR", 3600)
+INLINE_CACHE_TIME_COMPUTED = _get_int("INLINE_CACHE_TIME_COMPUTED", 3600)
+# Пауза перед моделированием реалистичного пути для inline-запроса (сек): если за
+# это время пользователь допечатает запрос, моделирование не запускается
+INLINE_DEBOUNCE = _get_float("INLINE_DEBOUNCE", 0.15)
+
+# Адрес Bot API (пусто - api.telegram.org), например локальный сервер http://localhost:8081;
+# TELEGRAM_API_LOCAL - сервер запущен с --local (файлы читаются с диска)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+TELEGRAM_API_LOCAL = _get_bool("TELEGRAM_API_LOCAL", False)
+
+# HTTP-сессия бота: таймаут запроса (сек), соединений всего и на хост (0 - без предела),
+# keep-alive простаивающего соединения (сек), кэш DNS (сек, 0 - без кэша) и таймауты по методам
+HTTP_TIMEOUT = _get_float("HTTP_TIMEOUT", 60)
+HTTP_POOL_LIMIT = _get_int("HTTP_POOL_LIMIT", 100)
+HTTP_POOL_LIMIT_PER_HOST = _get_int("HTTP_POOL_LIMIT_PER_HOST", 0)
+HTTP_KEEPALIVE = _get_float("HTTP_KEEPALIVE", 60)
+HTTP_DNS_TTL = _get_int("HTTP_DNS_TTL", 3600)
+HTTP_METHOD_TIMEOUTS = os.getenv(
+    "HTTP_METHOD_TIMEOUTS",
+    "answerInlineQuery=10,answerCallbackQuery=10,sendMessage=20,editMessageText=20"
+)
+
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+# Сбрасывать ли накопившиеся обновления при запуске в режиме polling
+DROP_PENDING_UPDATES = _get_bool("DROP_PENDING_UPDATES", False)
+
+# Настройки webhook-сервера
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = _get_int("WEBAPP_PORT", 8080)
+
+# Каталог для файлов с данными (базы SQLite)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+# Хранилище состояний FSM: sqlite, redis или memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").lower()
+FSM_SQLITE_PATH = os.getenv("FSM_SQLITE_PATH", os.path.join(DATA_DIR, "fsm.sqlite3"))
+FSM_REDIS_URL = os.getenv("FSM_REDIS_URL", "redis://localhost:6379/0")
+# Время жизни незавершённого диалога (сек, 0 - бессрочно)
+FSM_TTL = _get_int("FSM_TTL", 86400)
+# Время жизни по группам состояний (или "Группа:состояние"), остальные - FSM_TTL
+FSM_STATE_TTL = os.getenv(
+    "FSM_STATE_TTL",
+    "WinrateCalc=1800,BatchCalc=1800,AdminMessage=3600,AdminReply=3600,BroadcastMessage=3600"
+)
+# Предел памяти для FSM_STORAGE=memory (МБ): сверх него вытесняются давние сессии
+FSM_MEMORY_LIMIT_MB = _get_float("FSM_MEMORY_LIMIT_MB", 64)
+# Кэш чтения в процессе: размер и время жизни записи (сек, 0 - без ограничения)
+FSM_CACHE_SIZE = _get_int("FSM_CACHE_SIZE", 10000)
+FSM_CACHE_TTL = _get_int("FSM_CACHE_TTL", 60)
+# Интервал пакетной записи изменений (сек)
+FSM_FLUSH_INTERVAL = _get_float("FSM_FLUSH_INTERVAL", 0.05)
+# Обновления одного чата обрабатывает только этот процесс (в воркерах supervisor.py - True);
+# без этого в режиме webhook кэш чтения и отложенная запись FSM отключаются
+FSM_CHAT_SHARDED = False
+
+# Число процессов-воркеров при запуске через supervisor.py
+BOT_WORKERS = _get_int("BOT_WORKERS", os.cpu_count() or 2)
+# Интервал отчёта о пропускной способности воркеров (сек)
+WORKER_REPORT_INTERVAL = _get_int("WORKER_REPORT_INTERVAL", 60)
+
+# Лимиты исходящих сообщений (Telegram: ~30 сообщений/с всего, ~1/с в личный чат, 20/мин в группу)
+SEND_GLOBAL_RATE = _get_float("SEND_GLOBAL_RATE", 30)
+# На сколько процессов делится общий лимит (в воркерах supervisor.py - число воркеров)
+SEND_RATE_SHARES = 1
+SEND_CHAT_RATE = _get_float("SEND_CHAT_RATE", 1)
+SEND_CHAT_BURST = _get_float("SEND_CHAT_BURST", 3)
+SEND_GROUP_RATE_PER_MIN = _get_float("SEND_GROUP_RATE_PER_MIN", 20)
+# Сколько раз повторять запрос после ошибки 429 (flood control)
+SEND_MAX_RETRIES = _get_int("SEND_MAX_RETRIES", 3)
+
+# Таблица "что если" после расчёта: шаг целей (%), число строк по умолчанию и пределы
+WHATIF_ENABLED = _get_bool("WHATIF_ENABLED", True)
+WHATIF_STEP = _get_float("WHATIF_STEP", 1.0)
+WHATIF_DEFAULT_SPAN = _get_int("WHATIF_DEFAULT_SPAN", 10)
+WHATIF_MIN_SPAN = _get_int("WHATIF_MIN_SPAN", 5)
+WHATIF_MAX_SPAN = _get_int("WHATIF_MAX_SPAN", 30)
+WHATIF_SPAN_DELTA = _get_int("WHATIF_SPAN_DELTA", 5)
+
+# Логирование: уровень, формат (json или text), файл (пусто - stderr) и доля сохраняемых
+# записей по событиям или логгерам (предупреждения и ошибки пишутся всегда)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_FILE = os.getenv("LOG_FILE", "")
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "inline=0.01,aiogram.event=0.01")
+
+# Метрики Prometheus (GET /metrics); воркеры supervisor.py используют порты METRICS_PORT + 1 + номер
+METRICS_ENABLED = _get_bool("METRICS_ENABLED", True)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _get_int("METRICS_PORT", 9101)
+
+# Профилирование по команде /profile: каталог для файлов, значения по умолчанию и пределы
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+PROFILE_DEFAULT_UPDATES = _get_int("PROFILE_DEFAULT_UPDATES", 100)
+PROFILE_MAX_SECONDS = _get_int("PROFILE_MAX_SECONDS", 300)
+PROFILE_TOP = _get_int("PROFILE_TOP", 15)
+PROFILE_SAMPLE_INTERVAL = _get_float("PROFILE_SAMPLE_INTERVAL", 0.005)
+
+# Хэш установленного меню команд: при совпадении set_my_commands при запуске не вызывается
+COMMANDS_HASH_PATH = os.getenv("COMMANDS_HASH_PATH", os.path.join(DATA_DIR, "bot_commands.sha256"))
+
+# История расчётов (/history)
+HISTORY_ENABLED = _get_bool("HISTORY_ENABLED", True)
+HISTORY_PATH = os.getenv("HISTORY_PATH", os.path.join(DATA_DIR, "history.sqlite3"))
+HISTORY_FLUSH_INTERVAL = _get_float("HISTORY_FLUSH_INTERVAL", 1.0)
+HISTORY_PAGE_SIZE = _get_int("HISTORY_PAGE_SIZE", 10)
+HISTORY_CHART_POINTS = _get_int("HISTORY_CHART_POINTS", 30)
+
+# Очередь сообщений администратору: повторы с экспоненциальной задержкой (сек),
+# защита от дублей (сек) и сводка, когда в очереди скопилось несколько сообщений
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", os.path.join(DATA_DIR, "outbox.sqlite3"))
+OUTBOX_BASE_DELAY = _get_float("OUTBOX_BASE_DELAY", 5)
+OUTBOX_MAX_DELAY = _get_float("OUTBOX_MAX_DELAY", 600)
+OUTBOX_MAX_ATTEMPTS = _get_int("OUTBOX_MAX_ATTEMPTS", 12)
+OUTBOX_DEDUP_WINDOW = _get_int("OUTBOX_DEDUP_WINDOW", 3600)
+OUTBOX_DIGEST_THRESHOLD = _get_int("OUTBOX_DIGEST_THRESHOLD", 3)
+OUTBOX_DIGEST_MAX = _get_int("OUTBOX_DIGEST_MAX", 10)
+OUTBOX_MIN_INTERVAL = _get_float("OUTBOX_MIN_INTERVAL", 1.0)
+OUTBOX_RETENTION_DAYS = _get_int("OUTBOX_RETENTION_DAYS", 30)
+
+# Рассылка админа (/broadcast): параллельных отправок, получателей между контрольными
+# точками и интервал обновления прогресса (сек); общий лимит - SEND_GLOBAL_RATE
+BROADCAST_PATH = os.getenv("BROADCAST_PATH", os.path.join(DATA_DIR, "broadcast.sqlite3"))
+BROADCAST_CONCURRENCY = _get_int("BROADCAST_CONCURRENCY", 25)
+BROADCAST_CHUNK_SIZE = _get_int("BROADCAST_CHUNK_SIZE", 200)
+BROADCAST_PROGRESS_INTERVAL = _get_float("BROADCAST_PROGRESS_INTERVAL", 5.0)
+
+# Защита от флуда: обновлений в секунду и подряд на пользователя по типам обновлений,
+# предел отслеживаемых пользователей на тип (админ не ограничивается)
+THROTTLE_ENABLED = _get_bool("THROTTLE_ENABLED", True)
+THROTTLE_MESSAGE_RATE = _get_float("THROTTLE_MESSAGE_RATE", 1.0)
+THROTTLE_MESSAGE_BURST = _get_float("THROTTLE_MESSAGE_BURST", 10)
+THROTTLE_CALLBACK_RATE = _get_float("THROTTLE_CALLBACK_RATE", 2.0)
+THROTTLE_CALLBACK_BURST = _get_float("THROTTLE_CALLBACK_BURST", 10)
+THROTTLE_INLINE_RATE = _get_float("THROTTLE_INLINE_RATE", 4.0)
+THROTTLE_INLINE_BURST = _get_float("THROTTLE_INLINE_BURST", 20)
+THROTTLE_MAX_USERS = _get_int("THROTTLE_MAX_USERS", 50000)
+
+# Полосы обработки обновлений: одновременно обрабатываемых и ожидающих обновлений в каждой;
+# при переполнении inline-полосы отбрасывается самый давний запрос, в остальных - новое обновление
+LANES_ENABLED = _get_bool("LANES_ENABLED", True)
+LANE_INLINE_CONCURRENCY = _get_int("LANE_INLINE_CONCURRENCY", 16)
+LANE_INLINE_QUEUE = _get_int("LANE_INLINE_QUEUE", 200)
+LANE_CONVERSATION_CONCURRENCY = _get_int("LANE_CONVERSATION_CONCURRENCY", 64)
+LANE_CONVERSATION_QUEUE = _get_int("LANE_CONVERSATION_QUEUE", 2000)
+LANE_ADMIN_CONCURRENCY = _get_int("LANE_ADMIN_CONCURRENCY", 8)
+LANE_ADMIN_QUEUE = _get_int("LANE_ADMIN_QUEUE", 500)
+LANE_GROUP_CONCURRENCY = _get_int("LANE_GROUP_CONCURRENCY", 16)
+LANE_GROUP_QUEUE = _get_int("LANE_GROUP_QUEUE", 500)
+
+# Реалистичный путь (метод Монте-Карло): число моделируемых путей, предел матчей и размер кэша
+MONTECARLO_ENABLED = _get_bool("MONTECARLO_ENABLED", True)
+MONTECARLO_PATHS = _get_int("MONTECARLO_PATHS", 100000)
+MONTECARLO_MAX_GAMES = _get_int("MONTECARLO_MAX_GAMES", 3000)
+MONTECARLO_CACHE_SIZE = _get_int("MONTECARLO_CACHE_SIZE", 1024)
+# Шаг кнопок изменения шанса победы (%)
+MONTECARLO_WIN_RATE_STEP = _get_float("MONTECARLO_WIN_RATE_STEP", 1.0)
@@ -0,0 +1,231 @@
+"""
+Статистика аккаунта по героям (/heroes): общий винрейт по всем героям и план,
+на каких героях набрать победы, чтобы поднять винрейт аккаунта до цели.
+"""
+import heapq
+import html
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from batch import parse_matches, split_fields
+
+# Предел героев в одном списке (в MLBB их больше 120)
+MAX_HEROES = 300
+
+
+class PlanStep(NamedTuple):
+    name: str
+    wins: int
+    matches: int
+    current_wr: float
+    new_wr: float
+    reached: bool
+
+
+class Plan(NamedTuple):
+    target: float
+    wins_needed: int
+    steps: List[PlanStep]
+    below_target: int
+    lifted: int
+
+
+def _number(value: str) -> float:
+    return float(value.strip().replace(',', '.').rstrip('%'))
+
+
+def _wins_to_target(matches: int, wins: int, target: float) -> int:
+    # Побед подряд, после которых wins / matches >= target (в целых числах побед)
+    needed = (target * matches - 100 * wins) / (100 - target)
+    return max(0, math.ceil(needed - 1e-9))
+
+
+def parse_heroes(text: str) -> Tuple[List[Tuple[str, int, float]], List[str], List[str]]:
+    """
+    Разбор строк ``герой матчи WR`` (поля и число матчей разбираются так же,
+    как в /batch: ``batch.split_fields``, ``batch.parse_matches``). Строка
+    ``-герой`` удаляет героя из списка. Возвращает (герои, удаляемые, ошибочные строки).
+    """
+    heroes, removed, errors = [], [], []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('-') and not line[1:].strip()[:1].isdigit():
+            removed.append(line[1:].strip())
+            continue
+        fields = split_fields(line)
+        try:
+            if len(fields) < 3:
+                raise ValueError
+            matches = parse_matches(fields[-2])
+            current_wr = _number(fields[-1])
+            if matches <= 0 or not 0 <= current_wr <= 100:
+                raise ValueError
+        except ValueError:
+            errors.append(line)
+            continue
+        heroes.append((" ".join(fields[:-2]), matches, current_wr))
+    return heroes, removed, errors
+
+
+class HeroPool:
+    """
+    Герои игрока с общими суммами матчей и побед. Суммы и стоимость каждого
+    героя (побед до цели) обновляются при каждом добавлении, поэтому
+    пересчёт плана не проходит заново по всем героям.
+    """
+
+    def __init__(self, target: Optional[float] = None):
+        self.heroes: Dict[str, Tuple[str, int, int]] = {}
+        self.total_matches = 0
+        self.total_wins = 0
+        self.target = target
+        # Побед до цели для героев ниже цели (ключ - имя героя в нижнем регистре)
+        self._costs: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.heroes)
+
+    @property
+    def winrate(self) -> Optional[float]:
+        if not self.total_matches:
+            return None
+        return self.total_wins / self.total_matches * 100
+
+    def add(self, name: str, matches: int, current_wr: float) -> bool:
+        """Добавление или обновление героя; False, если это новый герой сверх MAX_HEROES"""
+        key = name.casefold()
+        if key not in self.heroes and len(self.heroes) >= MAX_HEROES:
+            return False
+        self.remove(key)
+        wins = round(matches * current_wr / 100)
+        self.heroes[key] = (name, matches, wins)
+        self.total_matches += matches
+        self.total_wins += wins
+        if self.target is not None:
+            cost = _wins_to_target(matches, wins, self.target)
+            if cost:
+                self._costs[key] = cost
+        return True
+
+    def remove(self, name: str) -> bool:
+        key = name.casefold()
+        hero = self.heroes.pop(key, None)
+        if hero is None:
+            return False
+        self.total_matches -= hero[1]
+        self.total_wins -= hero[2]
+        self._costs.pop(key, None)
+        return True
+
+    def set_target(self, target: float) -> None:
+        if target == self.target:
+            return
+        self.target = target
+        self._costs = {}
+        for key, (_, matches, wins) in self.heroes.items():
+            cost = _wins_to_target(matches, wins, target)
+            if cost:
+                self._costs[key] = cost
+
+    def plan(self) -> Optional[Plan]:
+        """
+        Минимум побед подряд для цели аккаунта и их распределение по героям.
+
+        Любая победа поднимает винрейт аккаунта одинаково, поэтому число побед
+        не зависит от героев. Распределяются они жадно через кучу: сначала
+        герои, которым до цели нужно меньше всего побед - так до цели
+        дотягивается наибольшее число героев. Остаток достаётся следующему
+        по очереди герою, а если все уже на цели - герою с лучшим винрейтом.
+        """
+        if self.target is None or not self.heroes:
+            return None
+        budget = _wins_to_target(self.total_matches, self.total_wins, self.target)
+        plan = Plan(self.target, budget, [], len(self._costs), 0)
+        if not budget:
+            return plan
+
+        queue = [(cost, key) for key, cost in self._costs.items()]
+        heapq.heapify(queue)
+        lifted = 0
+        while budget:
+            if queue:
+                cost, key = heapq.heappop(queue)
+                wins = min(cost, budget)
+                lifted += wins == cost
+            else:
+                key = max(self.heroes, key=lambda k: (self.heroes[k][2] / self.heroes[k][1], self.heroes[k][1]))
+                wins = budget
+            budget -= wins
+            name, matches, hero_wins = self.heroes[key]
+            plan.steps.append(PlanStep(
+                name, wins, matches,
+                hero_wins / matches * 100,
+                (hero_wins + wins) / (matches + wins) * 100,
+                (hero_wins + wins) * 100 >= self.target * (matches + wins),
+            ))
+        return plan._replace(lifted=lifted)
+
+    def to_data(self) -> dict:
+        """Данные для хранилища состояний FSM (только JSON-типы)"""
+        return {'heroes': list(self.heroes.values()), 'target': self.target}
+
+    @classmethod
+    def from_data(cls, data: dict) -> 'HeroPool':
+        pool = cls()
+        for name, matches, wins in data.get('heroes', ()):
+            key = name.casefold()
+            pool.heroes[key] = (name, matches, wins)
+            pool.total_matches += matches
+            pool.total_wins += wins
+        if data.get('target') is not None:
+            pool.set_target(data['target'])
+        return pool
+
+
+def _escape(value: str) -> str:
+    return html.escape(value, quote=False)
+
+
+def format_pool(pool: HeroPool, limit: int = 20) -> str:
+    """Сводка по аккаунту, самые сыгранные герои и план до цели (HTML)"""
+    if not pool.heroes:
+        return (
+            "🦸 <b>ГЕРОИ АККАУНТА</b>\n\n"
+            "Список пуст. Пришли героев - по одному в строке:\n"
+            "<code>герой матчи WR</code>"
+        )
+
+    heroes = heapq.nlargest(limit, pool.heroes.values(), key=lambda hero: hero[1])
+    lines = [f"{'Герой':<12} {'Матчи':>6} {'WR':>6}"]
+    for name, matches, wins in heroes:
+        lines.append(f"{name[:12]:<12} {matches:>6} {wins / matches * 100:>6.1f}")
+    if len(pool) > limit:
+        lines.append(f"... и ещё {len(pool) - limit}")
+    text = (
+        "🦸 <b>ГЕРОИ АККАУНТА</b>\n\n"
+        f"<pre>{_escape(chr(10).join(lines))}</pre>\n\n"
+        f"👥 Героев: <b>{len(pool)}</b>\n"
+        f"🎮 Матчей: <b>{pool.total_matches}</b>, побед: <b>{pool.total_wins}</b>\n"
+        f"📊 Винрейт аккаунта: <b>{pool.winrate:.2f}%</b>"
+    )
+
+    plan = pool.plan()
+    if plan is None:
+        return text + "\n\n🎯 Пришли <b>желаемый винрейт</b> аккаунта числом, чтобы получить план."
+    if not plan.wins_needed:
+        return text + f"\n\n✅ Винрейт аккаунта уже не ниже цели <b>{plan.target:g}%</b>."
+
+    lines = [f"{'Герой':<12} {'Побед':>6} {'WR':>6} {'Станет':>7}"]
+    for step in plan.steps[:limit]:
+        mark = "✓" if step.reached else " "
+        lines.append(f"{step.name[:12]:<12} {step.wins:>6} {step.current_wr:>6.1f} {step.new_wr:>6.1f}{mark}")
+    if len(plan.steps) > limit:
+        lines.append(f"... и ещё {len(plan.steps) - limit}")
+    return text + (
+        f"\n\n🎯 <b>ПЛАН ДО {plan.target:g}%</b>\n"
+        f"🏆 Побед подряд: <b>{plan.wins_needed}</b>\n"
+        f"<pre>{_escape(chr(10).join(lines))}</pre>\n"
+        f"✓ - герой тоже дойдёт до цели: <b>{plan.lifted}</b> из {plan.below_target} ниже цели"
+    )
@@ -0,0 +1,145 @@
+"""История расчётов пользователей: SQLite (WAL), только добавление, пакетная запись в фоне"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+SOURCE_PRIVATE = "private"
+SOURCE_INLINE = "inline"
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+class HistoryEntry(NamedTuple):
+    id: int
+    created_at: float
+    source: str
+    total_matches: int
+    current_wr: float
+    desired_wr: float
+    wins_needed: int
+
+
+class HistoryStore:
+    """
+    Журнал завершённых расчётов.
+
+    ``add()`` только кладёт запись в очередь процесса и сразу возвращает
+    управление; фоновый писатель записывает накопленное одной транзакцией раз
+    в ``flush_interval`` секунд (или сразу, когда набралось ``flush_batch``
+    записей). Чтение идёт по индексу ``(user_id, id)`` с keyset-пагинацией,
+    поэтому время ответа не зависит от размера таблицы.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, flush_batch: int = 500):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Все обращения к соединению идут из одного потока
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-sqlite")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, created_at REAL NOT NULL, "
+            "source TEXT NOT NULL, total_matches INTEGER NOT NULL, current_wr REAL NOT NULL, "
+            "desired_wr REAL NOT NULL, wins_needed INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_user_id ON history (user_id, id)")
+        self._conn.commit()
+        self._pending: List[Tuple] = []
+        self._writer: Optional[asyncio.Task] = None
+        self._batch_full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def add(self, user_id: int, source: str, total_matches: int, current_wr: float,
+            desired_wr: float, wins_needed: int) -> None:
+        """Добавление записи (без ожидания записи на диск)"""
+        self._pending.append(
+            (user_id, time.time(), source, total_matches, current_wr, desired_wr, wins_needed)
+        )
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+        if len(self._pending) >= self.flush_batch:
+            self._batch_full.set()
+
+    async def _write_loop(self) -> None:
+        """Фоновый писатель: раз в flush_interval или по заполнении пачки"""
+        while True:
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Ошибка записи истории расчётов: %s", e)
+
+    def _insert_many_sync(self, rows: Sequence[Tuple]) -> None:
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO history (user_id, created_at, source, total_matches, current_wr, "
+                "desired_wr, wins_needed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    async def flush(self) -> None:
+        """Запись всех накопленных записей"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            rows, self._pending = self._pending, []
+            try:
+                await self._run(self._insert_many_sync, rows)
+            except Exception:
+                self._pending[:0] = rows
+                raise
+
+    def _page_sync(self, user_id: int, before_id: Optional[int], limit: int) -> List[HistoryEntry]:
+        columns = "id, created_at, source, total_matches, current_wr, desired_wr, wins_needed"
+        if before_id is None:
+            cursor = self._conn.execute(
+                f"SELECT {columns} FROM history WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, limit)
+            )
+        else:
+            cursor = self._conn.execute(
+                f"SELECT {columns} FROM history WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (user_id, before_id, limit)
+            )
+        return [HistoryEntry(*row) for row in cursor.fetchall()]
+
+    async def page(self, user_id: int, before_id: Optional[int] = None, limit: int = 10) -> List[HistoryEntry]:
+        """Записи пользователя от новых к старым, начиная с id меньше ``before_id``"""
+        await self.flush()
+        return await self._run(self._page_sync, user_id, before_id, limit)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        await self.flush()
+        await self._run(self._conn.close)
+        self._executor.shutdown()
+
+
+def sparkline(values: Sequence[float]) -> str:
+    """Текстовый график: ``▁▃▅█``"""
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_CHARS[len(SPARK_CHARS) // 2] * len(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return "".join(SPARK_CHARS[int((value - low) * scale)] for value in values)
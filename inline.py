@@ -0,0 +1,266 @@
+"""Формирование ответов на inline-запросы с кэшированием на стороне Telegram"""
+import asyncio
+import functools
+import hashlib
+import math
+from typing import Any, Awaitable, Dict, List, NamedTuple, Optional
+
+from aiogram.methods import AnswerInlineQuery
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+
+import config
+from batch import MAX_MATCHES
+
+THUMB_URL = "https://i.imgur.com/7XhGpwU.png"
+
+# Классы inline-результатов
+RESULT_HELP = "help"
+RESULT_HINT = "hint"
+RESULT_ERROR = "error"
+RESULT_COMPUTED = "computed"
+RESULT_MONTECARLO = "montecarlo"
+
+# Ни один из результатов не зависит от пользователя, поэтому Telegram может
+# отдавать закэшированный ответ всем, кто набрал такой же запрос
+CACHE_TIMES = {
+    RESULT_HELP: config.INLINE_CACHE_TIME_HELP,
+    RESULT_HINT: config.INLINE_CACHE_TIME_HELP,
+    RESULT_ERROR: config.INLINE_CACHE_TIME_ERROR,
+    RESULT_COMPUTED: config.INLINE_CACHE_TIME_COMPUTED,
+    RESULT_MONTECARLO: config.INLINE_CACHE_TIME_COMPUTED,
+}
+
+# Количество отправленных ответов по классам
+inline_stats = {kind: 0 for kind in CACHE_TIMES}
+
+
+class InlineAnswer(NamedTuple):
+    results: List[InlineQueryResultArticle]
+    cache_time: int
+    is_personal: bool
+
+
+def normalize_query(query: str) -> str:
+    """Приведение запроса к каноническому виду: '150  52,5 60 ' -> '150 52.5 60'"""
+    return " ".join(query.replace(',', '.').split())
+
+
+def parse_query(normalized_query: str) -> tuple:
+    """
+    Разбор запроса 'матчи текущий_WR желаемый_WR [шанс_победы]', ValueError
+    при неверном формате. Шанс победы в матче (%) - None, если не указан.
+    """
+    parts = normalized_query.split()
+    if len(parts) not in (3, 4):
+        raise ValueError("Нужно 3 или 4 числа")
+    win_rate = float(parts[3]) if len(parts) == 4 else None
+    if win_rate is not None and not 0 <= win_rate <= 100:
+        raise ValueError("Шанс победы должен быть от 0 до 100%")
+    matches, current_wr, desired_wr = int(parts[0]), float(parts[1]), float(parts[2])
+    if not (math.isfinite(current_wr) and math.isfinite(desired_wr)):
+        raise ValueError("Винрейт должен быть числом")
+    if abs(matches) > MAX_MATCHES:
+        raise ValueError("Слишком много матчей")
+    return matches, current_wr, desired_wr, win_rate
+
+
+def partial_stage(normalized_query: str) -> int:
+    """
+    Сколько чисел уже введено в недописанном запросе ("150" - 1, "150 52.5" - 2);
+    0, если запрос не похож на начало правильного.
+    """
+    parts = normalized_query.split()
+    if not 0 < len(parts) < 3:
+        return 0
+    try:
+        for part in parts:
+            float(part)
+    except ValueError:
+        return 0
+    return len(parts)
+
+
+def make_result_id(kind: str, normalized_query: str) -> str:
+    """Детерминированный id результата (не длиннее 64 байт)"""
+    digest = hashlib.sha1(f"{kind}:{normalized_query}".encode()).hexdigest()
+    return f"{kind}:{digest[:32]}"
+
+
+def _build_answer(kind: str, normalized_query: str, title: str, description: str, text: str) -> InlineAnswer:
+    result = InlineQueryResultArticle(
+        id=make_result_id(kind, normalized_query),
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(
+            message_text=text,
+            parse_mode="HTML"
+        ),
+        thumb_url=THUMB_URL
+    )
+    return InlineAnswer([result], CACHE_TIMES[kind], False)
+
+
+def _help_text(bot_username: str) -> str:
+    return (
+        "🎮 <b>MLBB Winrate Calculator</b>\n\n"
+        "💡 <b>Как использовать:</b>\n"
+        f"Напишите: <code>@{bot_username} 100 55 60</code>\n\n"
+        "Формат: <b>матчи текущий_WR желаемый_WR</b>\n"
+        "Пример: 100 55 60\n\n"
+        "🎲 Четвёртое число - шанс победы в матче для реалистичного пути: 100 55 60 58"
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def help_answer(bot_username: str) -> InlineAnswer:
+    """Подсказка для пустого запроса (одна и та же для всех, собирается один раз)"""
+    return _build_answer(
+        RESULT_HELP,
+        "",
+        title="📊 MLBB Winrate Calculator",
+        description="Введите: матчи текущий_WR желаемый_WR (пример: 100 55 60)",
+        text=_help_text(bot_username)
+    )
+
+
+# Что вводить дальше при недописанном запросе - по числу уже введённых чисел
+HINT_TITLES = {
+    1: "✍️ Дальше - текущий винрейт",
+    2: "✍️ Дальше - желаемый винрейт",
+}
+
+
+@functools.lru_cache(maxsize=16)
+def _hint_answer(stage: int, bot_username: str) -> InlineAnswer:
+    return _build_answer(
+        RESULT_HINT,
+        str(stage),
+        title=HINT_TITLES[stage],
+        description="Формат: матчи текущий_WR желаемый_WR (пример: 100 55 60)",
+        text=_help_text(bot_username)
+    )
+
+
+def hint_answer(normalized_query: str, bot_username: str) -> InlineAnswer:
+    """
+    Готовый ответ на запрос, который не удалось разобрать: подсказка для
+    недописанного ("150", "150 52") или карточка с правильным форматом.
+    """
+    stage = partial_stage(normalized_query)
+    if stage:
+        return _hint_answer(stage, bot_username)
+    return error_answer(bot_username)
+
+
+@functools.lru_cache(maxsize=4)
+def error_answer(bot_username: str) -> InlineAnswer:
+    """Карточка с описанием правильного формата запроса (одна для всех запросов)"""
+    return _build_answer(
+        RESULT_ERROR,
+        "",
+        title="❌ Неверный формат",
+        description="Используйте: матчи текущий_WR желаемый_WR (пример: 100 55 60)",
+        text=(
+            "❌ <b>Неверный формат данных</b>\n\n"
+            "💡 <b>Правильный формат:</b>\n"
+            f"<code>@{bot_username} матчи текущий_WR желаемый_WR</code>\n\n"
+            "<b>Пример:</b>\n"
+            f"<code>@{bot_username} 100 55 60</code>\n\n"
+            "Где:\n"
+            "• <b>100</b> - количество сыгранных матчей\n"
+            "• <b>55</b> - текущий винрейт в %\n"
+            "• <b>60</b> - желаемый винрейт в %\n"
+            "• <i>(необязательно)</i> шанс победы в матче в % - для реалистичного пути"
+        )
+    )
+
+
+def prepare_answers(bot_username: str) -> None:
+    """Сборка готовых ответов заранее (при запуске бота)"""
+    help_answer(bot_username)
+    error_answer(bot_username)
+    for stage in HINT_TITLES:
+        _hint_answer(stage, bot_username)
+
+
+def computed_answer(normalized_query: str, title: str, description: str, text: str) -> InlineAnswer:
+    """Результат расчёта (или ошибка в данных) для конкретного запроса"""
+    return _build_answer(RESULT_COMPUTED, normalized_query, title, description, text)
+
+
+def montecarlo_answer(normalized_query: str, title: str, description: str, text: str) -> InlineAnswer:
+    """Распределение числа матчей до цели (реалистичный путь)"""
+    return _build_answer(RESULT_MONTECARLO, normalized_query, title, description, text)
+
+
+def combine_answers(*answers: InlineAnswer) -> InlineAnswer:
+    """Несколько карточек в одном ответе (кэшируется на меньшее из времён)"""
+    return InlineAnswer(
+        [result for answer in answers for result in answer.results],
+        min(answer.cache_time for answer in answers),
+        any(answer.is_personal for answer in answers)
+    )
+
+
+def answer_method(inline_query: InlineQuery, answer: InlineAnswer) -> AnswerInlineQuery:
+    """
+    Метод ответа с параметрами кэширования его класса.
+    Возвращается без await, чтобы в режиме webhook уйти в теле ответа.
+    """
+    kind = answer.results[0].id.split(":", 1)[0]
+    inline_stats[kind] += 1
+    return inline_query.answer(
+        answer.results,
+        cache_time=answer.cache_time,
+        is_personal=answer.is_personal
+    )
+
+
+class InlineCoalescer:
+    """
+    Пока пользователь печатает "150 52.5 60", Telegram присылает запрос на
+    каждый префикс. Обработка, запущенная через ``run()``, отменяется, как только
+    от того же пользователя приходит более новый запрос, а результат,
+    готовый уже после нового запроса, не отправляется.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self.started = 0
+        self.superseded = 0
+        self.stale = 0
+
+    async def run(self, user_id: int, work: Awaitable[Any]) -> Optional[Any]:
+        """Результат ``work`` или None, если его вытеснил более новый запрос пользователя"""
+        previous = self._tasks.get(user_id)
+        if previous is not None and not previous.done():
+            previous.cancel()
+            self.superseded += 1
+        task = asyncio.ensure_future(work)
+        self._tasks[user_id] = task
+        self.started += 1
+        try:
+            # wait() не пробрасывает отмену задачи - её отменил новый запрос
+            await asyncio.wait((task,))
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            latest = self._tasks.get(user_id) is task
+            if latest:
+                del self._tasks[user_id]
+        if not latest:
+            # Пока шла обработка, пользователь набрал новый запрос
+            if not task.cancelled():
+                self.stale += 1
+                task.exception()
+            return None
+        return task.result()
+
+    def stats(self) -> dict:
+        return {
+            'started': self.started,
+            'superseded': self.superseded,
+            'stale': self.stale,
+            'inflight': len(self._tasks),
+        }
@@ -0,0 +1,139 @@
+"""
+Очереди обработки обновлений: inline-запросы, шаги диалогов, админ и группы
+обрабатываются в отдельных полосах со своим пределом параллельности, чтобы
+всплеск одного типа не задерживал остальные.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+LANE_INLINE = "inline"
+LANE_CONVERSATION = "conversation"
+LANE_ADMIN = "admin"
+LANE_GROUP = "group"
+
+
+class Lane:
+    """
+    Не больше ``limit`` обновлений одновременно и ``max_queue`` в ожидании.
+    При полной очереди ``shed_oldest`` отбрасывает самое давнее ожидающее
+    обновление (устаревший inline-запрос), иначе отбрасывается новое.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, shed_oldest: bool = False):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.shed_oldest = shed_oldest
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._waits = deque(maxlen=1000)
+        self.processed = 0
+        self.shed = 0
+
+    async def acquire(self) -> bool:
+        """True - слот получен (освободить через release), False - обновление отброшено"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            # При max_queue=0 очередь пуста - отбрасывать, кроме нового, нечего
+            if not self.shed_oldest or not self._waiters:
+                return False
+            oldest = self._waiters.popleft()
+            if not oldest.done():
+                oldest.set_result(False)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                # Слот уже передан этому обновлению - отдаём следующему
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        # Слот передаётся первому ожидающему, не освобождаясь
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def record(self, waited: float) -> None:
+        self.processed += 1
+        self._waits.append(waited)
+
+    def stats(self) -> Dict[str, float]:
+        waits = sorted(self._waits)
+        return {
+            'active': self.active,
+            'depth': len(self._waiters),
+            'processed': self.processed,
+            'shed': self.shed,
+            'wait_p50': waits[len(waits) // 2] if waits else 0.0,
+            'wait_p95': waits[int(len(waits) * 0.95)] if waits else 0.0,
+        }
+
+
+class UpdateScheduler(BaseMiddleware):
+    """
+    Внешний middleware dp.update между получением обновления и обработчиками.
+    Каждое обновление (при polling и в воркерах - в своей задаче) ждёт слот
+    в своей полосе; отброшенное при перегрузке обновление не обрабатывается.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[int, int]], admin_id: int = 0):
+        self.lanes = {
+            name: Lane(name, limit, max_queue, shed_oldest=name == LANE_INLINE)
+            for name, (limit, max_queue) in limits.items()
+        }
+        self.admin_id = admin_id
+
+    def lane_for(self, event: Update, data: Dict[str, Any]) -> str:
+        if event.inline_query is not None or event.chosen_inline_result is not None:
+            return LANE_INLINE
+        user = data.get("event_from_user")
+        if user is not None and user.id == self.admin_id:
+            return LANE_ADMIN
+        chat = data.get("event_chat")
+        if chat is not None and chat.type != "private":
+            return LANE_GROUP
+        return LANE_CONVERSATION
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        lane = self.lanes.get(self.lane_for(event, data))
+        if lane is None:
+            return await handler(event, data)
+
+        started = time.monotonic()
+        if not await lane.acquire():
+            return None
+        lane.record(time.monotonic() - started)
+        try:
+            return await handler(event, data)
+        finally:
+            lane.release()
+
+    def stats(self) -> Dict[Tuple[str, str], float]:
+        """Глубина очередей, отброшенные обновления и ожидание по полосам для /metrics"""
+        return {
+            (name, key): value
+            for name, lane in self.lanes.items()
+            for key, value in lane.stats().items()
+        }
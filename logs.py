@@ -0,0 +1,158 @@
+"""
+Логирование без блокировки цикла событий: обработчики только кладут записи в
+очередь, а форматирование и запись выполняет фоновый поток (QueueListener).
+Строки - JSON с update_id обновления; частые события прореживаются.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# update_id обрабатываемого обновления (у каждого обновления своя задача asyncio)
+current_update_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("update_id", default=None)
+
+# Стандартные атрибуты LogRecord; остальные (переданные через extra=) попадают в JSON
+_RECORD_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    """Разбор строки ``событие=доля,логгер=доля`` (доля от 0 до 1)"""
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class LogFilter(logging.Filter):
+    """
+    Выполняется в потоке, который пишет в лог: запоминает update_id текущего
+    обновления и прореживает записи. Правило выбирается по полю ``event``
+    (extra={"event": ...}), а без него - по имени логгера. Предупреждения и
+    ошибки не прореживаются. Решение зависит только от update_id, поэтому
+    строки одного обновления сохраняются или отбрасываются вместе.
+    """
+
+    def __init__(self, sampling: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.sampling = sampling or {}
+        self.passed = 0
+        self.dropped: Dict[str, int] = {name: 0 for name in self.sampling}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        update_id = current_update_id.get()
+        record.update_id = update_id
+        if record.levelno < logging.WARNING and self.sampling:
+            rule = getattr(record, "event", None)
+            if rule not in self.sampling:
+                rule = record.name
+            rate = self.sampling.get(rule)
+            if rate is not None and rate < 1:
+                if update_id is not None:
+                    keep = (update_id * 2654435761) % 2 ** 32 < rate * 2 ** 32
+                else:
+                    keep = random.random() < rate
+                if not keep:
+                    self.dropped[rule] += 1
+                    return False
+        self.passed += 1
+        return True
+
+    def stats(self) -> dict:
+        return {'written': self.passed, **{f'sampled_out_{name}': count for name, count in self.dropped.items()}}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON; поля из extra= добавляются как есть"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.processName != "MainProcess":
+            entry['process'] = record.processName
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler, который не форматирует запись в вызывающем потоке:
+    стандартный prepare() собирает сообщение и трассировку ещё до очереди.
+    Очередь - в этом же процессе, поэтому запись передаётся как есть
+    (аргументы сообщения не должны меняться после вызова логгера).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class UpdateContextMiddleware(BaseMiddleware):
+    """
+    Внешний middleware dp.update: update_id обновления для всех строк лога,
+    записанных при его обработке. Значение не сбрасывается: у каждого
+    обновления своя задача, а строку «Update id=... is handled» aiogram пишет
+    уже после middleware.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        current_update_id.set(event.update_id)
+        return await handler(event, data)
+
+
+_filter: Optional[LogFilter] = None
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", sampling: Optional[Dict[str, float]] = None,
+                  path: str = "", text_format: str = TEXT_FORMAT) -> LogFilter:
+    """
+    Корневой логгер пишет через очередь в фоновый поток (stderr или файл
+    ``path``). Повторный вызов ничего не меняет. Возвращает фильтр со статистикой.
+    """
+    global _filter
+    if _filter is not None:
+        return _filter
+
+    output = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(text_format))
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, output)
+    handler = LazyQueueHandler(records)
+    _filter = LogFilter(sampling)
+    handler.addFilter(_filter)
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    listener.start()
+    # При выходе дописать всё, что осталось в очереди
+    atexit.register(listener.stop)
+    return _filter
@@ -0,0 +1,255 @@
+"""Метрики в формате Prometheus: обработчики, обновления, сессии FSM и запросы к Bot API"""
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter as _Counter
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    async def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: Any, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    async def collect(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                for labels, value in self._values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args: Any, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам..., +Inf], сумма
+        self._counts: Dict[Tuple, List[int]] = {}
+        self._sums: Dict[Tuple, float] = {}
+
+    def observe(self, value: float, *labels: Any) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    async def collect(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {self._sums[labels]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge(Metric):
+    """Значение считается при каждом запросе метрик функцией ``callback``"""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Any]):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    async def collect(self) -> List[str]:
+        values = self.callback()
+        if inspect.isawaitable(values):
+            values = await values
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.labelnames, labels if isinstance(labels, tuple) else (labels,))} {value}"
+                for labels, value in values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    async def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                samples = await metric.collect()
+            except Exception as e:
+                logger.warning("Не удалось собрать метрику %s: %s", metric.name, e)
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+UPDATES = registry.register(Counter(
+    "bot_updates_total", "Полученные обновления по типам", ["type"]))
+HANDLER_LATENCY = registry.register(Histogram(
+    "bot_handler_duration_seconds", "Время работы обработчика", ["handler"]))
+HANDLER_ERRORS = registry.register(Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ["handler", "error"]))
+API_LATENCY = registry.register(Histogram(
+    "bot_api_request_duration_seconds", "Время запроса к Bot API", ["method"]))
+API_ERRORS = registry.register(Counter(
+    "bot_api_errors_total", "Ошибки запросов к Bot API", ["method", "error"]))
+
+
+def register_stats(name: str, documentation: str, stats: Callable[[], Dict[str, float]]) -> None:
+    """Экспорт словаря со счётчиками (например, LRUCache.stats()) как gauge с меткой ``key``"""
+    registry.register(Gauge(
+        name, documentation, ["key"],
+        lambda: {key: value for key, value in stats().items() if isinstance(value, (int, float))}
+    ))
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware dp.update: счётчик обновлений по типам"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        UPDATES.inc(event.event_type)
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware: время работы и ошибки каждого обработчика"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки запросов к Bot API по методам"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - started, name)
+
+
+async def count_fsm_states(storage: BaseStorage) -> Dict[str, int]:
+    """Количество активных сессий FSM по состояниям"""
+    if isinstance(storage, MemoryStorage):
+        return dict(_Counter(record.state for record in storage.storage.values() if record.state))
+    count_states = getattr(storage, "count_states", None)
+    if count_states is None:
+        return None
+    return await count_states()
+
+
+def setup_metrics(dp: Dispatcher, bot: Bot) -> None:
+    """Подключение middleware метрик к диспетчеру и сессии бота"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_middleware = HandlerMetricsMiddleware()
+    for name, observer in dp.observers.items():
+        if name not in ("update", "error"):
+            observer.middleware(handler_middleware)
+    bot.session.middleware(ApiMetricsMiddleware())
+    registry.register(Gauge(
+        "bot_fsm_sessions", "Активные сессии FSM по состояниям", ["state"],
+        lambda: count_fsm_states(dp.storage)
+    ))
+
+
+async def metrics_handler(request: "web.Request") -> "web.Response":
+    from aiohttp import web
+
+    return web.Response(text=await registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> "web.AppRunner":
+    """Запуск HTTP-сервера с метриками (GET /metrics)"""
+    # aiohttp.web нужен только здесь - не импортируем его при запуске бота заранее
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
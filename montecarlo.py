@@ -0,0 +1,222 @@
+"""
+Реалистичный путь к цели (метод Монте-Карло): игрок выигрывает каждый матч с
+вероятностью ``win_rate``, а не идёт серией побед подряд. Результат -
+распределение числа матчей до желаемого винрейта.
+"""
+import asyncio
+import hashlib
+import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import batch
+from cache import LRUCache
+
+# Контрольные точки "шанс дойти за K матчей"
+CHECKPOINTS = (50, 100, 200, 500, 1000, 2000, 3000, 5000)
+
+Key = Tuple[int, float, float, float]
+
+
+class Simulation(NamedTuple):
+    total_matches: int
+    current_wr: float
+    desired_wr: float
+    win_rate: float
+    paths: int
+    horizon: int
+    median: Optional[int]
+    p90: Optional[int]
+    reached: float
+    within: Tuple[Tuple[int, float], ...]
+
+
+def quantize(total_matches: int, current_wr: float, desired_wr: float, win_rate: float) -> Key:
+    """
+    Ключ кэша: винрейты округляются до 0.1%, шанс победы - до 0.5%, число
+    матчей больше 1000 - до трёх значащих цифр. Моделирование идёт по
+    округлённым значениям (одинаковый ключ - одинаковое распределение), а
+    показываются всегда данные, введённые пользователем. Если после
+    округления текущий винрейт догнал бы цель, винрейты не округляются.
+    """
+    if total_matches > 1000:
+        scale = 10 ** (len(str(total_matches)) - 3)
+        total_matches = int(round(total_matches / scale) * scale)
+    if round(current_wr, 1) < round(desired_wr, 1):
+        current_wr, desired_wr = round(current_wr, 1), round(desired_wr, 1)
+    return (
+        total_matches,
+        current_wr,
+        desired_wr,
+        round(win_rate * 2) / 2,
+    )
+
+
+def _thresholds(total_matches: int, current_wr: float, desired_wr: float, horizon: int) -> List[int]:
+    # thresholds[k] - сколько побед нужно за k следующих матчей, чтобы винрейт
+    # стал не ниже цели (как в calculate_wins_needed: текущие победы не округляются)
+    wins = total_matches * current_wr / 100
+    target = desired_wr / 100
+    return [math.ceil(target * (total_matches + k) - wins - 1e-9) for k in range(horizon + 1)]
+
+
+def _simulate_numpy(np, thresholds: List[int], p: float, paths: int, horizon: int, seed: int) -> List[int]:
+    """
+    Все пути с одинаковым числом побед неразличимы, поэтому моделируются не
+    пути по отдельности, а их количества по числу побед: за матч каждая группа
+    из c путей делится на Binomial(c, p) победивших и проигравших. Это то же
+    распределение, что у c независимых путей, а цена матча - один векторный
+    вызов по занятым состояниям, сколько бы путей ни было.
+    """
+    rng = np.random.default_rng(seed)
+    counts = np.zeros(horizon + 2, dtype=np.int64)
+    counts[0] = paths
+    finished = [0] * (horizon + 1)
+    low = high = 0
+    last = thresholds[horizon]
+    for k in range(1, horizon + 1):
+        group = counts[low:high + 1]
+        winners = rng.binomial(group, p)
+        group -= winners
+        counts[low + 1:high + 2] += winners
+        high += 1
+        # Дошедшие до цели за k-й матч
+        threshold = thresholds[k]
+        if high >= threshold:
+            start = max(threshold, low)
+            finished[k] = int(counts[start:high + 1].sum())
+            counts[start:high + 1] = 0
+            high = threshold - 1
+        # Пути, которые не успеют к цели даже серией побед до конца горизонта
+        hopeless = last - (horizon - k)
+        if hopeless > low:
+            counts[low:min(hopeless, high + 1)] = 0
+            low = hopeless
+        while low <= high and counts[low] == 0:
+            low += 1
+        if low > high:
+            break
+    return finished
+
+
+def _binomial(rng: random.Random, n: int, p: float) -> int:
+    if n <= 32:
+        return sum(rng.random() < p for _ in range(n))
+    # Для больших групп - нормальное приближение
+    value = round(rng.gauss(n * p, math.sqrt(n * p * (1 - p))))
+    return min(n, max(0, value))
+
+
+def _simulate_python(thresholds: List[int], p: float, paths: int, horizon: int, seed: int) -> List[int]:
+    """Тот же алгоритм без NumPy (медленнее и с приближённым биномиальным распределением)"""
+    rng = random.Random(seed)
+    counts: Dict[int, int] = {0: paths}
+    finished = [0] * (horizon + 1)
+    last = thresholds[horizon]
+    for k in range(1, horizon + 1):
+        threshold = thresholds[k]
+        hopeless = last - (horizon - k)
+        moved: Dict[int, int] = {}
+        for wins, count in counts.items():
+            winners = _binomial(rng, count, p)
+            for new_wins, new_count in ((wins + 1, winners), (wins, count - winners)):
+                if new_count == 0 or new_wins < hopeless:
+                    continue
+                if new_wins >= threshold:
+                    finished[k] += new_count
+                else:
+                    moved[new_wins] = moved.get(new_wins, 0) + new_count
+        counts = moved
+        if not counts:
+            break
+    return finished
+
+
+def _summarize(key: Key, finished: List[int], paths: int, horizon: int) -> Simulation:
+    median = p90 = None
+    cumulative = 0
+    by_match = []
+    for k, count in enumerate(finished):
+        cumulative += count
+        by_match.append(cumulative)
+        if median is None and cumulative * 2 >= paths:
+            median = k
+        if p90 is None and cumulative * 10 >= paths * 9:
+            p90 = k
+    within = tuple((point, by_match[point] / paths) for point in CHECKPOINTS if point <= horizon)
+    return Simulation(*key, paths=paths, horizon=horizon, median=median, p90=p90,
+                      reached=cumulative / paths, within=within)
+
+
+def simulate(key: Key, paths: int, horizon: int) -> Simulation:
+    """Моделирование ``paths`` путей длиной до ``horizon`` матчей (синхронно)"""
+    total_matches, current_wr, desired_wr, win_rate = key
+    thresholds = _thresholds(total_matches, current_wr, desired_wr, horizon)
+    p = win_rate / 100
+    # Зерно из ключа: одинаковый ввод - одинаковый ответ (и в кэше Telegram тоже)
+    seed = int.from_bytes(hashlib.sha1(repr(key).encode()).digest()[:8], "big")
+    np = batch.load_numpy()
+    if np is not None:
+        finished = _simulate_numpy(np, thresholds, p, paths, horizon, seed)
+    else:
+        finished = _simulate_python(thresholds, p, paths, horizon, seed)
+    return _summarize(key, finished, paths, horizon)
+
+
+class MonteCarloEngine:
+    """
+    Асинхронная обёртка: моделирование в отдельном потоке, кэш по округлённым
+    входным данным и объединение одновременных запросов с одинаковым ключом.
+    """
+
+    def __init__(self, paths: int = 100000, horizon: int = 3000, cache_size: int = 1024):
+        self.paths = paths
+        self.horizon = horizon
+        self.cache = LRUCache(maxsize=cache_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="montecarlo")
+        self._inflight: Dict[Key, asyncio.Future] = {}
+        self.simulations = 0
+
+    def is_cached(self, total_matches: int, current_wr: float, desired_wr: float,
+                  win_rate: Optional[float] = None) -> bool:
+        """Есть ли готовый результат (run() вернёт его без моделирования)"""
+        key = quantize(total_matches, current_wr, desired_wr, current_wr if win_rate is None else win_rate)
+        return key in self.cache
+
+    async def run(self, total_matches: int, current_wr: float, desired_wr: float,
+                  win_rate: Optional[float] = None) -> Simulation:
+        """
+        Распределение числа матчей до цели. ``win_rate`` - шанс победы в матче
+        (%), по умолчанию равен текущему винрейту. Входные данные должны быть
+        проверены заранее (calculate_wins_needed без ошибки).
+        """
+        if win_rate is None:
+            win_rate = current_wr
+        key = quantize(total_matches, current_wr, desired_wr, win_rate)
+        result = self.cache.get(key)
+        if result is None:
+            future = self._inflight.get(key)
+            if future is None:
+                future = asyncio.get_running_loop().run_in_executor(
+                    self._executor, simulate, key, self.paths, self.horizon
+                )
+                self._inflight[key] = future
+                # Результат сохраняется, даже если все ожидающие уже отменены
+                # (InlineCoalescer заменил запрос более новым)
+                future.add_done_callback(lambda done: self._store(key, done))
+            result = await asyncio.shield(future)
+        # Распределение - по ключу, а во входных данных - то, что ввёл пользователь
+        return result._replace(
+            total_matches=total_matches, current_wr=current_wr, desired_wr=desired_wr, win_rate=win_rate
+        )
+
+    def _store(self, key: Key, future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.simulations += 1
+        self.cache.set(key, future.result())
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), 'simulations': self.simulations, 'inflight': len(self._inflight)}
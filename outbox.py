@@ -0,0 +1,397 @@
+"""
+Очередь сообщений администратору: SQLite (WAL), повторы с экспоненциальной
+задержкой, защита от дублей, отметки о доставке и дайджест при наплыве.
+"""
+import asyncio
+import hashlib
+import html
+import logging
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from sender import background
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+# Лимит Telegram - 4096 символов; запас на разметку и заголовок
+MESSAGE_LIMIT = 3800
+SEPARATOR = "━━━━━━━━━━━━━━━━━━━━━━━━"
+
+DELIVERED_TEXT = (
+    "✅ <b>Сообщение успешно отправлено!</b>\n\n"
+    "Спасибо за обратную связь! 🙏"
+)
+FAILED_TEXT = (
+    "❌ <b>Не удалось доставить сообщение администратору.</b>\n\n"
+    "Попробуйте позже через /admin"
+)
+
+COLUMNS = "id, user_id, full_name, username, text, attempts, receipt_chat_id, receipt_message_id"
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    user_id: int
+    full_name: str
+    username: str
+    text: str
+    attempts: int
+    receipt_chat_id: Optional[int]
+    receipt_message_id: Optional[int]
+
+
+def render_single(entry: OutboxEntry) -> str:
+    """Уведомление об одном сообщении"""
+    return (
+        "📨 <b>НОВОЕ СООБЩЕНИЕ ОТ ПОЛЬЗОВАТЕЛЯ</b>\n\n"
+        f"👤 <b>От:</b> {html.escape(entry.full_name)}\n"
+        f"🆔 <b>User ID:</b> <code>{entry.user_id}</code>\n"
+        f"📝 <b>Username:</b> @{html.escape(entry.username)}\n\n"
+        f"{SEPARATOR}\n\n"
+        f"💬 <b>Сообщение:</b>\n\n{html.escape(entry.text)}\n\n"
+        f"{SEPARATOR}"
+    )
+
+
+def _render_digest_item(number: int, entry: OutboxEntry) -> str:
+    return (
+        f"<b>{number}. {html.escape(entry.full_name)}</b> "
+        f"(@{html.escape(entry.username)}, <code>{entry.user_id}</code>)\n"
+        f"{html.escape(entry.text)}\n\n"
+        f"{SEPARATOR}\n\n"
+    )
+
+
+def render_digest(entries: List[OutboxEntry]) -> str:
+    """Сводка нескольких сообщений одним уведомлением"""
+    items = "".join(_render_digest_item(number, entry) for number, entry in enumerate(entries, 1))
+    return f"📨 <b>НОВЫЕ СООБЩЕНИЯ ОТ ПОЛЬЗОВАТЕЛЕЙ: {len(entries)}</b>\n\n{items}".rstrip()
+
+
+def reply_keyboard(entries: List[OutboxEntry]) -> InlineKeyboardMarkup:
+    """Кнопка "Ответить" для каждого сообщения"""
+    if len(entries) == 1:
+        return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+            text="💬 Ответить пользователю", callback_data=f"reply_to_{entries[0].user_id}"
+        )]])
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text=f"💬 {number}. {entry.full_name[:40]}", callback_data=f"reply_to_{entry.user_id}"
+        )]
+        for number, entry in enumerate(entries, 1)
+    ])
+
+
+class AdminOutbox:
+    """
+    Надёжная доставка сообщений пользователей администратору.
+
+    ``enqueue()`` записывает сообщение в базу и будит фоновую задачу доставки.
+    Неудачная отправка повторяется через ``base_delay * 2**n`` секунд (не больше
+    ``max_delay``), после ``max_attempts`` попыток сообщение помечается как
+    недоставленное. Когда в очереди скопилось ``digest_threshold`` и больше
+    сообщений, они уходят одной сводкой (до ``digest_max`` штук) с кнопкой
+    ответа для каждого; между уведомлениями выдерживается ``min_interval``
+    секунд, так что при наплыве админ получает сводки, а не поток сообщений.
+    Записи забираются в работу транзакцией с арендой на ``lease`` секунд,
+    поэтому несколько процессов не отправят одно и то же дважды, а после
+    падения процесса сообщение снова станет доступно.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        bot: Bot,
+        admin_id: int,
+        base_delay: float = 5.0,
+        max_delay: float = 600.0,
+        max_attempts: int = 12,
+        dedup_window: float = 3600.0,
+        digest_threshold: int = 3,
+        digest_max: int = 10,
+        digest_entry_limit: int = 600,
+        retention_days: int = 30,
+        lease: float = 60.0,
+        min_interval: float = 1.0,
+    ):
+        self.path = path
+        self.bot = bot
+        self.admin_id = admin_id
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.dedup_window = dedup_window
+        self.digest_threshold = digest_threshold
+        self.digest_max = digest_max
+        self.digest_entry_limit = digest_entry_limit
+        self.retention_days = retention_days
+        self.lease = lease
+        self.min_interval = min_interval
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.delivered = 0
+        self.digests = 0
+        self.retries = 0
+        self.failed = 0
+        self.duplicates = 0
+
+    def _open(self) -> None:
+        # Все обращения к соединению идут из одного потока
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox-sqlite")
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY, dedup_key TEXT NOT NULL, user_id INTEGER NOT NULL, "
+            "full_name TEXT NOT NULL, username TEXT NOT NULL, text TEXT NOT NULL, "
+            "created_at REAL NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at REAL NOT NULL, sent_at REAL, admin_message_id INTEGER, "
+            "receipt_chat_id INTEGER, receipt_message_id INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_dedup ON outbox (dedup_key, created_at)")
+
+    async def _run(self, func, *args):
+        if self._conn is None:
+            self._open()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # Запись
+
+    @staticmethod
+    def _dedup_key(user_id: int, text: str) -> str:
+        return hashlib.sha256(f"{user_id}\0{text}".encode()).hexdigest()
+
+    def _enqueue_sync(self, row: Tuple) -> Tuple[int, bool]:
+        dedup_key, created_at = row[0], row[5]
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            existing = self._conn.execute(
+                "SELECT id FROM outbox WHERE dedup_key = ? AND created_at > ? AND status != ? LIMIT 1",
+                (dedup_key, created_at - self.dedup_window, STATUS_FAILED)
+            ).fetchone()
+            if existing:
+                return existing[0], False
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (dedup_key, user_id, full_name, username, text, created_at, status, "
+                "next_attempt_at, receipt_chat_id, receipt_message_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row
+            )
+            return cursor.lastrowid, True
+
+    async def enqueue(
+        self,
+        user_id: int,
+        full_name: str,
+        username: str,
+        text: str,
+        receipt_chat_id: Optional[int] = None,
+        receipt_message_id: Optional[int] = None,
+    ) -> Tuple[int, bool]:
+        """
+        Постановка сообщения в очередь. Возвращает (id, новое ли сообщение):
+        тот же текст от того же пользователя в пределах ``dedup_window`` не дублируется.
+        По сообщению ``receipt_message_id`` пользователь получит отметку о доставке.
+        """
+        now = time.time()
+        row = (self._dedup_key(user_id, text), user_id, full_name, username, text, now,
+               STATUS_PENDING, now, receipt_chat_id, receipt_message_id)
+        entry_id, created = await self._run(self._enqueue_sync, row)
+        if created:
+            self._wakeup.set()
+        else:
+            self.duplicates += 1
+        return entry_id, created
+
+    # Доставка
+
+    def _pick(self, due: List[OutboxEntry]) -> List[OutboxEntry]:
+        """Что отправить следующим: одно сообщение или сводку из первых в очереди"""
+        if len(due) < self.digest_threshold or len(due[0].text) > self.digest_entry_limit:
+            return due[:1]
+        batch = []
+        size = 0
+        for entry in due:
+            if len(entry.text) > self.digest_entry_limit:
+                break
+            size += len(_render_digest_item(len(batch) + 1, entry))
+            if size > MESSAGE_LIMIT:
+                break
+            batch.append(entry)
+        return batch
+
+    def _claim_sync(self, now: float) -> Tuple[List[OutboxEntry], Optional[float]]:
+        """Забирает в работу очередную порцию и возвращает время следующей попытки"""
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            due = [OutboxEntry(*row) for row in self._conn.execute(
+                f"SELECT {COLUMNS} FROM outbox WHERE status = ? AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (STATUS_PENDING, now, self.digest_max)
+            )]
+            batch = self._pick(due)
+            if batch:
+                self._conn.executemany(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                    [(now + self.lease, entry.id) for entry in batch]
+                )
+            next_attempt = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?", (STATUS_PENDING,)
+            ).fetchone()[0]
+        return batch, next_attempt
+
+    def _mark_sent_sync(self, ids: List[int], message_id: int) -> None:
+        now = time.time()
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, sent_at = ?, admin_message_id = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                [(STATUS_SENT, now, message_id, entry_id) for entry_id in ids]
+            )
+
+    def _mark_failed_sync(self, updates: List[Tuple[str, float, int]]) -> None:
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, next_attempt_at = ?, attempts = attempts + 1 WHERE id = ?",
+                updates
+            )
+
+    def backoff(self, attempts: int) -> float:
+        """Задержка перед попыткой номер ``attempts + 1`` (с разбросом до 10%)"""
+        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+        return delay * random.uniform(1.0, 1.1)
+
+    async def _send_receipts(self, entries: List[OutboxEntry], text: str) -> None:
+        for entry in entries:
+            if entry.receipt_message_id is None:
+                continue
+            try:
+                await self.bot.edit_message_text(
+                    text, chat_id=entry.receipt_chat_id, message_id=entry.receipt_message_id, parse_mode="HTML"
+                )
+            except Exception as e:
+                logger.debug("Не удалось отметить доставку сообщения %s: %s", entry.id, e)
+
+    async def _deliver(self, batch: List[OutboxEntry]) -> None:
+        ids = [entry.id for entry in batch]
+        text = render_single(batch[0]) if len(batch) == 1 else render_digest(batch)
+        try:
+            message = await self.bot.send_message(
+                self.admin_id, text, parse_mode="HTML", reply_markup=reply_keyboard(batch)
+            )
+        except Exception as e:
+            retry_after = e.retry_after if isinstance(e, TelegramRetryAfter) else 0
+            now = time.time()
+            updates = []
+            given_up = []
+            for entry in batch:
+                if entry.attempts + 1 >= self.max_attempts:
+                    updates.append((STATUS_FAILED, now, entry.id))
+                    given_up.append(entry)
+                else:
+                    delay = max(self.backoff(entry.attempts + 1), retry_after)
+                    updates.append((STATUS_PENDING, now + delay, entry.id))
+            await self._run(self._mark_failed_sync, updates)
+            self.retries += len(batch) - len(given_up)
+            self.failed += len(given_up)
+            logger.warning("Ошибка доставки сообщений админу %s: %s", ids, e)
+            if given_up:
+                logger.error("Сообщения %s не доставлены админу, попытки исчерпаны", [entry.id for entry in given_up])
+                await self._send_receipts(given_up, FAILED_TEXT)
+            return
+
+        await self._run(self._mark_sent_sync, ids, message.message_id)
+        self.delivered += len(batch)
+        if len(batch) > 1:
+            self.digests += 1
+        logger.info("Админу доставлено сообщений: %s (id %s)", len(batch), ids)
+        await self._send_receipts(batch, DELIVERED_TEXT)
+
+    async def _deliver_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            delay = self.max_delay
+            try:
+                batch, next_attempt = await self._run(self._claim_sync, time.time())
+                if batch:
+                    with background():
+                        await self._deliver(batch)
+                    # Не чаще одного уведомления в min_interval: пока идёт пауза,
+                    # сообщения наплыва копятся и уходят следующей сводкой
+                    await asyncio.sleep(self.min_interval)
+                    continue
+                if next_attempt is not None:
+                    delay = max(0.0, min(delay, next_attempt - time.time()))
+            except Exception as e:
+                logger.error("Ошибка очереди сообщений админу: %s", e)
+                delay = self.base_delay
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _prune_sync(self) -> None:
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM outbox WHERE status != ? AND created_at < ?",
+                (STATUS_PENDING, time.time() - self.retention_days * 86400)
+            )
+
+    async def start(self) -> None:
+        """Запуск доставки (в том числе оставшегося с прошлого запуска)"""
+        await self._run(self._prune_sync)
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._deliver_loop())
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._executor.shutdown()
+            self._conn = None
+            self._executor = None
+
+    # Статистика
+
+    def _counts_sync(self) -> Dict[str, int]:
+        counts = {STATUS_PENDING: 0, STATUS_SENT: 0, STATUS_FAILED: 0}
+        counts.update(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        return counts
+
+    async def counts(self) -> Dict[str, int]:
+        """Число сообщений в базе по статусам"""
+        return await self._run(self._counts_sync)
+
+    def stats(self) -> dict:
+        return {
+            'delivered': self.delivered,
+            'digests': self.digests,
+            'retries': self.retries,
+            'failed': self.failed,
+            'duplicates': self.duplicates,
+        }
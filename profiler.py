@@ -0,0 +1,269 @@
+"""Профилирование по команде администратора без перезапуска бота"""
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLE = "sample"
+
+
+class Timings:
+    """Суммарное время и число вызовов по именам"""
+
+    def __init__(self):
+        self.total: Dict[str, float] = {}
+        self.calls: Counter = Counter()
+
+    def add(self, name: str, elapsed: float) -> None:
+        self.total[name] = self.total.get(name, 0.0) + elapsed
+        self.calls[name] += 1
+
+    def top(self, limit: int) -> List[Tuple[str, float, int]]:
+        items = sorted(self.total.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(name, total, self.calls[name]) for name, total in items]
+
+
+class StackSampler:
+    """Сэмплирующий профилировщик: стеки потока цикла событий в формате collapsed stacks"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit: int) -> List[Tuple[str, float]]:
+        """Функции с наибольшей долей сэмплов, где они были на вершине стека"""
+        total = sum(self.stacks.values()) or 1
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return [(name, count / total) for name, count in leaves.most_common(limit)]
+
+
+class _UpdateCounter(BaseMiddleware):
+    def __init__(self, profiler: "Profiler"):
+        self.profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            self.profiler.updates += 1
+            if self.profiler.max_updates and self.profiler.updates >= self.profiler.max_updates:
+                self.profiler.schedule_stop()
+
+
+class _HandlerTimer(BaseMiddleware):
+    def __init__(self, timings: Timings):
+        self.timings = timings
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.timings.add(data["handler"].callback.__name__, time.perf_counter() - started)
+
+
+class _ApiTimer(BaseRequestMiddleware):
+    def __init__(self, timings: Timings):
+        self.timings = timings
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.timings.add(method.__api_method__, time.perf_counter() - started)
+
+
+class Profiler:
+    """
+    Профилирование следующих ``updates`` обновлений или ``seconds`` секунд.
+
+    Middleware для замеров устанавливаются только на время сеанса и снимаются
+    после него, поэтому в выключенном состоянии профилировщик ничего не стоит.
+    По окончании в ``directory`` записывается файл .pstats (cProfile) или
+    .collapsed (сэмплирование), а отчёт передаётся в ``on_finish``.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, directory: str, top: int = 15,
+                 sample_interval: float = 0.005):
+        self.dp = dp
+        self.bot = bot
+        self.directory = directory
+        self.top = top
+        self.sample_interval = sample_interval
+        self.mode: Optional[str] = None
+        self.updates = 0
+        self.max_updates = 0
+        self._started = 0.0
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._handlers: Optional[Timings] = None
+        self._api: Optional[Timings] = None
+        self._installed: List[Tuple[Any, Any]] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Task] = None
+        self._on_finish: Optional[Callable[[str, str], Awaitable[None]]] = None
+
+    @property
+    def active(self) -> bool:
+        return self.mode is not None
+
+    def start(self, mode: str, updates: int, seconds: float,
+              on_finish: Callable[[str, str], Awaitable[None]]) -> None:
+        """Запуск сеанса; ``on_finish(отчёт, путь_к_файлу)`` вызывается по его окончании"""
+        if self.active:
+            raise RuntimeError("Профилирование уже запущено")
+        if mode == MODE_CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = StackSampler(self.sample_interval)
+            self._sampler.start()
+
+        self.mode = mode
+        self.updates = 0
+        self.max_updates = updates
+        self._started = time.perf_counter()
+        self._on_finish = on_finish
+        self._handlers = Timings()
+        self._api = Timings()
+
+        handler_timer = _HandlerTimer(self._handlers)
+        self._install(self.dp.update.outer_middleware, _UpdateCounter(self))
+        for name, observer in self.dp.observers.items():
+            if name not in ("update", "error"):
+                self._install(observer.middleware, handler_timer)
+        self._install(self.bot.session.middleware, _ApiTimer(self._api))
+
+        self._timer = asyncio.create_task(self._stop_after(seconds))
+        logger.info("Профилирование (%s) запущено: %s обновлений, до %g сек", mode, updates or '∞', seconds)
+
+    def _install(self, manager: Any, middleware: Any) -> None:
+        manager.register(middleware)
+        self._installed.append((manager, middleware))
+
+    async def _stop_after(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+        self.schedule_stop()
+
+    def schedule_stop(self) -> None:
+        if self.active and self._stopping is None:
+            self._stopping = asyncio.create_task(self.stop())
+
+    async def stop(self) -> None:
+        """Остановка сеанса, запись файла и отправка отчёта"""
+        if not self.active:
+            return
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        for manager, middleware in self._installed:
+            manager.unregister(middleware)
+        self._installed = []
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+
+        elapsed = time.perf_counter() - self._started
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if self._profile is not None:
+            path = os.path.join(self.directory, f"profile-{stamp}.pstats")
+            self._profile.dump_stats(path)
+        else:
+            path = os.path.join(self.directory, f"profile-{stamp}.collapsed")
+            self._sampler.dump(path)
+        report = self.report(elapsed)
+        on_finish = self._on_finish
+
+        self.mode = None
+        self._profile = self._sampler = None
+        self._timer = self._stopping = self._on_finish = None
+        logger.info("Профилирование завершено: %s обновлений за %.1f сек, %s", self.updates, elapsed, path)
+
+        if on_finish is not None:
+            try:
+                await on_finish(report, path)
+            except Exception as e:
+                logger.error("Не удалось отправить отчёт профилирования: %s", e)
+
+    def report(self, elapsed: float) -> str:
+        """Текстовая сводка: самые дорогие функции, обработчики и запросы к API"""
+        lines = [f"{self.mode}: {self.updates} обновлений за {elapsed:.1f} сек", ""]
+        if self._profile is not None:
+            stats = pstats.Stats(self._profile)
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:self.top]
+            lines.append(f"{'own, мс':>9} {'cum, мс':>9} {'вызовы':>7}  функция")
+            for (filename, line, name), (_, calls, own, cumulative, _) in rows:
+                lines.append(
+                    f"{own * 1000:>9.1f} {cumulative * 1000:>9.1f} {calls:>7}  "
+                    f"{name} ({os.path.basename(filename)}:{line})"
+                )
+        else:
+            lines.append(f"{'доля':>6}  функция (вершина стека)")
+            for name, share in self._sampler.top(self.top):
+                lines.append(f"{share:>6.1%}  {name}")
+
+        for title, timings in (("Обработчики", self._handlers), ("Bot API", self._api)):
+            lines.extend(["", f"{title}:", f"{'всего, мс':>10} {'вызовы':>7} {'ср., мс':>8}  имя"])
+            for name, total, calls in timings.top(self.top):
+                lines.append(f"{total * 1000:>10.1f} {calls:>7} {total / calls * 1000:>8.2f}  {name}")
+        return "\n".join(lines)
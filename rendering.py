@@ -0,0 +1,105 @@
+"""Отрисовка результата расчёта: шаблоны собираются один раз, прогресс-бары берутся из таблицы"""
+from typing import Dict, Optional, Tuple
+
+from montecarlo import Simulation
+
+BAR_FILLED = "🟩"
+BAR_EMPTY = "⬜"
+MAX_BAR_LENGTH = 20
+
+# PROGRESS_BARS[длина][заполнено] - готовая строка бара
+PROGRESS_BARS: Dict[int, Tuple[str, ...]] = {
+    length: tuple(BAR_FILLED * filled + BAR_EMPTY * (length - filled) for filled in range(length + 1))
+    for length in range(1, MAX_BAR_LENGTH + 1)
+}
+
+_BARS_10 = PROGRESS_BARS[10]
+
+RESULT_TEMPLATE = (
+    "╔════════════════════════╗\n"
+    "║  ✅ <b>РАСЧЁТ ЗАВЕРШЁН!</b> ✅  ║\n"
+    "╚════════════════════════╝\n\n"
+    "📊 <b>ИСХОДНЫЕ ДАННЫЕ:</b>\n"
+    "┣ Матчей: <code>%s</code>\n"
+    "┣ Текущий WR: <code>%.1f%%</code>\n\n"
+    "%s %.1f%%\n\n"
+    "🎯 <b>ЦЕЛЬ: %.1f%%</b>\n\n"
+    "🏆 <b>НУЖНО ВЫИГРАТЬ ПОДРЯД:</b>\n"
+    "<b><u>%s матч(ей)</u></b> 🔥\n\n"
+    "📈 <b>ИТОГОВАЯ СТАТИСТИКА:</b>\n"
+    "┣ Всего матчей: <code>%s</code>\n"
+    "┗ Итоговый WR: <code>%.2f%%</code>\n\n"
+    "💪 <b>Удачи на поле боя!</b> 🎮"
+)
+
+ERROR_TEMPLATE = "❌ <b>Ошибка:</b> %s"
+
+MONTECARLO_TEMPLATE = (
+    "🎲 <b>РЕАЛИСТИЧНЫЙ ПУТЬ</b>\n\n"
+    "📊 Матчей: <code>%s</code>, WR <code>%.1f%%</code> → цель <code>%.1f%%</code>\n"
+    "🎯 Шанс победы в матче: <code>%.1f%%</code>\n\n"
+    "📈 <b>Сколько матчей понадобится</b> (%s симуляций):\n"
+    "┣ Медиана: <code>%s</code>\n"
+    "┣ 9 из 10 игроков: <code>%s</code>\n"
+    "┗ Дойдут до цели за %s матчей: <code>%.1f%%</code>\n\n"
+    "<b>Шанс дойти за N матчей:</b>\n"
+    "<pre>%s</pre>\n\n"
+    "🏆 Если выигрывать подряд: <b>%s</b> матч(ей)"
+)
+
+
+def _progress(current: float, goal: float, length: int) -> Tuple[str, float]:
+    percentage = min(current / goal * 100, 100) if goal > 0 else 0
+    filled = max(0, int(length * percentage / 100))
+    bars = PROGRESS_BARS.get(length)
+    if bars is None:
+        return BAR_FILLED * filled + BAR_EMPTY * (length - filled), percentage
+    return bars[filled], percentage
+
+
+def progress_bar(current: float, goal: float, length: int = 10) -> str:
+    """Визуальный прогресс-бар вида ``🟩🟩⬜ 66.7%``"""
+    bar, percentage = _progress(current, goal, length)
+    return "%s %.1f%%" % (bar, percentage)
+
+
+def render_result(total_matches: int, current_wr: float, desired_wr: float, result: dict) -> str:
+    """Текст с результатом расчёта (или с ошибкой) для личного чата и inline-режима"""
+    if 'error' in result:
+        return ERROR_TEMPLATE % result['error']
+    # Прогресс-бар длины 10 без вызова _progress: это самый частый путь
+    percentage = min(current_wr / desired_wr * 100, 100) if desired_wr > 0 else 0
+    return RESULT_TEMPLATE % (
+        total_matches,
+        current_wr,
+        _BARS_10[max(0, int(10 * percentage / 100))],
+        percentage,
+        desired_wr,
+        result['wins_needed'],
+        result['new_total_matches'],
+        result['actual_new_wr'],
+    )
+
+
+def _matches(value: Optional[int], horizon: int) -> str:
+    return f"&gt; {horizon}" if value is None else str(value)
+
+
+def render_montecarlo(simulation: Simulation, wins_needed: int) -> str:
+    """Текст с распределением числа матчей до цели (montecarlo.Simulation)"""
+    table = "\n".join(
+        "%5d %s" % (point, progress_bar(probability, 1)) for point, probability in simulation.within
+    )
+    return MONTECARLO_TEMPLATE % (
+        simulation.total_matches,
+        simulation.current_wr,
+        simulation.desired_wr,
+        simulation.win_rate,
+        f"{simulation.paths:,}".replace(",", " "),
+        _matches(simulation.median, simulation.horizon),
+        _matches(simulation.p90, simulation.horizon),
+        simulation.horizon,
+        simulation.reached * 100,
+        table,
+        wins_needed,
+    )
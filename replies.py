@@ -0,0 +1,223 @@
+"""
+Статические клавиатуры и тексты ответов.
+
+Всё собирается один раз при импорте: для каждого статического ответа готов
+шаблон SendMessage с заранее сериализованной в JSON клавиатурой, а
+``answer()`` лишь копирует его с нужным chat_id - без построения и валидации
+pydantic-моделей на каждый запрос.
+"""
+import json
+from typing import Optional, Union
+
+from aiogram.methods import SendMessage
+from aiogram.types import (
+    InaccessibleMessage,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    Message,
+    ReplyKeyboardMarkup,
+)
+
+Markup = Union[ReplyKeyboardMarkup, InlineKeyboardMarkup]
+
+# Клавиатуры
+MAIN_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [
+            KeyboardButton(text="🎯 Рассчитать винрейт"),
+            KeyboardButton(text="📖 Справка")
+        ],
+        [
+            KeyboardButton(text="ℹ️ О боте")
+        ]
+    ],
+    resize_keyboard=True,
+)
+
+CANCEL_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="❌ Отменить расчет")]
+    ],
+    resize_keyboard=True,
+    input_field_placeholder="Введите значение или отмените..."
+)
+
+CANCEL_ADMIN_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="❌ Отменить отправку")]
+    ],
+    resize_keyboard=True,
+    input_field_placeholder="Напишите ваше сообщение..."
+)
+
+START_INLINE_KEYBOARD = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [
+            InlineKeyboardButton(text="🎯 Начать расчёт", callback_data="start_calc"),
+            InlineKeyboardButton(text="📖 Помощь", callback_data="show_help")
+        ],
+        [
+            InlineKeyboardButton(text="ℹ️ О боте", callback_data="about_bot")
+        ]
+    ]
+)
+
+RESULT_BUTTONS = [
+    InlineKeyboardButton(text="🔄 Новый расчёт", callback_data="start_calc"),
+    InlineKeyboardButton(text="📊 Справка", callback_data="show_help")
+]
+
+RESULT_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[RESULT_BUTTONS])
+
+HEROES_KEYBOARD = InlineKeyboardMarkup(
+    inline_keyboard=[
+        [
+            InlineKeyboardButton(text="🗑 Очистить", callback_data="heroes_clear"),
+            InlineKeyboardButton(text="✅ Готово", callback_data="heroes_done")
+        ]
+    ]
+)
+
+# Тексты
+START_TEXT = (
+    "┏━━━━━━━━━━━━━━━━━━━━━━\n"
+    "┃  🎮 <b>MLBB CALCULATOR</b> 🎮  ┃\n"
+    "┗━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "👋 Привет! Я бот-калькулятор винрейта для <b>Mobile Legends: Bang Bang</b>!\n\n"
+    "🎯 <b>Что я умею:</b>\n"
+    "• Рассчитываю необходимое количество побед\n"
+    "• Показываю детальную статистику\n"
+    "• Работаю быстро и точно\n"
+    "• Работаю в групповых чатах (inline-режим)!\n\n"
+    "📊 Узнай, сколько побед подряд нужно одержать для достижения желаемого винрейта!\n\n"
+    "💡 Используй кнопки ниже для навигации ⬇️"
+)
+
+QUICK_START_TEXT = "🚀 <b>Быстрый старт:</b>"
+
+HELP_TEXT = (
+    "╔═══════════════════╗\n"
+    "║  📖 <b>ИНСТРУКЦИЯ</b> 📖  ║\n"
+    "╚═══════════════════╝\n\n"
+    "<b>🎯 Как пользоваться ботом:</b>\n\n"
+    "1️⃣ Нажми кнопку <b>\"🎯 Рассчитать винрейт\"</b> или /calc\n"
+    "2️⃣ Введи <b>количество матчей</b> на герое (например: 100)\n"
+    "3️⃣ Введи <b>текущий винрейт</b> в % (например: 55.5)\n"
+    "4️⃣ Введи <b>желаемый винрейт</b> в % (например: 60)\n\n"
+    "✅ Бот мгновенно рассчитает результат!\n\n"
+    "━━━━━━━━━━━━━━━━━━━━\n\n"
+    "<b>📱 Где найти статистику в MLBB:</b>\n\n"
+    "🎮 <b>Для героя:</b>\n"
+    "   • Профиль → Поле боя → Фавориты\n\n"
+    "📊 <b>Для аккаунта:</b>\n"
+    "   • Профиль → Поле боя → Статистика\n\n"
+    "━━━━━━━━━━━━━━━━━━━━\n\n"
+    "<b>💡 Полезные команды:</b>\n"
+    "   /calc - Начать расчёт\n"
+    "   /batch - Расчёт для списка героев\n"
+    "   /heroes - Винрейт аккаунта по героям и план до цели\n"
+    "   /history - История расчётов\n"
+    "   /cancel - Отменить текущий расчёт\n"
+    "   /help - Показать эту справку\n"
+    "   /start - Главное меню"
+)
+
+CALC_START_TEXT = (
+    "╔═══════════════════════╗\n"
+    "║  🎮 <b>РАСЧЁТ ВИНРЕЙТА</b> 🎮  ║\n"
+    "╚═══════════════════════╝\n\n"
+    "📊 <b>Шаг 1 из 3</b>\n\n"
+    "Введи <b>текущее количество матчей</b> на герое 🎯\n\n"
+    "📝 <i>Пример:</i> <code>100</code>\n\n"
+    "💡 Это можно найти в профиле героя во вкладке \"Избранное\""
+)
+
+HEROES_START_TEXT = (
+    "🦸 <b>ГЕРОИ АККАУНТА</b>\n\n"
+    "Присылай героев - по одному в строке, можно несколькими сообщениями:\n"
+    "<code>герой матчи WR</code>\n\n"
+    "📝 <i>Пример:</i>\n"
+    "<code>Layla 120 55.5\n"
+    "Miya 340 51.2</code>\n\n"
+    "🔁 Повторная строка с тем же героем обновляет его, <code>-Layla</code> - удаляет.\n"
+    "🎯 Отдельное число - <b>желаемый винрейт</b> аккаунта: посчитаю, сколько побед "
+    "нужно и на каких героях их набрать."
+)
+
+NO_ACTIVE_CALC_TEXT = "⚠️ Нет активного расчета для отмены."
+
+CALC_CANCELLED_TEXT = (
+    "❌ <b>Расчет отменен</b>\n\n"
+    "Нажми кнопку ниже, чтобы начать заново 👇"
+)
+
+ADMIN_TEXT = (
+    "╔════════════════════════╗\n"
+    "║  💬 <b>СВЯЗЬ С АДМИНОМ</b> 💬  ║\n"
+    "╚════════════════════════╝\n\n"
+    "👋 Привет! Если у тебя есть вопросы или предложения, я всегда на связи.\n\n"
+    "✍️ <b>Жду твоё сообщение...</b>"
+)
+
+ABOUT_TEXT = (
+    "╔═══════════════════╗\n"
+    "║  ℹ️ <b>О БОТЕ</b> ℹ️  ║\n"
+    "╚═══════════════════╝\n\n"
+    "🎮 <b>MLBB Winrate Calculator</b>\n\n"
+    "Умный калькулятор для игроков Mobile Legends, "
+    "который помогает планировать свой путь к желаемому винрейту.\n\n"
+    "💪 <b>Удачи на поле боя!</b> 🏆"
+)
+
+UNKNOWN_TEXT = (
+    "❓ <b>Не понимаю...</b>\n\n"
+    "Используй кнопки ниже 👇"
+)
+
+WHAT_NEXT_TEXT = "🔄 <b>Что дальше?</b>"
+
+SLOW_DOWN_TEXT = "⏳ <b>Не так быстро!</b> Подожди пару секунд - лишние сообщения пока пропускаю."
+
+
+def _serialize(markup: Markup) -> str:
+    # Так же, как BaseSession.prepare_value: без полей со значением None
+    return json.dumps(markup.model_dump(mode="json", exclude_none=True))
+
+
+def _template(text: str, reply_markup: Optional[Markup] = None, parse_mode: Optional[str] = "HTML") -> SendMessage:
+    # chat_id подставляется при отправке; разметка хранится готовой JSON-строкой,
+    # которую сессия передаёт как есть
+    return SendMessage.model_construct(
+        chat_id=0,
+        text=text,
+        parse_mode=parse_mode,
+        reply_markup=_serialize(reply_markup) if reply_markup is not None else None,
+    )
+
+
+# Готовые ответы
+START = _template(START_TEXT, MAIN_KEYBOARD)
+QUICK_START = _template(QUICK_START_TEXT, START_INLINE_KEYBOARD)
+HELP = _template(HELP_TEXT, MAIN_KEYBOARD)
+CALC_START = _template(CALC_START_TEXT, CANCEL_KEYBOARD)
+NO_ACTIVE_CALC = _template(NO_ACTIVE_CALC_TEXT, MAIN_KEYBOARD, parse_mode=None)
+CALC_CANCELLED = _template(CALC_CANCELLED_TEXT, MAIN_KEYBOARD)
+ADMIN = _template(ADMIN_TEXT, CANCEL_ADMIN_KEYBOARD)
+ABOUT = _template(ABOUT_TEXT, MAIN_KEYBOARD)
+UNKNOWN = _template(UNKNOWN_TEXT, MAIN_KEYBOARD)
+WHAT_NEXT = _template(WHAT_NEXT_TEXT, RESULT_KEYBOARD)
+SLOW_DOWN = _template(SLOW_DOWN_TEXT)
+
+
+def answer(message: Union[Message, InaccessibleMessage], reply: SendMessage) -> SendMessage:
+    """
+    Аналог ``message.answer(...)`` для готового ответа: копия шаблона с
+    адресом чата, без построения и валидации моделей.
+    """
+    thread_id = message.message_thread_id if getattr(message, "is_topic_message", None) else None
+    return reply.model_copy(update={
+        "chat_id": message.chat.id,
+        "message_thread_id": thread_id,
+        "business_connection_id": getattr(message, "business_connection_id", None),
+    }).as_(message.bot)
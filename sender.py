@@ -0,0 +1,224 @@
+"""Планировщик исходящих запросов с учётом лимитов Telegram"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: ответы пользователю в диалоге обслуживаются раньше фоновых рассылок
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+# Число корзин чатов, после которого забываются полностью восстановившиеся
+CHAT_BUCKETS_PRUNE_AT = 10000
+
+send_priority: ContextVar[int] = ContextVar("send_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def background() -> Iterator[None]:
+    """Все запросы внутри блока отправляются с фоновым приоритетом"""
+    token = send_priority.set(PRIORITY_BACKGROUND)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    """Маркерная корзина: ``rate`` токенов в секунду, не больше ``capacity``"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд появится токен"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def reserve(self, now: float) -> float:
+        """Занимает токен (возможно, в долг) и возвращает время ожидания своей очереди"""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def block(self, seconds: float, now: float) -> None:
+        """Не выдавать токены ближайшие ``seconds`` секунд (после retry_after)"""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: все запросы с ``chat_id`` (send_message, answer,
+    edit_text, ...) проходят через общий лимит и лимит чата, ответы с
+    приоритетом PRIORITY_INTERACTIVE обгоняют фоновые, а при ошибке 429
+    запрос автоматически повторяется после ``retry_after``.
+
+    Лимиты действуют в пределах процесса; воркеры супервизора делят общий
+    лимит поровну (см. ``create_scheduler``).
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._chats: Dict[int, TokenBucket] = {}
+        self._prune_at = CHAT_BUCKETS_PRUNE_AT
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._waiting_chat = 0
+        self._latencies = deque(maxlen=1000)
+        self.sent = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._prune_at:
+                # Полные корзины ничего не ограничивают - их можно забыть. Корзины
+                # в долгу оставляем, иначе лимит чата сбросился бы раньше времени;
+                # чтобы чистка не повторялась на каждом новом чате, порог растёт
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_full(now)}
+                self._prune_at = max(CHAT_BUCKETS_PRUNE_AT, 2 * len(self._chats))
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    async def _acquire(self, chat_id: int, priority: int) -> None:
+        # Лимит чата: очередь внутри чата по порядку поступления
+        delay = self._chat_bucket(chat_id, time.monotonic()).reserve(time.monotonic())
+        if delay > 0:
+            self._waiting_chat += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._waiting_chat -= 1
+
+        # Общий лимит: быстрый путь без очереди, если токен есть и никто не ждёт
+        now = time.monotonic()
+        if not self._queue and self.global_bucket.delay(now) == 0:
+            self.global_bucket.take(now)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self) -> None:
+        while self._queue:
+            delay = self.global_bucket.delay(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                self.global_bucket.take(time.monotonic())
+                future.set_result(None)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self._acquire(chat_id, send_priority.get())
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                self.retries += 1
+                if chat_id is not None:
+                    self._chat_bucket(chat_id, time.monotonic()).block(e.retry_after, time.monotonic())
+                if attempt > self.max_retries:
+                    self.failures += 1
+                    raise
+                logger.warning(
+                    "Flood control для %s (чат %s), повтор через %s сек",
+                    type(method).__name__, chat_id, e.retry_after
+                )
+                await asyncio.sleep(e.retry_after)
+                continue
+            except Exception:
+                self.failures += 1
+                raise
+            self.sent += 1
+            self._latencies.append(time.monotonic() - started)
+            return response
+
+    def stats(self) -> dict:
+        """Глубина очередей и задержка отправки"""
+        latencies = sorted(self._latencies)
+        return {
+            'queue_depth': len(self._queue),
+            'waiting_chat_limit': self._waiting_chat,
+            'sent': self.sent,
+            'retries': self.retries,
+            'failures': self.failures,
+            'latency_p50': latencies[len(latencies) // 2] if latencies else 0.0,
+            'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        }
+
+
+def create_scheduler() -> SendScheduler:
+    """
+    Планировщик с лимитами из настроек. В воркере супервизора общий лимит
+    делится на число воркеров, чтобы вместе они не превышали SEND_GLOBAL_RATE.
+    Лимит чата не делится: чат всегда обслуживает один воркер.
+    """
+    return SendScheduler(
+        global_rate=config.SEND_GLOBAL_RATE / max(1, config.SEND_RATE_SHARES),
+        chat_rate=config.SEND_CHAT_RATE,
+        chat_burst=config.SEND_CHAT_BURST,
+        group_rate=config.SEND_GROUP_RATE_PER_MIN / 60,
+        max_retries=config.SEND_MAX_RETRIES,
+    )
@@ -0,0 +1,144 @@
+"""HTTP-сессия бота: пул соединений, keep-alive, таймауты по методам и свой адрес Bot API"""
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from aiohttp import ClientSession, TraceConfig
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram import Bot, __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+import config
+
+
+def parse_timeouts(value: str) -> Dict[str, float]:
+    """Разбор строки ``метод=сек,метод=сек`` (имена методов Bot API, например sendMessage)"""
+    timeouts = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """
+    AiohttpSession с настраиваемым пулом соединений (``limit`` всего и
+    ``limit_per_host``), временем keep-alive простаивающего соединения,
+    кэшем DNS и таймаутами по методам Bot API. Через TraceConfig aiohttp
+    считает новые и повторно использованные соединения (новое соединение -
+    это TCP- и TLS-рукопожатие), попадания в кэш DNS и задержку запросов.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 0,
+        keepalive_timeout: float = 60,
+        dns_ttl: int = 3600,
+        method_timeouts: Optional[Dict[str, float]] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(limit=limit, **kwargs)
+        self._connector_init.update(
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=dns_ttl or None,
+            use_dns_cache=bool(dns_ttl),
+        )
+        self.method_timeouts = method_timeouts or {}
+        self._latencies = deque(maxlen=1000)
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.dns_hits = 0
+        self.dns_misses = 0
+
+    def _trace_config(self) -> TraceConfig:
+        trace = TraceConfig()
+
+        async def on_connection_create_end(session, context, params):
+            self.new_connections += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self.reused_connections += 1
+
+        async def on_dns_cache_hit(session, context, params):
+            self.dns_hits += 1
+
+        async def on_dns_cache_miss(session, context, params):
+            self.dns_misses += 1
+
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    async def create_session(self) -> ClientSession:
+        # То же, что AiohttpSession.create_session, плюс счётчики соединений
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}"},
+                trace_configs=[self._trace_config()],
+            )
+            self._should_reset_connector = False
+
+        return self._session
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        # Явный таймаут (например, у getUpdates при long polling) важнее настроек
+        if timeout is None:
+            timeout = self.method_timeouts.get(method.__api_method__)
+        started = time.monotonic()
+        try:
+            return await super().make_request(bot, method, timeout)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.requests += 1
+            self._latencies.append(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        """Соединения, кэш DNS и задержка запросов к Bot API"""
+        latencies = sorted(self._latencies)
+        connections = self.new_connections + self.reused_connections
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'reuse_ratio': self.reused_connections / connections if connections else 0.0,
+            'dns_hits': self.dns_hits,
+            'dns_misses': self.dns_misses,
+            'latency_p50': latencies[len(latencies) // 2] if latencies else 0.0,
+            'latency_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        }
+
+
+def create_session() -> TunedAiohttpSession:
+    """Сессия с настройками из переменных окружения"""
+    api = PRODUCTION
+    if config.TELEGRAM_API_URL:
+        api = TelegramAPIServer.from_base(config.TELEGRAM_API_URL, is_local=config.TELEGRAM_API_LOCAL)
+    return TunedAiohttpSession(
+        api=api,
+        timeout=config.HTTP_TIMEOUT,
+        limit=config.HTTP_POOL_LIMIT,
+        limit_per_host=config.HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=config.HTTP_KEEPALIVE,
+        dns_ttl=config.HTTP_DNS_TTL,
+        method_timeouts=parse_timeouts(config.HTTP_METHOD_TIMEOUTS),
+    )
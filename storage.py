@@ -0,0 +1,654 @@
+"""
+Хранилища состояний FSM: SQLite (WAL) и Redis с пакетной записью и кэшем
+чтения, а также ограниченное по памяти хранилище в процессе.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from abc import abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+import config
+from cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Запись в кэше и очереди на запись: (состояние, данные)
+Record = Tuple[Optional[str], Dict[str, Any]]
+EMPTY_RECORD: Record = (None, {})
+
+
+def parse_state_ttls(value: str) -> Dict[str, float]:
+    """Разбор строки ``Группа=сек,Группа:состояние=сек`` (0 - бессрочно)"""
+    ttls = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+def state_ttl(ttls: Optional[Dict[str, float]], default: Optional[float], state: Optional[str]) -> Optional[float]:
+    """Время жизни сессии в состоянии: сначала точное имя, затем группа состояний"""
+    if state is not None and ttls:
+        ttl = ttls.get(state)
+        if ttl is None:
+            ttl = ttls.get(state.split(":", 1)[0])
+        if ttl is not None:
+            return ttl or None
+    return default
+
+
+class CachedStorage(BaseStorage):
+    """
+    Базовое хранилище с кэшем чтения и отложенной пакетной записью.
+
+    Изменения сначала попадают в кэш процесса и очередь записи, а в бэкенд
+    уходят одной пачкой раз в ``flush_interval`` секунд (или сразу, если
+    накопилось ``flush_batch`` ключей). Повторные записи одного ключа внутри
+    пачки схлопываются. ``state.get_data()`` на горячем пути обслуживается из
+    кэша без обращения к бэкенду.
+
+    Кэш и очередь не видны другим процессам, поэтому они допустимы, только
+    если обновления одного чата всегда приходят в этот процесс. Иначе
+    хранилище создаётся с ``cache_size=0`` и ``flush_interval=0``: каждая
+    запись сразу уходит в бэкенд (см. ``create_storage``).
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        state_ttls: Optional[Dict[str, float]] = None,
+        cache_size: int = 10000,
+        cache_ttl: Optional[float] = None,
+        flush_interval: float = 0.05,
+        flush_batch: int = 200,
+        key_builder: Optional[KeyBuilder] = None,
+    ):
+        self.ttl = ttl
+        self.state_ttls = state_ttls
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.key_builder = key_builder or DefaultKeyBuilder(prefix="fsm")
+        self._cache = LRUCache(maxsize=cache_size, ttl=cache_ttl) if cache_size > 0 else None
+        self._pending: Dict[str, Record] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    @abstractmethod
+    async def _load(self, key: str) -> Optional[Record]:
+        """Чтение записи из бэкенда (None, если нет или истекла)"""
+
+    @abstractmethod
+    async def _write_many(self, items: List[Tuple[str, Record]]) -> None:
+        """Пакетная запись; пустые записи удаляются"""
+
+    async def _get_record(self, key: StorageKey) -> Record:
+        str_key = self.key_builder.build(key)
+        record = self._pending.get(str_key)
+        if record is not None:
+            return record
+        if self._cache is not None:
+            record = self._cache.get(str_key)
+            if record is not None:
+                return record
+        record = await self._load(str_key) or EMPTY_RECORD
+        if self._cache is not None:
+            self._cache.set(str_key, record)
+        return record
+
+    async def _put_record(self, key: StorageKey, record: Record) -> None:
+        str_key = self.key_builder.build(key)
+        self._pending[str_key] = record
+        if self._cache is not None:
+            self._cache.set(str_key, record)
+
+        if self.flush_interval <= 0 or len(self._pending) >= self.flush_batch:
+            try:
+                await self.flush()
+            except Exception:
+                # Неудачная пачка осталась в очереди - повторим в фоне
+                self._schedule_flush()
+                raise
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        # При ошибке бэкенда повторяем с растущей паузой, пока запись не пройдёт
+        delay = max(self.flush_interval, 0.05)
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                delay = min(max(delay * 2, 1.0), 30.0)
+                logger.error(
+                    "Ошибка записи состояний FSM (в очереди %s), повтор через %.0f сек: %s",
+                    len(self._pending), delay, e
+                )
+
+    async def flush(self) -> None:
+        """Запись всех накопленных изменений в бэкенд"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            items = list(self._pending.items())
+            self._pending = {}
+            try:
+                await self._write_many(items)
+            except Exception:
+                # Возвращаем неудачную пачку, не затирая более свежие изменения
+                for str_key, record in items:
+                    self._pending.setdefault(str_key, record)
+                raise
+
+    async def count_states(self) -> Dict[str, int]:
+        """Количество активных диалогов по состояниям (для метрик)"""
+        await self.flush()
+        return await self._count_states()
+
+    async def _count_states(self) -> Dict[str, int]:
+        return {}
+
+    def _ttl(self, state: Optional[str]) -> Optional[float]:
+        return state_ttl(self.state_ttls, self.ttl, state)
+
+    def _expires_at(self, state: Optional[str]) -> Optional[float]:
+        ttl = self._ttl(state)
+        return time.time() + ttl if ttl else None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _, data = await self._get_record(key)
+        state = state.state if isinstance(state, State) else state
+        await self._put_record(key, (state, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._get_record(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        state, _ = await self._get_record(key)
+        await self._put_record(key, (state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._get_record(key)
+        return data.copy()
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+
+
+class SQLiteStorage(CachedStorage):
+    """Хранилище FSM в SQLite (режим WAL), без внешних зависимостей"""
+
+    # Интервал удаления истёкших диалогов (сек)
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self, path: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Все обращения к соединению идут из одного потока
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-sqlite")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            "key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fsm_expires_at ON fsm (expires_at)")
+        self._conn.commit()
+        self._pruned_at = 0.0
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _load_sync(self, key: str) -> Optional[Record]:
+        row = self._conn.execute(
+            "SELECT state, data FROM fsm WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _write_many_sync(self, items: List[Tuple[str, Record]]) -> None:
+        upserts = []
+        deletes = []
+        for key, (state, data) in items:
+            if state is None and not data:
+                deletes.append((key,))
+            else:
+                upserts.append((key, state, json.dumps(data, ensure_ascii=False), self._expires_at(state)))
+        with self._conn:
+            if upserts:
+                self._conn.executemany(
+                    "INSERT INTO fsm (key, state, data, expires_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, "
+                    "data = excluded.data, expires_at = excluded.expires_at",
+                    upserts
+                )
+            if deletes:
+                self._conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+            # Истёкшие записи и так не читаются - удаляем их не чаще раза в PRUNE_INTERVAL
+            now = time.time()
+            if now - self._pruned_at >= self.PRUNE_INTERVAL:
+                self._pruned_at = now
+                self._conn.execute("DELETE FROM fsm WHERE expires_at <= ?", (now,))
+
+    def _count_states_sync(self) -> Dict[str, int]:
+        return dict(self._conn.execute(
+            "SELECT state, COUNT(*) FROM fsm WHERE state IS NOT NULL "
+            "AND (expires_at IS NULL OR expires_at > ?) GROUP BY state",
+            (time.time(),)
+        ).fetchall())
+
+    async def _load(self, key: str) -> Optional[Record]:
+        return await self._run(self._load_sync, key)
+
+    async def _count_states(self) -> Dict[str, int]:
+        return await self._run(self._count_states_sync)
+
+    async def _write_many(self, items: List[Tuple[str, Record]]) -> None:
+        await self._run(self._write_many_sync, items)
+
+    async def close(self) -> None:
+        await super().close()
+        await self._run(self._conn.close)
+        self._executor.shutdown()
+
+
+class RedisProtocolError(Exception):
+    pass
+
+
+class RedisConnection:
+    """Минимальный клиент протокола Redis (RESP) с поддержкой конвейера команд"""
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _encode(command: Iterable[Any]) -> bytes:
+        parts = [str(arg).encode() if not isinstance(arg, bytes) else arg for arg in command]
+        chunks = [b"*%d\r\n" % len(parts)]
+        for part in parts:
+            chunks.append(b"$%d\r\n%s\r\n" % (len(part), part))
+        return b"".join(chunks)
+
+    async def _read_reply(self) -> Any:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Соединение с Redis закрыто")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode()
+        if prefix == b"-":
+            return RedisProtocolError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisProtocolError(f"Неизвестный ответ: {line!r}")
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            await self._pipeline(setup)
+
+    async def _pipeline(self, commands: List[Iterable[Any]]) -> List[Any]:
+        self._writer.write(b"".join(self._encode(command) for command in commands))
+        await self._writer.drain()
+        replies = [await self._read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisProtocolError):
+                raise reply
+        return replies
+
+    async def execute_many(self, commands: List[Iterable[Any]]) -> List[Any]:
+        """Отправка команд одной пачкой и чтение всех ответов"""
+        async with self._lock:
+            if self._writer is None or self._writer.is_closing():
+                await self._connect()
+            try:
+                return await self._pipeline(commands)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                self._writer = None
+                raise
+
+    async def execute(self, *command: Any) -> Any:
+        return (await self.execute_many([command]))[0]
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+
+
+class RedisStorage(CachedStorage):
+    """Хранилище FSM в Redis (или любом сервере с протоколом Redis)"""
+
+    def __init__(self, url: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.redis = RedisConnection(url)
+
+    async def _load(self, key: str) -> Optional[Record]:
+        value = await self.redis.execute("GET", key)
+        if value is None:
+            return None
+        record = json.loads(value)
+        return record["state"], record["data"]
+
+    async def _write_many(self, items: List[Tuple[str, Record]]) -> None:
+        commands = []
+        for key, (state, data) in items:
+            if state is None and not data:
+                commands.append(("DEL", key))
+                continue
+            value = json.dumps({"state": state, "data": data}, ensure_ascii=False).encode()
+            ttl = self._ttl(state)
+            if ttl:
+                commands.append(("SET", key, value, "PX", int(ttl * 1000)))
+            else:
+                commands.append(("SET", key, value))
+        await self.redis.execute_many(commands)
+
+    async def _count_states(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        cursor = b"0"
+        while True:
+            cursor, keys = await self.redis.execute("SCAN", cursor, "MATCH", "fsm:*", "COUNT", 1000)
+            if keys:
+                for value in await self.redis.execute("MGET", *keys):
+                    state = json.loads(value)["state"] if value is not None else None
+                    if state:
+                        counts[state] = counts.get(state, 0) + 1
+            if cursor == b"0":
+                return counts
+
+    async def close(self) -> None:
+        await super().close()
+        await self.redis.close()
+
+
+# Накладные расходы на одну сессию сверх самой записи: ключ, узел OrderedDict
+# и ячейка хэш-таблицы (подобрано по tracemalloc в benchmarks/bench_sessions.py,
+# CPython 3.11, 64 бита)
+SESSION_OVERHEAD = 320
+
+SessionKey = Tuple[int, int, int, Optional[int], Optional[str], str]
+
+
+def _sizeof(value: Any) -> int:
+    # Примерный размер значения вместе с вложенными списками и словарями
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(_sizeof(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in value.items())
+    return size
+
+
+class Session:
+    """
+    Запись сессии FSM. Вместо словаря данных - кортеж значений и общий для
+    всех сессий кортеж имён полей (``total_matches``, ``current_wr``...).
+    """
+    __slots__ = ("state", "fields", "values", "touched", "size")
+
+    def __init__(self, state: Optional[str], fields: Tuple[str, ...], values: Tuple[Any, ...], touched: float):
+        self.state = state
+        self.fields = fields
+        self.values = values
+        self.touched = touched
+        self.size = 0
+
+    def data(self) -> Dict[str, Any]:
+        return dict(zip(self.fields, self.values))
+
+
+class BoundedMemoryStorage(BaseStorage):
+    """
+    Хранилище FSM в памяти процесса с ограничениями.
+
+    Сессия живёт, пока к ней обращаются: время жизни отсчитывается от
+    последнего чтения или записи и задаётся по состоянию (``state_ttls``),
+    иначе - ``ttl``. Сессии с одинаковым временем жизни лежат в одном
+    OrderedDict в порядке обращений, поэтому истёкшие всегда в начале и
+    удаляются при записи без обхода всех сессий. Если оценка занятой памяти
+    превышает ``max_bytes``, вытесняются давно не использованные сессии.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        state_ttls: Optional[Dict[str, float]] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.ttl = ttl
+        self.state_ttls = state_ttls
+        self.max_bytes = max_bytes
+        self._buckets: Dict[Optional[float], "OrderedDict[SessionKey, Session]"] = {}
+        # Время жизни по состояниям, общие кортежи имён полей и строки состояний
+        self._ttls: Dict[Optional[str], Optional[float]] = {}
+        self._layouts: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self._states: Dict[str, str] = {}
+        self._state_counts: Dict[Optional[str], int] = {}
+        self._state_bytes: Dict[Optional[str], int] = {}
+        self.sessions = 0
+        self.total_bytes = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def _ttl(self, state: Optional[str]) -> Optional[float]:
+        try:
+            return self._ttls[state]
+        except KeyError:
+            ttl = self._ttls[state] = state_ttl(self.state_ttls, self.ttl, state)
+            return ttl
+
+    def _bucket(self, ttl: Optional[float]) -> "OrderedDict[SessionKey, Session]":
+        bucket = self._buckets.get(ttl)
+        if bucket is None:
+            bucket = self._buckets[ttl] = OrderedDict()
+        return bucket
+
+    def _account(self, session: Session, sign: int) -> None:
+        self.sessions += sign
+        self.total_bytes += sign * session.size
+        self._state_counts[session.state] = self._state_counts.get(session.state, 0) + sign
+        self._state_bytes[session.state] = self._state_bytes.get(session.state, 0) + sign * session.size
+
+    def _drop(self, ttl: Optional[float], session_key: SessionKey, session: Session) -> None:
+        del self._buckets[ttl][session_key]
+        self._account(session, -1)
+
+    def _find(self, key: StorageKey, now: float) -> Tuple[SessionKey, Optional[float], Optional[Session]]:
+        session_key = (key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny)
+        for ttl, bucket in self._buckets.items():
+            session = bucket.get(session_key)
+            if session is None:
+                continue
+            if ttl is not None and session.touched + ttl <= now:
+                self._drop(ttl, session_key, session)
+                self.expirations += 1
+                return session_key, None, None
+            return session_key, ttl, session
+        return session_key, None, None
+
+    def _get(self, key: StorageKey) -> Optional[Session]:
+        now = time.monotonic()
+        session_key, ttl, session = self._find(key, now)
+        if session is not None:
+            session.touched = now
+            self._buckets[ttl].move_to_end(session_key)
+        return session
+
+    def _expire(self, now: float) -> None:
+        for ttl, bucket in self._buckets.items():
+            if ttl is None:
+                continue
+            while bucket:
+                session_key = next(iter(bucket))
+                session = bucket[session_key]
+                if session.touched + ttl > now:
+                    break
+                self._drop(ttl, session_key, session)
+                self.expirations += 1
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self.sessions:
+            # Самая давняя сессия - в начале одного из OrderedDict
+            oldest = None
+            for ttl, bucket in self._buckets.items():
+                if bucket:
+                    session_key = next(iter(bucket))
+                    session = bucket[session_key]
+                    if oldest is None or session.touched < oldest[2].touched:
+                        oldest = (ttl, session_key, session)
+            self._drop(*oldest)
+            self.evictions += 1
+
+    def _put(self, key: StorageKey, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None,
+             keep_state: bool = False) -> None:
+        now = time.monotonic()
+        session_key, ttl, session = self._find(key, now)
+        if keep_state:
+            state = session.state if session is not None else None
+        elif state is not None:
+            state = self._states.setdefault(state, sys.intern(state))
+        if data is None:
+            fields, values = (session.fields, session.values) if session is not None else ((), ())
+        else:
+            fields, values = tuple(data), tuple(data.values())
+
+        new_ttl = self._ttl(state)
+        if session is not None:
+            self._account(session, -1)
+            if state is None and not values:
+                del self._buckets[ttl][session_key]
+                return
+            if values is not session.values:
+                session.size = SESSION_OVERHEAD + sys.getsizeof(session) + _sizeof(values)
+            session.state, session.values, session.touched = state, values, now
+            session.fields = self._layouts.setdefault(fields, fields)
+            if new_ttl == ttl:
+                self._buckets[ttl].move_to_end(session_key)
+            else:
+                del self._buckets[ttl][session_key]
+                self._bucket(new_ttl)[session_key] = session
+        elif state is None and not values:
+            return
+        else:
+            session = Session(state, self._layouts.setdefault(fields, fields), values, now)
+            session.size = SESSION_OVERHEAD + sys.getsizeof(session) + _sizeof(values)
+            self._bucket(new_ttl)[session_key] = session
+        self._account(session, 1)
+        self._expire(now)
+        self._evict()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._put(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        session = self._get(key)
+        return session.state if session is not None else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        self._put(key, data=data, keep_state=True)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        session = self._get(key)
+        return session.data() if session is not None else {}
+
+    async def count_states(self) -> Dict[str, int]:
+        """Количество активных диалогов по состояниям (для метрик)"""
+        return {state: count for state, count in self._state_counts.items() if state is not None and count}
+
+    def memory_by_state(self) -> Dict[str, int]:
+        """Оценка занятой памяти (байт) по состояниям; "none" - данные без состояния"""
+        return {state or "none": size for state, size in self._state_bytes.items() if size}
+
+    def stats(self) -> dict:
+        """Число сессий, занятая память и счётчики удалений"""
+        return {
+            'sessions': self.sessions,
+            'bytes': self.total_bytes,
+            'bytes_per_session': self.total_bytes / self.sessions if self.sessions else 0.0,
+            'max_bytes': self.max_bytes,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+        }
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+def create_storage() -> BaseStorage:
+    """Создание хранилища FSM согласно настройкам"""
+    state_ttls = parse_state_ttls(config.FSM_STATE_TTL)
+    options = dict(
+        ttl=config.FSM_TTL or None,
+        state_ttls=state_ttls,
+        cache_size=config.FSM_CACHE_SIZE,
+        cache_ttl=config.FSM_CACHE_TTL or None,
+        flush_interval=config.FSM_FLUSH_INTERVAL,
+    )
+    # Polling получает обновления одним процессом, воркеры супервизора - по
+    # чатам. Экземпляры за балансировщиком (webhook) делят диалоги, поэтому
+    # чужие изменения не должны теряться в кэше или очереди процесса
+    if config.BOT_MODE == "webhook" and not config.FSM_CHAT_SHARDED:
+        logger.info("Хранилище FSM: webhook без супервизора - кэш и отложенная запись отключены")
+        options.update(cache_size=0, flush_interval=0)
+    if config.FSM_STORAGE == "memory":
+        logger.info("Хранилище FSM: память процесса (до %g МБ)", config.FSM_MEMORY_LIMIT_MB)
+        return BoundedMemoryStorage(
+            ttl=config.FSM_TTL or None,
+            state_ttls=state_ttls,
+            max_bytes=int(config.FSM_MEMORY_LIMIT_MB * 1024 * 1024)
+        )
+    if config.FSM_STORAGE == "redis":
+        logger.info("Хранилище FSM: Redis (%s)", config.FSM_REDIS_URL)
+        return RedisStorage(config.FSM_REDIS_URL, **options)
+    logger.info("Хранилище FSM: SQLite (%s)", config.FSM_SQLITE_PATH)
+    return SQLiteStorage(config.FSM_SQLITE_PATH, **options)
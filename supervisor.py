@@ -0,0 +1,285 @@
+"""
+Супервизор: запускает N процессов-воркеров и распределяет между ними обновления.
+
+Обновления из чатов направляются в воркер ``hash(chat_id) % N``, поэтому диалог
+каждого пользователя (состояние FSM) всегда обрабатывается одним процессом.
+Inline-запросы не привязаны к чату и направляются по id отправителя: все
+нажатия клавиш одного пользователя попадают в один воркер (там же, где его
+личный чат), поэтому объединение запросов и лимиты inline работают как в
+одном процессе. Остальные обновления без чата раздаются по кругу.
+
+Запуск: ``python supervisor.py`` (число воркеров задаётся BOT_WORKERS).
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import time
+from typing import Any, Dict, List, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Типы обновлений, содержащие чат
+CHAT_UPDATE_FIELDS = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "business_message",
+    "edited_business_message",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+)
+
+# Обновления без чата, у которых есть отправитель
+SENDER_UPDATE_FIELDS = (
+    "inline_query",
+    "chosen_inline_result",
+    "shipping_query",
+    "pre_checkout_query",
+)
+
+
+def get_chat_id(update: Dict[str, Any]) -> Optional[int]:
+    """
+    ID чата, к которому относится обновление; для inline-запросов - id
+    отправителя (совпадает с id его личного чата). None, если нет ни того, ни другого.
+    """
+    for field in CHAT_UPDATE_FIELDS:
+        if field in update:
+            return update[field]["chat"]["id"]
+    callback_query = update.get("callback_query")
+    if callback_query is not None:
+        message = callback_query.get("message")
+        return message["chat"]["id"] if message else callback_query["from"]["id"]
+    for field in SENDER_UPDATE_FIELDS:
+        if field in update:
+            return update[field]["from"]["id"]
+    return None
+
+
+def worker_main(index: int, updates: multiprocessing.Queue, processed, workers: int) -> None:
+    """Точка входа процесса-воркера"""
+    # Общий лимит отправки делится между воркерами, а чат всегда попадает в
+    # один воркер, поэтому кэш FSM безопасен (до импорта calculator, который
+    # создаёт планировщик и хранилище)
+    config.SEND_RATE_SHARES = workers
+    config.FSM_CHAT_SHARDED = True
+    asyncio.run(_worker_loop(index, updates, processed))
+
+
+async def _worker_loop(index: int, updates: multiprocessing.Queue, processed) -> None:
+    from aiogram.methods import TelegramMethod
+
+    import calculator
+
+    bot, dp = calculator.bot, calculator.dp
+    loop = asyncio.get_running_loop()
+    tasks = set()
+
+    async def handle(update: Dict[str, Any]) -> None:
+        try:
+            response = await dp.feed_raw_update(bot, update)
+            # Как и при polling, выполняем метод, возвращённый обработчиком
+            if isinstance(response, TelegramMethod):
+                await dp.silent_call_request(bot, response)
+        except Exception as e:
+            logger.exception(
+                "Воркер %s: ошибка обработки обновления id=%s\n%s: %s",
+                index, update.get("update_id"), type(e).__name__, e
+            )
+        finally:
+            with processed.get_lock():
+                processed[index] += 1
+
+    metrics_runner = None
+    if config.METRICS_ENABLED:
+        import metrics
+        metrics_runner = await metrics.start_metrics_server(
+            config.METRICS_HOST, config.METRICS_PORT + 1 + index
+        )
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    logger.info("Воркер %s запущен", index)
+    try:
+        while True:
+            update = await loop.run_in_executor(None, updates.get)
+            if update is None:
+                break
+            task = asyncio.create_task(handle(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+        logger.info("Воркер %s остановлен", index)
+
+
+class Supervisor:
+    """Запуск, перезапуск и мониторинг воркеров; маршрутизация обновлений"""
+
+    def __init__(self, workers: int):
+        self.context = multiprocessing.get_context("spawn")
+        self.queues: List[multiprocessing.Queue] = [self.context.Queue() for _ in range(workers)]
+        self.processed = self.context.Array("Q", workers)
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.restarts = [0] * workers
+        self._round_robin = itertools.cycle(range(workers))
+        self._stopping = False
+
+    def route(self, update: Dict[str, Any]) -> int:
+        """Номер воркера для обновления"""
+        chat_id = get_chat_id(update)
+        if chat_id is None:
+            return next(self._round_robin)
+        return hash(chat_id) % len(self.queues)
+
+    def feed(self, update: Dict[str, Any]) -> None:
+        self.queues[self.route(update)].put(update)
+
+    def _start_worker(self, index: int) -> None:
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, self.queues[index], self.processed, len(self.queues)),
+            name=f"bot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self) -> None:
+        for index in range(len(self.queues)):
+            self._start_worker(index)
+        logger.info("Запущено воркеров: %s", len(self.queues))
+
+    async def monitor(self) -> None:
+        """Перезапуск упавших воркеров и периодический отчёт о пропускной способности"""
+        last_counts = list(self.processed)
+        last_report = time.monotonic()
+        while not self._stopping:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive() and not self._stopping:
+                    self.restarts[index] += 1
+                    logger.error(
+                        "Воркер %s завершился с кодом %s, перезапуск №%s",
+                        index, process.exitcode, self.restarts[index]
+                    )
+                    self._start_worker(index)
+
+            now = time.monotonic()
+            if now - last_report >= config.WORKER_REPORT_INTERVAL:
+                counts = list(self.processed)
+                for index, count in enumerate(counts):
+                    rate = (count - last_counts[index]) / (now - last_report)
+                    logger.info(
+                        "Воркер %s: %.1f обн/с, всего %s, в очереди %s, перезапусков %s",
+                        index, rate, count, self._queue_size(index), self.restarts[index]
+                    )
+                last_counts, last_report = counts, now
+
+    def _queue_size(self, index: int) -> Any:
+        try:
+            return self.queues[index].qsize()
+        except NotImplementedError:  # macOS
+            return "?"
+
+    def metrics(self) -> Dict[Any, float]:
+        """Обработанные обновления, перезапуски и очереди воркеров для /metrics"""
+        values = {}
+        for index, count in enumerate(self.processed):
+            values[(str(index), "processed")] = count
+            values[(str(index), "restarts")] = self.restarts[index]
+            queue_size = self._queue_size(index)
+            if isinstance(queue_size, int):
+                values[(str(index), "queue")] = queue_size
+        return values
+
+    def stop(self, timeout: float = 10) -> None:
+        """Остановка воркеров после обработки уже полученных обновлений"""
+        self._stopping = True
+        for updates in self.queues:
+            updates.put(None)
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+
+
+async def poll_updates(supervisor: Supervisor) -> None:
+    """Получение обновлений через long polling и передача их воркерам"""
+    from aiogram.methods import GetUpdates
+
+    import calculator
+
+    bot, dp = calculator.bot, calculator.dp
+    await bot.delete_webhook(drop_pending_updates=config.DROP_PENDING_UPDATES)
+    allowed_updates = dp.resolve_used_update_types()
+    offset = None
+    while True:
+        try:
+            updates = await bot(
+                GetUpdates(offset=offset, timeout=30, allowed_updates=allowed_updates),
+                request_timeout=int(bot.session.timeout + 30)
+            )
+        except Exception as e:
+            logger.error("Ошибка получения обновлений: %s", e)
+            await asyncio.sleep(5)
+            continue
+
+        for update in updates:
+            supervisor.feed(update.model_dump(mode="json", exclude_unset=True, by_alias=True))
+            offset = update.update_id + 1
+
+
+async def main() -> None:
+    import calculator
+    from webhook import create_intake_app, serve, set_webhook
+
+    supervisor = Supervisor(config.BOT_WORKERS)
+    supervisor.start()
+    monitor = asyncio.create_task(supervisor.monitor())
+    metrics_runner = None
+    try:
+        if config.METRICS_ENABLED:
+            import metrics
+            metrics.registry.register(metrics.Gauge(
+                "bot_workers", "Состояние воркеров", ["worker", "key"], supervisor.metrics
+            ))
+            metrics_runner = await metrics.start_metrics_server(config.METRICS_HOST, config.METRICS_PORT)
+        await calculator.set_bot_commands()
+        if config.BOT_MODE == "webhook":
+            await set_webhook(calculator.bot, calculator.dp)
+            await serve(create_intake_app(supervisor.feed))
+        else:
+            await poll_updates(supervisor)
+    finally:
+        monitor.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        supervisor.stop()
+        await calculator.bot.session.close()
+
+
+if __name__ == '__main__':
+    from logs import parse_sampling, setup_logging
+
+    setup_logging(
+        level=config.LOG_LEVEL,
+        fmt=config.LOG_FORMAT,
+        sampling=parse_sampling(config.LOG_SAMPLING),
+        path=config.LOG_FILE,
+        text_format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Супервизор остановлен пользователем")
@@ -0,0 +1,154 @@
+"""Защита от флуда: маркерная корзина на пользователя и тип обновления"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import TelegramObject, Update
+
+import replies
+
+logger = logging.getLogger(__name__)
+
+SLOW_DOWN_CALLBACK_TEXT = "⏳ Слишком часто, подожди пару секунд"
+
+
+class Allowance:
+    """
+    Остаток токенов пользователя и признак, что он уже предупреждён (до тех
+    пор, пока корзина не восстановится полностью и запись не удалится)
+    """
+
+    __slots__ = ("tokens", "updated", "warned")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.warned = False
+
+
+class RateLimiter:
+    """
+    Корзины пользователей для одного типа обновлений: ``rate`` обновлений в
+    секунду, не больше ``burst`` подряд.
+
+    Корзина, к которой не обращались ``burst / rate`` секунд, снова полна и
+    ничем не отличается от новой, поэтому удаляется. Записи лежат в
+    OrderedDict в порядке обращений: такие записи всегда в начале и
+    удаляются по одной за O(1), а при ``max_users`` записей вытесняется самая
+    давняя.
+    """
+
+    def __init__(self, rate: float, burst: float, max_users: int = 50000):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self.refill_time = burst / rate
+        self._users: "OrderedDict[int, Allowance]" = OrderedDict()
+        self.evictions = 0
+
+    def hit(self, user_id: int, now: float) -> Tuple[bool, Allowance]:
+        """(пропустить ли обновление, корзина пользователя)"""
+        users = self._users
+        # Заодно удаляем одну-две полностью восстановившиеся корзины из начала
+        for _ in range(2):
+            if not users:
+                break
+            oldest = next(iter(users))
+            if users[oldest].updated + self.refill_time > now:
+                break
+            del users[oldest]
+
+        allowance = users.get(user_id)
+        if allowance is None:
+            allowance = users[user_id] = Allowance(self.burst - 1, now)
+            if len(users) > self.max_users:
+                users.popitem(last=False)
+                self.evictions += 1
+            return True, allowance
+
+        users.move_to_end(user_id)
+        allowance.tokens = min(self.burst, allowance.tokens + (now - allowance.updated) * self.rate)
+        allowance.updated = now
+        if allowance.tokens >= 1:
+            allowance.tokens -= 1
+            return True, allowance
+        return False, allowance
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Внешний middleware dp.update: обновления сверх лимита не обрабатываются.
+    На первое лишнее сообщение пользователь получает готовый ответ «не так
+    быстро», на нажатие кнопки - всплывающую подсказку; дальше обновления
+    до восстановления лимита отбрасываются молча. Inline-запросы всегда
+    отбрасываются молча.
+
+    Корзины хранятся в процессе. Под supervisor.py inline-запросы и личный
+    чат пользователя обслуживает один воркер, поэтому лимит для них общий;
+    сообщения в группах идут в воркер группы и считаются там отдельно.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], max_users: int = 50000,
+                 exempt: Tuple[int, ...] = ()):
+        self.limiters = {
+            update_type: RateLimiter(rate, burst, max_users)
+            for update_type, (rate, burst) in limits.items()
+        }
+        self.exempt = frozenset(exempt)
+        self.allowed = 0
+        self.dropped: Dict[str, int] = {update_type: 0 for update_type in limits}
+        self.notices = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None or user.id in self.exempt:
+            return await handler(event, data)
+        # Update.event_type кеширует результат через lru_cache и сравнивает
+        # обновления целиком - проверить поля напрямую в разы дешевле
+        for update_type, limiter in self.limiters.items():
+            if getattr(event, update_type) is not None:
+                break
+        else:
+            return await handler(event, data)
+
+        allowed, allowance = limiter.hit(user.id, time.monotonic())
+        if allowed:
+            self.allowed += 1
+            return await handler(event, data)
+
+        self.dropped[update_type] += 1
+        if not allowance.warned:
+            allowance.warned = True
+            await self._notify(event)
+        return None
+
+    async def _notify(self, event: Update) -> None:
+        try:
+            if event.message is not None and event.message.chat.type == "private":
+                self.notices += 1
+                await replies.answer(event.message, replies.SLOW_DOWN)
+            elif event.callback_query is not None:
+                self.notices += 1
+                await event.callback_query.answer(SLOW_DOWN_CALLBACK_TEXT)
+        except TelegramAPIError as e:
+            logger.warning("Не удалось предупредить о флуде: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            'allowed': self.allowed,
+            **{f'dropped_{update_type}': count for update_type, count in self.dropped.items()},
+            'notices': self.notices,
+            'tracked': sum(len(limiter) for limiter in self.limiters.values()),
+            'evictions': sum(limiter.evictions for limiter in self.limiters.values()),
+        }
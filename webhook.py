@@ -0,0 +1,98 @@
+"""Режим работы через webhook: aiohttp-сервер, принимающий обновления от Telegram"""
+import asyncio
+import logging
+import secrets
+from typing import Any, Callable, Dict
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+async def health(request: web.Request) -> web.Response:
+    """Проверка живости для балансировщика нагрузки"""
+    return web.json_response({"status": "ok"})
+
+
+def create_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """
+    Создание aiohttp-приложения для приёма обновлений.
+
+    Обновления обрабатываются прямо в запросе: если обработчик вернул метод
+    (например, ``return message.answer(...)``), он уходит в теле ответа webhook
+    без отдельного запроса к Bot API.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.WEBHOOK_SECRET or None,
+        handle_in_background=False,
+    ).register(app, path=config.WEBHOOK_PATH)
+    app.router.add_get("/healthz", health)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def set_webhook(bot: Bot, dp: Dispatcher) -> None:
+    """
+    Регистрация webhook в Telegram при каждом запуске.
+
+    Вызов идемпотентен, а проверить по getWebhookInfo можно только адрес:
+    секрет там не возвращается, поэтому сменённый ``WEBHOOK_SECRET`` или
+    новые типы обновлений иначе не дошли бы до Telegram.
+    """
+    if not config.WEBHOOK_BASE_URL:
+        logger.warning("WEBHOOK_BASE_URL не задан - webhook в Telegram не регистрируется")
+        return
+
+    url = config.WEBHOOK_BASE_URL.rstrip("/") + config.WEBHOOK_PATH
+    allowed_updates = dp.resolve_used_update_types()
+    await bot.set_webhook(
+        url=url,
+        secret_token=config.WEBHOOK_SECRET or None,
+        allowed_updates=allowed_updates,
+    )
+    logger.info("Webhook установлен: %s (обновления: %s)", url, ", ".join(allowed_updates))
+
+
+def create_intake_app(feed: Callable[[Dict[str, Any]], None]) -> web.Application:
+    """
+    aiohttp-приложение, которое только принимает обновления и передаёт их в ``feed``
+    (используется супервизором для распределения обновлений по воркерам).
+    """
+    async def handle(request: web.Request) -> web.Response:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if config.WEBHOOK_SECRET and not secrets.compare_digest(token, config.WEBHOOK_SECRET):
+            return web.Response(body="Unauthorized", status=401)
+        feed(await request.json())
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post(config.WEBHOOK_PATH, handle)
+    app.router.add_get("/healthz", health)
+    return app
+
+
+async def serve(app: web.Application) -> None:
+    """Запуск aiohttp-приложения до остановки процесса"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.WEBAPP_HOST, port=config.WEBAPP_PORT)
+    await site.start()
+    logger.info("Webhook-сервер запущен на %s:%s%s", config.WEBAPP_HOST, config.WEBAPP_PORT, config.WEBHOOK_PATH)
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Запуск webhook-сервера до остановки процесса"""
+    await set_webhook(bot, dp)
+    await serve(create_app(dp, bot))